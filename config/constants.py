@@ -14,6 +14,9 @@ RISK_LEVELS = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
 CASE_STATUSES = ["OPEN", "INVESTIGATING", "ESCALATED", "RESOLVED", "CLOSED"]
 TRANSACTION_TYPES = ["WIRE", "ACH", "ATM", "P2P", "INTERNAL", "CHECK"]
 
+# Rule severity (rules.yaml) → weight in [0, 1] used by risk scoring
+RULE_SEVERITY_WEIGHTS = {"low": 0.25, "medium": 0.5, "high": 0.8, "critical": 1.0}
+
 # =============================================================== #
 # ==================== AGENT & FLOW CONSTANTS =================== #
 # =============================================================== #
@@ -50,6 +50,9 @@ def detect_and_escalate_flow():
             return {"escalation_result": None}
 
         det = state["detection_result"]
+        if det.get("cache_hit"):
+            # Replayed retry: the original detection was already escalated
+            return {"escalation_result": None}
         return {
             "escalation_result": escalate_case(
                 case_id=det["case_id"],
@@ -3,6 +3,7 @@
 # --------------------------------------------------------------- #
 # 📌 Purpose   : Launch entrypoint for Fraud MCP Server
 # 🛠  Mode     : CLI with basic routing and health check
+# 🌊 Stream   : `server.py stream ...` → main/stream_ingest.py
 # ✅ Called by : run_fraud_mcp.sh
 # =============================================================== #
 
@@ -10,8 +11,13 @@ import uvicorn
 import importlib
 import pkgutil
 import os
+import sys
 from fastapi import FastAPI
 from config.env_config import load_env
+from resources.monitoring.rule_profiler import rule_stats_snapshot
+from resources.cache.detection_cache import get_detection_cache
+from tools.detect_fraud import cascade_stats
+from ml_models.model_registry import get_model_registry
 
 # --------------------------------------------------------------- #
 # Load environment config
@@ -68,11 +74,46 @@ def index():
 def health_check():
     return {"status": "Fraud MCP is alive ✅"}
 
+# --------------------------------------------------------------- #
+# Rule profiling route: per-rule counts, hit rate and latency
+# --------------------------------------------------------------- #
+@app.get("/rules/stats")
+def rules_stats():
+    return rule_stats_snapshot()
+
+# --------------------------------------------------------------- #
+# Detection cascade route: how many transactions exit at each tier
+# --------------------------------------------------------------- #
+@app.get("/detect/cascade/stats")
+def detection_cascade_stats():
+    return cascade_stats.snapshot()
+
+# --------------------------------------------------------------- #
+# Detection cache route: retry hits/misses, in-flight dedupes, evictions
+# --------------------------------------------------------------- #
+@app.get("/detect/cache/stats")
+def detection_cache_stats():
+    return get_detection_cache().stats()
+
+# --------------------------------------------------------------- #
+# Model serving route: active version and per-version latency
+# --------------------------------------------------------------- #
+@app.get("/models/stats")
+def model_stats():
+    return get_model_registry().stats()
+
 # =============================================================== #
 # Server Execution
 # =============================================================== #
 if __name__ == "__main__":
+    # `python main/server.py stream --source ...` → NDJSON streaming ingest
+    if len(sys.argv) > 1 and sys.argv[1] == "stream":
+        from main.stream_ingest import main as stream_main
+        stream_main(sys.argv[2:])
+        sys.exit(0)
+
     print("🔌 Starting Fraud MCP Server...")
+    get_model_registry().preload()
     discover_tools()
     discover_flows()
     print(f"🧰 Tools: {registered_tools}")
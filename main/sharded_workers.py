@@ -0,0 +1,319 @@
+# =============================================================== #
+# ================== main/sharded_workers.py ==================== #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Multi-core detection, one worker process per shard
+# 🔑 Sharding  : Stable hash of account_id → worker (state stays local)
+# 🕸️ Graph     : One entity graph in the parent, spanning all shards
+# 🩺 Supervise : Dead or stuck workers are restarted, work resubmitted
+# ✅ Used by   : main/stream_ingest.py (--workers), benchmark CLI
+# =============================================================== #
+
+import argparse
+import hashlib
+import multiprocessing as mp
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ml_models.entity_graph import get_entity_graph
+from ml_models.online_feature_store import SHARD_ENV_VAR
+
+DEFAULT_TASK_TIMEOUT = 30.0      # Seconds a shard may take for one batch
+DEFAULT_MAX_RETRIES = 1          # Resubmissions after a worker crash/hang
+_POLL_INTERVAL = 0.25
+
+# =============================================================== #
+# =========================== SHARDING ========================== #
+# =============================================================== #
+
+def shard_for(account_id: Any, shards: int) -> int:
+    """
+    Stable shard index for an account (identical across processes and
+    restarts, unlike the salted built-in hash()).
+    """
+    digest = hashlib.blake2b(str(account_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % shards
+
+# =============================================================== #
+# ========================== WORKER SIDE ======================== #
+# =============================================================== #
+
+def _worker_main(index: int, inbox, outbox) -> None:
+    """
+    Worker loop: owns the velocity counters, baselines and caches for the
+    accounts of its shard; no cross-process locking is needed. Entity
+    cluster sizes arrive with each task from the parent's graph.
+    """
+    os.environ[SHARD_ENV_VAR] = str(index)
+    from tools.detect_fraud import detect_fraud_batch
+    from ml_models.model_registry import get_model_registry
+
+    get_model_registry().preload()   # Warm before the first task, not during it
+
+    while True:
+        task = inbox.get()
+        if task is None:
+            break
+        batch_id, positions, transactions, cluster_sizes = task
+        try:
+            results = detect_fraud_batch(transactions, cluster_sizes)
+        except Exception as e:
+            results = [{"error": f"Detection failed: {e}"} for _ in transactions]
+        outbox.put((index, batch_id, positions, results))
+
+# =============================================================== #
+# ========================= SUPERVISOR ========================== #
+# =============================================================== #
+
+class _Worker:
+    __slots__ = ("index", "process", "inbox", "restarts", "processed")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.inbox = None
+        self.restarts = 0
+        self.processed = 0
+
+
+class ShardedDetector:
+    """
+    Process pool running detect_fraud_batch() with transactions partitioned
+    by account_id, so every account is always handled by the same worker.
+
+    detect() splits a batch per shard, fans the parts out, and reassembles
+    the results in input order. While waiting it supervises the workers: a
+    worker that exits, or does not answer within `task_timeout`, is
+    restarted and its part resubmitted (up to `max_retries` times, after
+    which those transactions get error results). A restarted worker starts
+    with empty per-account state for its shard.
+
+    Links between accounts cross shards, so the entity graph is not
+    sharded: the parent records every transaction in its own graph and
+    sends each worker the resulting cluster sizes with the transactions.
+    """
+
+    def __init__(self, workers: Optional[int] = None,
+                 task_timeout: float = DEFAULT_TASK_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 start_method: str = "spawn"):
+        self.size = max(1, workers or os.cpu_count() or 1)
+        self.task_timeout = task_timeout
+        self.max_retries = max_retries
+        self._ctx = mp.get_context(start_method)
+        self._outbox = self._ctx.Queue()
+        self._workers = [_Worker(i) for i in range(self.size)]
+        self._lock = threading.Lock()
+        self._batch_id = 0
+        self.graph = get_entity_graph()
+        for worker in self._workers:
+            self._start(worker)
+
+    # ----------------------------------------------------------- #
+    # Worker lifecycle
+    # ----------------------------------------------------------- #
+    def _start(self, worker: _Worker) -> None:
+        worker.inbox = self._ctx.Queue()
+        worker.process = self._ctx.Process(
+            target=_worker_main, args=(worker.index, worker.inbox, self._outbox),
+            name=f"detect-shard-{worker.index}", daemon=True)
+        worker.process.start()
+
+    def _restart(self, worker: _Worker, cause: str) -> None:
+        print(f"[⚠️ WARN] Restarting detection worker {worker.index} ({cause})")
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout=5)
+        self._discard_inbox(worker)
+        worker.restarts += 1
+        self._start(worker)
+
+    @staticmethod
+    def _discard_inbox(worker: _Worker) -> None:
+        # Unread tasks must not block interpreter exit on the queue's feeder thread
+        worker.inbox.cancel_join_thread()
+        worker.inbox.close()
+
+    def close(self) -> None:
+        for worker in self._workers:
+            if worker.process.is_alive():
+                worker.inbox.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                self._discard_inbox(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ----------------------------------------------------------- #
+    # Detection
+    # ----------------------------------------------------------- #
+    def detect(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Sharded detect_fraud_batch().
+
+        Args:
+            transactions (list[dict]): Incoming transactions
+
+        Returns:
+            list[dict]: One result per input, in input order
+        """
+        from tools.detect_fraud import validate_transaction
+
+        results: List[Any] = [None] * len(transactions)
+        parts: Dict[int, tuple] = {}
+        for position, transaction in enumerate(transactions):
+            invalid = validate_transaction(transaction)
+            if invalid:
+                results[position] = {"error": invalid}
+                continue
+            key = transaction.get("account_id", transaction.get("transaction_id"))
+            positions, items, cluster_sizes = parts.setdefault(
+                shard_for(key, self.size), ([], [], []))
+            positions.append(position)
+            items.append(transaction)
+            # Recorded here, in input order, so links span every shard
+            cluster_sizes.append(self.graph.add_transaction(transaction))
+
+        with self._lock:
+            self._batch_id += 1
+            batch_id = self._batch_id
+            pending = {}
+            for shard, part in parts.items():
+                self._workers[shard].inbox.put((batch_id, *part))
+                pending[shard] = [time.monotonic(), 0]     # [submitted_at, retries]
+            self._collect(batch_id, parts, pending, results)
+        return results
+
+    def _collect(self, batch_id: int, parts: Dict[int, tuple],
+                 pending: Dict[int, list], results: list) -> None:
+        while pending:
+            try:
+                shard, result_batch, positions, shard_results = self._outbox.get(
+                    timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                self._supervise(batch_id, parts, pending, results)
+                continue
+            if result_batch != batch_id or shard not in pending:
+                continue  # Late answer from a worker that was already replaced
+            for position, result in zip(positions, shard_results):
+                results[position] = result
+            self._workers[shard].processed += len(positions)
+            del pending[shard]
+
+    def _supervise(self, batch_id: int, parts: Dict[int, tuple],
+                   pending: Dict[int, list], results: list) -> None:
+        now = time.monotonic()
+        for shard in list(pending):
+            worker = self._workers[shard]
+            submitted_at, retries = pending[shard]
+            if worker.process.is_alive() and now - submitted_at < self.task_timeout:
+                continue
+
+            cause = "timeout" if worker.process.is_alive() else f"exit code {worker.process.exitcode}"
+            self._restart(worker, cause)
+            positions = parts[shard][0]
+            if retries >= self.max_retries:
+                for position in positions:
+                    results[position] = {"error": f"Detection worker failed: {cause}"}
+                del pending[shard]
+            else:
+                worker.inbox.put((batch_id, *parts[shard]))
+                pending[shard] = [time.monotonic(), retries + 1]
+
+        # Idle workers that died between batches are replaced too
+        for worker in self._workers:
+            if worker.index not in pending and not worker.process.is_alive():
+                self._restart(worker, f"exit code {worker.process.exitcode}")
+
+    def health(self) -> List[Dict[str, Any]]:
+        """
+        Returns:
+            list[dict]: Per worker: index, pid, alive, restarts, processed
+        """
+        return [
+            {
+                "index": worker.index,
+                "pid": worker.process.pid,
+                "alive": worker.process.is_alive(),
+                "restarts": worker.restarts,
+                "processed": worker.processed,
+            }
+            for worker in self._workers
+        ]
+
+# =============================================================== #
+# ========================== BENCHMARK ========================== #
+# =============================================================== #
+
+def _synthetic_transactions(count: int, accounts: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    locations = ["Mumbai", "Delhi", "London", "New York", "Lagos", "Singapore"]
+    return [
+        {
+            "transaction_id": f"bench-{i}",
+            "account_id": f"acct-{rng.randrange(accounts)}",
+            "amount": round(rng.lognormvariate(8, 1.2), 2),
+            "timestamp": f"2024-05-01T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00",
+            "location": rng.choice(locations),
+            "device_id": rng.choice([None, "dev-1", "dev-2"]),
+        }
+        for i in range(count)
+    ]
+
+
+def benchmark(worker_counts: List[int], count: int = 200_000,
+              batch_size: int = 2000, accounts: int = 50_000) -> List[Dict[str, Any]]:
+    """
+    Throughput of ShardedDetector for each worker count.
+
+    Returns:
+        list[dict]: workers, seconds, tx_per_s, speedup (vs. the first count)
+    """
+    transactions = _synthetic_transactions(count, accounts)
+    rows = []
+    for workers in worker_counts:
+        with ShardedDetector(workers) as detector:
+            detector.detect(transactions[:batch_size])  # Warm up imports and rules
+            start = time.perf_counter()
+            for i in range(0, count, batch_size):
+                detector.detect(transactions[i:i + batch_size])
+            seconds = time.perf_counter() - start
+        rows.append({"workers": workers, "seconds": round(seconds, 3),
+                     "tx_per_s": round(count / seconds, 1)})
+        rows[-1]["speedup"] = round(rows[-1]["tx_per_s"] / rows[0]["tx_per_s"], 2)
+        print(f"🏁 workers={workers:>3}  {rows[-1]['tx_per_s']:>10.1f} tx/s  "
+              f"speedup x{rows[-1]['speedup']}")
+    return rows
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark sharded detection workers")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="Worker counts to compare (default: 1, 2, 4, ... up to all cores)")
+    parser.add_argument("--transactions", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--accounts", type=int, default=50_000)
+    args = parser.parse_args(argv)
+
+    worker_counts = args.workers
+    if not worker_counts:
+        cores = os.cpu_count() or 1
+        worker_counts = sorted({1 << i for i in range(cores.bit_length()) if 1 << i <= cores} | {cores})
+    benchmark(worker_counts, args.transactions, args.batch_size, args.accounts)
+
+
+if __name__ == "__main__":
+    main()
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
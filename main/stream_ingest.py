@@ -0,0 +1,292 @@
+# =============================================================== #
+# =================== main/stream_ingest.py ===================== #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Streaming NDJSON ingest → micro-batched detection
+# 🔌 Sources   : file / named pipe, stdin ("-"), tcp://host:port
+# 🧯 Safety    : Bounded queues end to end (blocking = backpressure)
+# ✅ Called by : main/server.py (`stream` mode), CLI
+# =============================================================== #
+
+import argparse
+import json
+import queue
+import socket
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+from tools.detect_fraud import detect_fraud_batch
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_WAIT_MS = 50
+DEFAULT_MAX_IN_FLIGHT = 20_000     # Parsed transactions waiting for detection
+DEFAULT_MAX_PENDING_BATCHES = 8    # Detected batches waiting for the sink
+
+_EOF = object()
+_encode = json.JSONEncoder(default=str).encode
+
+# =============================================================== #
+# ============================ STATS ============================ #
+# =============================================================== #
+
+class IngestStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.received = 0
+        self.malformed = 0
+        self.detected = 0
+        self.escalated = 0
+        self.batches = 0
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                "received": self.received,
+                "malformed": self.malformed,
+                "detected": self.detected,
+                "escalated": self.escalated,
+                "batches": self.batches,
+                "elapsed_s": round(elapsed, 3),
+                "tx_per_s": round(self.detected / elapsed, 1),
+            }
+
+# =============================================================== #
+# =========================== SOURCES =========================== #
+# =============================================================== #
+
+def _read_stream(stream, ingest: queue.Queue, stats: IngestStats) -> None:
+    """
+    Parse NDJSON lines from a binary stream into the bounded ingest queue.
+    queue.put() blocks when detection falls behind, which stops reading
+    (and, for sockets, lets TCP flow control push back on the sender).
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            transaction = json.loads(line)
+        except ValueError:
+            stats.add(malformed=1)
+            continue
+        stats.add(received=1)
+        ingest.put(transaction)
+
+
+def _serve_socket(host: str, port: int, ingest: queue.Queue, stats: IngestStats,
+                  stop: threading.Event) -> None:
+    """
+    Accept TCP clients and read NDJSON from each on its own thread.
+    """
+    with socket.create_server((host, port)) as server:
+        server.settimeout(0.5)
+        print(f"📡 Listening for NDJSON on tcp://{host}:{port}", file=sys.stderr)
+        while not stop.is_set():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(
+                target=_read_connection, args=(conn, ingest, stats), daemon=True
+            ).start()
+
+
+def _read_connection(conn: socket.socket, ingest: queue.Queue, stats: IngestStats) -> None:
+    with conn, conn.makefile("rb") as stream:
+        _read_stream(stream, ingest, stats)
+
+
+def _run_source(source: str, ingest: queue.Queue, stats: IngestStats,
+                stop: threading.Event) -> None:
+    try:
+        if source == "-":
+            _read_stream(sys.stdin.buffer, ingest, stats)
+        elif source.startswith("tcp://"):
+            host, _, port = source[len("tcp://"):].rpartition(":")
+            _serve_socket(host or "0.0.0.0", int(port), ingest, stats, stop)
+        else:
+            # Regular files and named pipes (mkfifo) read the same way
+            with open(source, "rb") as stream:
+                _read_stream(stream, ingest, stats)
+    finally:
+        ingest.put(_EOF)
+
+# =============================================================== #
+# ===================== MICRO-BATCH DETECTOR ==================== #
+# =============================================================== #
+
+def _run_detector(ingest: queue.Queue, output: queue.Queue, stats: IngestStats,
+                  batch_size: int, max_wait_s: float,
+                  detect: Callable[[list], list]) -> None:
+    """
+    Close a batch when it reaches batch_size or max_wait_s after its first
+    transaction arrived, whichever comes first.
+    """
+    done = False
+    while not done:
+        first = ingest.get()
+        if first is _EOF:
+            break
+        batch = [first]
+        deadline = time.monotonic() + max_wait_s
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = ingest.get(timeout=remaining) if remaining > 0 else ingest.get_nowait()
+            except queue.Empty:
+                break
+            if item is _EOF:
+                done = True
+                break
+            batch.append(item)
+
+        try:
+            results = detect(batch)
+        except Exception as e:
+            # The detector isolates malformed rows and failing rows itself.
+            # An exception escaping it leaves unknown velocity / graph state
+            # recorded, so the rows are not re-run (that would count them twice)
+            print(f"[❌ ERROR] Batch detection failed ({len(batch)} tx): {e}", file=sys.stderr)
+            results = [_failed(transaction, e) for transaction in batch]
+
+        stats.add(detected=len(results), batches=1,
+                  escalated=sum(1 for r in results if r.get("escalate")))
+        output.put(results)
+
+    output.put(_EOF)
+
+
+def _failed(transaction, error: Exception) -> dict:
+    return {"transaction_id": transaction.get("transaction_id") if isinstance(transaction, dict) else None,
+            "error": f"Detection failed: {error}"}
+
+# =============================================================== #
+# ============================= SINK ============================ #
+# =============================================================== #
+
+def _run_sink(output: queue.Queue, sink: str, escalated_only: bool) -> None:
+    stream = sys.stdout if sink == "-" else open(sink, "a")
+    try:
+        while True:
+            results = output.get()
+            if results is _EOF:
+                break
+            lines = [
+                _encode(result)
+                for result in results
+                if not escalated_only or result.get("escalate")
+            ]
+            if lines:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+# =============================================================== #
+# ========================= ENTRY POINTS ======================== #
+# =============================================================== #
+
+def run_stream(source: str,
+               sink: str = "-",
+               batch_size: int = DEFAULT_BATCH_SIZE,
+               max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+               max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+               max_pending_batches: int = DEFAULT_MAX_PENDING_BATCHES,
+               escalated_only: bool = False,
+               detect: Optional[Callable[[list], list]] = None) -> dict:
+    """
+    Stream transactions from `source` through detection into `sink`.
+
+    Memory is bounded by max_in_flight parsed transactions plus
+    max_pending_batches detected batches; when either queue is full the
+    upstream stage blocks.
+
+    Args:
+        source (str): File / FIFO path, "-" for stdin, or "tcp://host:port"
+        sink (str): Output NDJSON path, or "-" for stdout
+        batch_size (int): Max transactions per detection batch
+        max_wait_ms (float): Max time a batch waits to fill up
+        max_in_flight (int): Capacity of the ingest queue
+        max_pending_batches (int): Capacity of the output queue
+        escalated_only (bool): Only write results with escalate=True
+        detect (callable, optional): Batch detector, defaults to detect_fraud_batch
+
+    Returns:
+        dict: Final ingest statistics
+    """
+    stats = IngestStats()
+    stop = threading.Event()
+    ingest: queue.Queue = queue.Queue(maxsize=max_in_flight)
+    output: queue.Queue = queue.Queue(maxsize=max_pending_batches)
+
+    source_thread = threading.Thread(
+        target=_run_source, args=(source, ingest, stats, stop),
+        name="ingest-source", daemon=True)
+    detector_thread = threading.Thread(
+        target=_run_detector,
+        args=(ingest, output, stats, batch_size, max_wait_ms / 1000.0,
+              detect or detect_fraud_batch),
+        name="ingest-detector", daemon=True)
+
+    source_thread.start()
+    detector_thread.start()
+    try:
+        _run_sink(output, sink, escalated_only)
+    except KeyboardInterrupt:
+        print("⏹️ Stream ingest interrupted", file=sys.stderr)
+    finally:
+        stop.set()
+
+    return stats.snapshot()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Stream NDJSON transactions through fraud detection")
+    parser.add_argument("--source", default="-", help='File/FIFO path, "-" for stdin, or tcp://host:port')
+    parser.add_argument("--sink", default="-", help='Output NDJSON path, or "-" for stdout')
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--escalated-only", action="store_true")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Detection worker processes sharded by account_id (0 = in-process)")
+    args = parser.parse_args(argv)
+
+    detector = None
+    if args.workers > 0:
+        from main.sharded_workers import ShardedDetector
+        detector = ShardedDetector(args.workers)
+    else:
+        from ml_models.model_registry import get_model_registry
+        get_model_registry().preload()
+    try:
+        summary = run_stream(
+            source=args.source,
+            sink=args.sink,
+            batch_size=args.batch_size,
+            max_wait_ms=args.max_wait_ms,
+            max_in_flight=args.max_in_flight,
+            escalated_only=args.escalated_only,
+            detect=detector.detect if detector else None,
+        )
+    finally:
+        if detector:
+            detector.close()
+    print(f"📊 Stream ingest summary: {summary}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
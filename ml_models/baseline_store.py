@@ -0,0 +1,477 @@
+# =============================================================== #
+# ================= ml_models/baseline_store.py ================= #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Per-account baselines for millions of accounts
+# 🧮 Layout    : Fixed-width 80-byte records + open-addressing index,
+#                both memory-mapped .npy files
+# 👥 Sharing   : One writer, any number of read-only processes
+# 🛠️ Build     : python -m ml_models.baseline_store history.ndjson
+#                python -m ml_models.baseline_store --snapshot feature_store_snapshot.pkl
+# ✅ Used by   : behavior_baseline_model.py, tools/detect_fraud.py
+# =============================================================== #
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from ml_models.categorical_vocab import OOV_CODE, get_feature_vocab
+
+BASELINE_STORE_PATH = os.path.join(os.path.dirname(__file__), "baselines")
+
+BASELINE_LOCATIONS = 3
+DEFAULT_CAPACITY = 1 << 16
+READER_REFRESH_INTERVAL = 1.0   # Seconds between checks for a grown store
+READ_SPINS = 200                # Seqlock retries before a reader starts sleeping
+READ_TIMEOUT = 0.005            # Seconds before a record stuck mid-update counts as missing
+VOCAB_LEARN_CHUNK = 10_000      # History rows per vocabulary-learning pass in the CLI
+
+# One 80-byte record per account. `seq` is a seqlock counter: odd while
+# the writer is updating the record, so readers can retry torn reads.
+BASELINE_DTYPE = np.dtype([
+    ("seq", "<u4"),
+    ("count", "<u4"),
+    ("amount_mean", "<f8"),
+    ("amount_std", "<f8"),
+    ("amount_p95", "<f8"),          # NaN when the baseline has no quantiles
+    ("amount_p99", "<f8"),
+    ("hour_min", "i1"),
+    ("hour_max", "i1"),
+    ("n_locations", "u1"),
+    ("_pad", "u1", (5,)),
+    ("location_codes", "<i4", (BASELINE_LOCATIONS,)),
+    ("location_counts", "<u4", (BASELINE_LOCATIONS,)),
+    ("updated_at", "<f8"),
+])
+INDEX_DTYPE = np.dtype([("key", "<u8"), ("slot", "<u8")])   # key 0 = empty
+
+# =============================================================== #
+# =========================== HELPERS =========================== #
+# =============================================================== #
+
+def account_key(account_id: Any) -> int:
+    """
+    Non-zero 64-bit BLAKE2b key of an account id (0 marks empty slots).
+    """
+    digest = hashlib.blake2b(str(account_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+def location_code(location: Any, learn: bool = False) -> int:
+    """
+    Vocabulary code of a location as extract_features() would see it
+    (lowercased). Readers never learn: a miss replays vocabulary entries
+    other processes appended (read-only) and is OOV_CODE only if the
+    location is still unknown.
+    """
+    if location is None:
+        return OOV_CODE
+    return get_feature_vocab()["location"].encode(str(location).lower(), learn=learn)
+
+
+def pack_baseline(baseline: Dict[str, Any], count: int = 0, seq: int = 0,
+                  learn: bool = True) -> tuple:
+    """
+    build_baseline()-shaped dict → BASELINE_DTYPE field tuple. Location
+    strings become vocabulary codes (learned by default, so only the
+    writer and one-off conversions should pass learn=True; serving code
+    maps unseen locations to OOV_CODE with learn=False).
+    """
+    locations = list(baseline.get("common_locations", []))[:BASELINE_LOCATIONS]
+    codes = [location_code(loc, learn=learn) for loc, _ in locations]
+    counts = [max(0, int(n)) for _, n in locations]
+    codes += [OOV_CODE] * (BASELINE_LOCATIONS - len(codes))
+    counts += [0] * (BASELINE_LOCATIONS - len(counts))
+    hour_min, hour_max = baseline.get("hour_range", (8, 20))
+    return (
+        seq, count,
+        float(baseline.get("amount_mean", 0.0)), float(baseline.get("amount_std", 1.0)),
+        float(baseline.get("amount_p95", np.nan)), float(baseline.get("amount_p99", np.nan)),
+        hour_min, hour_max, len(locations), (0,) * 5,
+        codes, counts, time.time(),
+    )
+
+
+def baseline_record(baseline: Dict[str, Any], learn: bool = True) -> np.void:
+    """
+    Standalone record for a dict baseline (e.g. one from build_baseline()).
+    """
+    return np.array([pack_baseline(baseline, learn=learn)], dtype=BASELINE_DTYPE)[0]
+
+
+def _paths(path: str) -> Dict[str, str]:
+    return {
+        "records": path + ".records.npy",
+        "index": path + ".index.npy",
+        "meta": path + ".meta.json",
+    }
+
+def _rehash(index: np.ndarray, keys: np.ndarray, slots: np.ndarray) -> None:
+    """
+    Bulk linear-probing insert into an empty index, one vectorized round
+    per probe distance instead of one Python loop iteration per key.
+    """
+    mask = np.uint64(len(index) - 1)
+    table_keys = index["key"]
+    positions = keys & mask
+    pending = np.arange(len(keys))
+    while len(pending):
+        free = table_keys[positions[pending]] == 0
+        # Among keys landing on the same free position, the first one wins
+        _, first = np.unique(positions[pending[free]], return_index=True)
+        placed = pending[free][first]
+        index["key"][positions[placed]] = keys[placed]
+        index["slot"][positions[placed]] = slots[placed]
+        pending = np.setdiff1d(pending, placed, assume_unique=True)
+        positions[pending] = (positions[pending] + np.uint64(1)) & mask
+
+# =============================================================== #
+# ============================ STORE ============================ #
+# =============================================================== #
+
+class BaselineStore:
+    """
+    Memory-mapped baseline table.
+
+    Records live in `<path>.records.npy` at a fixed slot per account. The
+    slot is found through `<path>.index.npy`, a linear-probing hash table
+    of 64-bit account keys that is itself memory-mapped, so a reader never
+    loads or deserializes anything per account. Open with writable=True in
+    exactly one process. Growth rewrites both files and renames them into
+    place; readers pick the new files up on their next refresh and keep
+    using the old mappings (still valid) until then.
+    """
+
+    def __init__(self, path: str = BASELINE_STORE_PATH, writable: bool = False,
+                 capacity: int = DEFAULT_CAPACITY):
+        self.path = path
+        self.writable = writable
+        self._files = _paths(path)
+        self._lock = threading.Lock()
+        self._meta_mtime = None
+        self._next_refresh = 0.0
+        self.size = 0
+
+        if writable and not os.path.exists(self._files["meta"]):
+            self._create(max(16, capacity))
+        self._map()
+
+    # ----------------------------------------------------------- #
+    # Files
+    # ----------------------------------------------------------- #
+    def _create(self, capacity: int, records: np.ndarray = None) -> None:
+        """
+        Write fresh files for `capacity` records (copying `records` into the
+        same slots) and atomically swap them in.
+        """
+        index_size = 1 << (2 * capacity - 1).bit_length()   # ≥ 2x capacity, power of two
+        new_records = np.lib.format.open_memmap(
+            self._files["records"] + ".tmp.npy", mode="w+", dtype=BASELINE_DTYPE, shape=(capacity,))
+        new_index = np.lib.format.open_memmap(
+            self._files["index"] + ".tmp.npy", mode="w+", dtype=INDEX_DTYPE, shape=(index_size,))
+        if records is not None and self.size:
+            new_records[:self.size] = records[:self.size]
+            old_index = self._index
+            used = self._keys != 0
+            _rehash(new_index, self._keys[used], self._slots[used])
+        new_records.flush()
+        new_index.flush()
+        del new_records, new_index
+
+        os.replace(self._files["records"] + ".tmp.npy", self._files["records"])
+        os.replace(self._files["index"] + ".tmp.npy", self._files["index"])
+        self._write_meta(capacity)
+
+    def _write_meta(self, capacity: int) -> None:
+        meta = {"size": self.size, "capacity": capacity, "updated_at": time.time()}
+        with open(self._files["meta"] + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(self._files["meta"] + ".tmp", self._files["meta"])
+
+    def _map(self) -> None:
+        mode = "r+" if self.writable else "r"
+        self._meta_mtime = os.stat(self._files["meta"]).st_mtime_ns
+        self._records = np.load(self._files["records"], mmap_mode=mode)
+        self._index = np.load(self._files["index"], mmap_mode=mode)
+        if self._records.dtype != BASELINE_DTYPE or self._index.dtype != INDEX_DTYPE:
+            raise ValueError(f"{self.path}: baseline store layout changed, rebuild it "
+                             f"(python -m ml_models.baseline_store ...)")
+        self._mask = len(self._index) - 1
+        # Plain ndarray views: field access on the memmap itself is slower
+        self._keys = self._index["key"].view(np.ndarray)
+        self._slots = self._index["slot"].view(np.ndarray)
+        self._seqs = self._records["seq"].view(np.ndarray)
+        self._rows = self._records.view(np.ndarray)
+        if self.writable:
+            used = self._slots[self._keys != 0]
+            self.size = int(used.max()) + 1 if len(used) else 0
+
+    def refresh(self) -> bool:
+        """
+        Reader side: remap if the writer grew the store. Cheap (one stat)
+        and rate-limited, so it can be called on every lookup.
+        """
+        now = time.monotonic()
+        if self.writable or now < self._next_refresh:
+            return False
+        self._next_refresh = now + READER_REFRESH_INTERVAL
+        try:
+            if os.stat(self._files["meta"]).st_mtime_ns == self._meta_mtime:
+                return False
+            with self._lock:
+                self._map()
+        except OSError:
+            return False
+        return True
+
+    # ----------------------------------------------------------- #
+    # Lookups
+    # ----------------------------------------------------------- #
+    def _find(self, key: int) -> int:
+        """
+        Index position of `key`, or of the empty slot where it would go.
+        """
+        keys = self._keys
+        i = key & self._mask
+        while True:
+            current = int(keys[i])
+            if current == key or current == 0:
+                return i
+            i = (i + 1) & self._mask
+
+    def slot(self, account_id: Any) -> Optional[int]:
+        self.refresh()
+        i = self._find(account_key(account_id))
+        return int(self._slots[i]) if self._keys[i] else None
+
+    def record(self, account_id: Any) -> Optional[np.void]:
+        """
+        Consistent copy of an account's record (BASELINE_DTYPE), or None
+        (also when the record stays mid-update, e.g. after a writer died).
+        """
+        slot = self.slot(account_id)
+        return None if slot is None else self._read(slot)
+
+    def records(self, account_ids: Iterable[Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batch record(): vectorized index probing and one fancy-indexed copy.
+
+        Returns:
+            (np.ndarray, np.ndarray): BASELINE_DTYPE rows aligned with
+            `account_ids` (zeroed where missing or unreadable) and a bool
+            "found" mask
+        """
+        self.refresh()
+        keys = np.fromiter(map(account_key, account_ids), dtype=np.uint64)
+        n = len(keys)
+        slots = np.zeros(n, dtype=np.int64)
+        found = np.zeros(n, dtype=bool)
+        mask = np.uint64(self._mask)
+        positions = keys & mask
+        pending = np.arange(n)
+        while len(pending):
+            probed = self._keys[positions[pending]]
+            hit = probed == keys[pending]
+            slots[pending[hit]] = self._slots[positions[pending[hit]]]
+            found[pending[hit]] = True
+            pending = pending[~hit & (probed != 0)]
+            positions[pending] = (positions[pending] + np.uint64(1)) & mask
+
+        rows = np.zeros(n, dtype=BASELINE_DTYPE)
+        hits = np.flatnonzero(found)
+        seqs = self._seqs[slots[hits]]
+        rows[hits] = self._rows[slots[hits]]
+        # Seqlock check: re-read rows the writer touched during the copy
+        torn = (seqs & 1) | (self._seqs[slots[hits]] != seqs) | (rows["seq"][hits] != seqs)
+        for i in hits[torn.astype(bool)]:
+            record = self._read(int(slots[i]))
+            if record is None:
+                rows[i] = np.zeros((), dtype=BASELINE_DTYPE)
+                found[i] = False
+            else:
+                rows[i] = record
+        return rows, found
+
+    def _read(self, slot: int) -> Optional[np.void]:
+        """
+        Seqlock read: spin READ_SPINS times, then sleep-poll until
+        READ_TIMEOUT. None if the record never settles (a writer that died
+        mid-update leaves its sequence odd), so callers fall back to the
+        uncached baseline instead of hanging.
+        """
+        seqs, rows = self._seqs, self._rows
+        deadline = None
+        spins = 0
+        while True:
+            seq = seqs[slot]
+            if not seq & 1:
+                record = rows[slot].copy()
+                if seqs[slot] == seq:
+                    return record
+            spins += 1
+            if spins < READ_SPINS:
+                continue  # Writer mid-update
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + READ_TIMEOUT
+            elif now >= deadline:
+                return None
+            time.sleep(0.0001)
+
+    def __contains__(self, account_id: Any) -> bool:
+        return self.slot(account_id) is not None
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._keys))
+
+    # ----------------------------------------------------------- #
+    # Writer
+    # ----------------------------------------------------------- #
+    def put(self, account_id: Any, baseline: Dict[str, Any], count: int = 0) -> int:
+        """
+        Store a build_baseline()-shaped dict for an account.
+
+        Returns:
+            int: The account's slot
+        """
+        if not self.writable:
+            raise PermissionError("BaselineStore opened read-only")
+        key = account_key(account_id)
+        with self._lock:
+            i = self._find(key)
+            if self._keys[i]:
+                slot = int(self._slots[i])
+            else:
+                if self.size >= len(self._records):
+                    self._create(2 * len(self._records), self._records)
+                    self._map()
+                    i = self._find(key)
+                slot = self.size
+                self.size += 1
+                self._write_record(slot, baseline, count)
+                self._slots[i] = slot
+                self._keys[i] = key    # Published last: readers see a full record
+                return slot
+            self._write_record(slot, baseline, count)
+            return slot
+
+    def _write_record(self, slot: int, baseline: Dict[str, Any], count: int) -> None:
+        seq = int(self._seqs[slot])
+        seq += seq & 1                        # Left odd by a writer that died mid-update
+        packed = pack_baseline(baseline, count, seq + 1)
+        self._seqs[slot] = seq + 1            # Odd: update in progress
+        self._rows[slot] = packed
+        self._seqs[slot] = seq + 2            # Even: consistent again
+
+    def flush(self) -> None:
+        if self.writable:
+            with self._lock:
+                self._records.flush()
+                self._index.flush()
+                self._write_meta(len(self._records))
+
+# =============================================================== #
+# ========================== PUBLISHING ========================= #
+# =============================================================== #
+
+def publish_baselines(store: BaselineStore, feature_store) -> int:
+    """
+    Copy every account of an OnlineFeatureStore into the baseline store.
+
+    Returns:
+        int: Number of accounts written
+    """
+    written = 0
+    for account_id in list(feature_store._accounts):
+        state = feature_store.get(account_id)
+        if state is None:
+            continue
+        store.put(account_id, state.baseline(), count=state.count)
+        written += 1
+    store.flush()
+    return written
+
+
+_default_reader: Optional[BaselineStore] = None
+_default_reader_lock = threading.Lock()
+_default_reader_checked = 0.0
+
+
+def get_baseline_store() -> Optional[BaselineStore]:
+    """
+    Process-wide read-only view of BASELINE_STORE_PATH, or None until a
+    writer has created the store (checked at most once per refresh interval).
+    """
+    global _default_reader, _default_reader_checked
+    if _default_reader is None:
+        now = time.monotonic()
+        if now < _default_reader_checked:
+            return None
+        with _default_reader_lock:
+            if _default_reader is None:
+                _default_reader_checked = now + READER_REFRESH_INTERVAL
+                if not os.path.exists(_paths(BASELINE_STORE_PATH)["meta"]):
+                    return None
+                _default_reader = BaselineStore(BASELINE_STORE_PATH)
+    return _default_reader
+
+# =============================================================== #
+# ============================= CLI ============================= #
+# =============================================================== #
+
+def _iter_ndjson(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def main(argv=None) -> None:
+    from ml_models.feature_engineering import learn_vocabulary
+    from ml_models.online_feature_store import OnlineFeatureStore
+
+    parser = argparse.ArgumentParser(description="Build or update the baseline store")
+    parser.add_argument("history", nargs="*", help="NDJSON transaction history file(s)")
+    parser.add_argument("--snapshot", action="append", default=[],
+                        help="Online feature store snapshot(s) to publish (repeatable)")
+    parser.add_argument("--store", default=BASELINE_STORE_PATH)
+    args = parser.parse_args(argv)
+    if not args.history and not args.snapshot:
+        parser.error("give NDJSON history files and/or --snapshot files")
+
+    # One streaming pass; snapshots (shards or periods) merge into the same aggregates
+    features = OnlineFeatureStore(snapshot_path=None, max_accounts=1 << 62)
+    for path in args.snapshot:
+        part = OnlineFeatureStore(snapshot_path=None, max_accounts=1 << 62)
+        if part.load(path):
+            features.merge(part)
+    for path in args.history:
+        chunk = []
+        for transaction in _iter_ndjson(path):
+            features.update_transaction(transaction)
+            chunk.append(transaction)
+            if len(chunk) >= VOCAB_LEARN_CHUNK:
+                learn_vocabulary(chunk)   # Serving never learns; history is the offline step
+                chunk = []
+        learn_vocabulary(chunk)
+
+    store = BaselineStore(args.store, writable=True)
+    written = publish_baselines(store, features)
+    print(f"📦 Wrote {written} account baselines to {args.store} ({len(store)} accounts stored)")
+
+
+if __name__ == "__main__":
+    main()
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
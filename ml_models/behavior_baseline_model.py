@@ -7,9 +7,28 @@
 # ✅ Used by  : detect_fraud.py, risk_scorer.py
 # =============================================================== #
 
+import math
 import numpy as np
 from datetime import datetime, time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union
+
+from ml_models.baseline_store import location_code
+from ml_models.categorical_vocab import OOV_CODE
+from ml_models.feature_engineering import FeatureMatrix
+
+# Population defaults used when no per-account baseline is available
+AMOUNT_LOG_PIVOT = 8.5     # ≈ log1p(5,000): amounts above this look unusual
+AMOUNT_LOG_SCALE = 1.0
+QUIET_HOURS = (6, 22)      # Activity outside [6, 22] counts as off-hours
+ANOMALY_WEIGHTS = {"amount": 0.6, "hour": 0.25, "no_device": 0.15}
+
+# Scoring against an account's own baseline record (ml_models/baseline_store.py)
+AMOUNT_Z_SATURATION = 6.0  # |z| at which the amount part reaches 1
+HOUR_SLACK = 2             # Same tolerance as is_anomalous()
+BASELINE_ANOMALY_WEIGHTS = {"amount": 0.45, "hour": 0.2, "location": 0.2, "no_device": 0.15}
+# With amount quantiles, an amount is an outlier above p99 + spread, where
+# spread = max(p99 - p95, AMOUNT_TAIL_MIN_SPREAD * |p99|)
+AMOUNT_TAIL_MIN_SPREAD = 0.1
 
 # =============================================================== #
 # ============ BEHAVIOR BASELINE BUILDER & DETECTOR ============ #
@@ -26,7 +45,7 @@ def build_baseline(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
             - location (str)
 
     Returns:
-        Dict: Baseline profile with mean, std, time window, location freq
+        Dict: Baseline profile with mean, std, p95/p99, time window, location freq
     """
     amounts = []
     hours = []
@@ -49,28 +68,42 @@ def build_baseline(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
     return {
         "amount_mean": np.mean(amounts) if amounts else 0,
         "amount_std": np.std(amounts) if amounts else 1,
+        "amount_p95": np.quantile(amounts, 0.95) if amounts else np.nan,
+        "amount_p99": np.quantile(amounts, 0.99) if amounts else np.nan,
         "hour_range": (min(hours), max(hours)) if hours else (8, 20),
         "common_locations": sorted(location_counts.items(), key=lambda x: -x[1])[:3]
     }
 
-def is_anomalous(txn: Dict[str, Any], baseline: Dict[str, Any]) -> bool:
+def is_anomalous(txn: Dict[str, Any], baseline: Union[Dict[str, Any], np.void]) -> bool:
     """
-    Compare transaction to baseline and flag if it deviates.
+    Compare transaction to baseline and flag if it deviates. The amount
+    check uses the p95/p99 tail when the baseline has quantiles (robust to
+    a single huge outlier in the history), else a z-score above 3.
 
     Args:
         txn (Dict): Current transaction with keys like amount, timestamp, location
-        baseline (Dict): Output of build_baseline()
+        baseline (Dict | np.void): Output of build_baseline(), or a
+            BaselineStore record (location matched case-insensitively,
+            like extract_features())
 
     Returns:
         bool: True if anomalous, else False
     """
+    if isinstance(baseline, np.void):
+        return _is_anomalous_record(txn, baseline)
+
     amount = txn.get("amount", 0.0)
     ts = txn.get("timestamp")
     loc = txn.get("location", "")
 
-    amount_z = abs((amount - baseline["amount_mean"]) / baseline["amount_std"])
-    if amount_z > 3:
-        return True
+    p99 = baseline.get("amount_p99", np.nan)
+    if np.isfinite(p99):
+        if amount > _amount_tail_limit(baseline["amount_p95"], p99):
+            return True
+    else:
+        amount_z = abs((amount - baseline["amount_mean"]) / baseline["amount_std"])
+        if amount_z > 3:
+            return True
 
     try:
         txn_hour = datetime.fromisoformat(ts).hour
@@ -86,6 +119,249 @@ def is_anomalous(txn: Dict[str, Any], baseline: Dict[str, Any]) -> bool:
 
     return False
 
+
+def _amount_tail_limit(p95, p99, min_spread: float = AMOUNT_TAIL_MIN_SPREAD):
+    """
+    Amount above which a transaction is an outlier for its account.
+    """
+    return p99 + np.maximum(p99 - p95, min_spread * np.abs(p99))
+
+
+def _is_anomalous_record(txn: Dict[str, Any], record: np.void) -> bool:
+    amount = txn.get("amount", 0.0)
+    if np.isfinite(record["amount_p99"]):
+        if amount > _amount_tail_limit(record["amount_p95"], record["amount_p99"]):
+            return True
+    else:
+        std = float(record["amount_std"])
+        deviation = abs(amount - float(record["amount_mean"]))
+        if (deviation / std if std else (np.inf if deviation else np.nan)) > 3:
+            return True
+
+    try:
+        txn_hour = datetime.fromisoformat(txn.get("timestamp")).hour
+    except:
+        return True
+    if txn_hour < record["hour_min"] - HOUR_SLACK or txn_hour > record["hour_max"] + HOUR_SLACK:
+        return True
+
+    code = location_code(txn.get("location", ""))
+    return code == OOV_CODE or code not in record["location_codes"][:record["n_locations"]]
+
+# =============================================================== #
+# ================== FEATURE-BASED ANOMALY SCORE ================ #
+# =============================================================== #
+
+def default_model_params() -> Dict[str, Any]:
+    """
+    Parameters of the built-in behavior model: JSON-able scalars plus the
+    `hour_risk` weight array (one value per hour of day). This is what
+    ml_models/model_registry.py serves as the "builtin" version and what
+    saved artifacts contain.
+    """
+    hours = np.arange(24)
+    return {
+        "amount_log_pivot": AMOUNT_LOG_PIVOT,
+        "amount_log_scale": AMOUNT_LOG_SCALE,
+        "weights": dict(ANOMALY_WEIGHTS),
+        "baseline_weights": dict(BASELINE_ANOMALY_WEIGHTS),
+        "amount_z_saturation": AMOUNT_Z_SATURATION,
+        "hour_slack": HOUR_SLACK,
+        "amount_tail_min_spread": AMOUNT_TAIL_MIN_SPREAD,
+        "hour_risk": ((hours < QUIET_HOURS[0]) | (hours > QUIET_HOURS[1])).astype(np.float64),
+    }
+
+
+_DEFAULT_PARAMS = default_model_params()
+
+
+def _anomaly_kernel(log_amount, hour, has_device, params=None):
+    """
+    Shared scalar/vector formula so single and batch scoring agree exactly.
+    """
+    p = params or _DEFAULT_PARAMS
+    weights = p["weights"]
+    amount_part = 1.0 / (1.0 + np.exp(-(np.asarray(log_amount, dtype=np.float64)
+                                        - p["amount_log_pivot"]) / p["amount_log_scale"]))
+    hour_part = p["hour_risk"][np.asarray(hour, dtype=np.int64) % 24]
+    device_part = 1.0 - np.asarray(has_device, dtype=np.float64)
+    score = (weights["amount"] * amount_part
+             + weights["hour"] * hour_part
+             + weights["no_device"] * device_part)
+    return np.round(score, 4)
+
+
+def _baseline_kernel(amount, hour, location, has_device, records, params=None):
+    """
+    Anomaly score against per-account baseline records, element-wise over
+    aligned arrays (`location` holds vocabulary codes, `records` is a
+    BASELINE_DTYPE array). Mirrors is_anomalous(), but graded: the amount
+    part rises linearly from p95 to the outlier limit where quantiles are
+    known, else with |z| up to AMOUNT_Z_SATURATION.
+    """
+    p = params or _DEFAULT_PARAMS
+    weights = p["baseline_weights"]
+    amount = np.asarray(amount, dtype=np.float64)
+    hour = np.asarray(hour)
+    location = np.asarray(location)
+    std = records["amount_std"]
+    deviation = np.abs(amount - records["amount_mean"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(std > 0, deviation / std, np.where(deviation > 0, np.inf, 0.0))
+        p95, p99 = records["amount_p95"], records["amount_p99"]
+        tail = _amount_tail_limit(p95, p99, p["amount_tail_min_spread"]) - p95
+        tail_part = np.where(tail > 0, (amount - p95) / tail, (amount > p99).astype(np.float64))
+    amount_part = np.clip(np.where(np.isfinite(p99), tail_part, z / p["amount_z_saturation"]), 0.0, 1.0)
+
+    slack = p["hour_slack"]
+    hour_part = ((hour < records["hour_min"] - slack)
+                 | (hour > records["hour_max"] + slack)).astype(np.float64)
+
+    known = np.arange(records["location_codes"].shape[-1]) < records["n_locations"][..., None]
+    seen = ((records["location_codes"] == location[..., None]) & known).any(axis=-1)
+    location_part = ((location == OOV_CODE) | ~seen).astype(np.float64)
+
+    device_part = 1.0 - np.asarray(has_device, dtype=np.float64)
+    score = (weights["amount"] * amount_part
+             + weights["hour"] * hour_part
+             + weights["location"] * location_part
+             + weights["no_device"] * device_part)
+    return np.round(score, 4)
+
+
+def _raw_amount(features: Dict[str, Any]) -> float:
+    """
+    Exact transaction amount of a feature dict (older dicts without
+    "amount" fall back to the rounded log_amount).
+    """
+    amount = features.get("amount")
+    return float(amount) if amount is not None else math.expm1(features.get("log_amount", 0.0))
+
+
+def anomaly_score(features: Dict[str, Any], baseline: np.void = None,
+                  params: Dict[str, Any] = None) -> float:
+    """
+    Behavior anomaly score of one feature dict under explicit model
+    parameters (default: the built-in ones). Serving code should call
+    score_behavior_anomaly(), which uses the registry's active version.
+    """
+    if baseline is not None:
+        return float(_baseline_kernel(
+            [_raw_amount(features)],
+            [features.get("hour", 12)],
+            [location_code(features.get("location"))],
+            [features.get("has_device_id", 0)],
+            np.asarray(baseline).reshape(1),
+            params,
+        )[0])
+    return float(_anomaly_kernel(
+        [features.get("log_amount", 0.0)],
+        [features.get("hour", 12)],
+        [features.get("has_device_id", 0)],
+        params,
+    )[0])
+
+
+def anomaly_scores(feature_rows: Union[FeatureMatrix, List[Dict[str, Any]]],
+                   baselines: np.ndarray = None, found: np.ndarray = None,
+                   params: Dict[str, Any] = None) -> np.ndarray:
+    """
+    Vectorized anomaly_score(); see score_behavior_anomaly_batch() for args.
+    """
+    if isinstance(feature_rows, FeatureMatrix):
+        log_amount = feature_rows["log_amount"]
+        hour = feature_rows["hour"].astype(np.int64)
+        has_device = feature_rows["has_device_id"]
+    else:
+        n = len(feature_rows)
+        log_amount = np.fromiter((f.get("log_amount", 0.0) for f in feature_rows), np.float64, n)
+        hour = np.fromiter((f.get("hour", 12) for f in feature_rows), np.int64, n)
+        has_device = np.fromiter((f.get("has_device_id", 0) for f in feature_rows), np.float64, n)
+    if baselines is None:
+        return _anomaly_kernel(log_amount, hour, has_device, params)
+
+    scores = np.empty(len(log_amount), dtype=np.float64)
+    rows = np.ones(len(scores), dtype=bool) if found is None else np.asarray(found, dtype=bool)
+    if isinstance(feature_rows, FeatureMatrix):
+        locations = feature_rows.codes["location"][rows]
+    else:
+        locations = np.fromiter((location_code(f.get("location")) for f, keep in zip(feature_rows, rows)
+                                 if keep), np.int32)
+    if isinstance(feature_rows, FeatureMatrix):
+        amounts = feature_rows.amounts[rows]
+    else:
+        amounts = np.fromiter((_raw_amount(f) for f, keep in zip(feature_rows, rows) if keep), np.float64)
+    scores[rows] = _baseline_kernel(amounts, hour[rows], locations,
+                                    has_device[rows], baselines[rows], params)
+    scores[~rows] = _anomaly_kernel(log_amount[~rows], hour[~rows], has_device[~rows], params)
+    return scores
+
+# =============================================================== #
+# =================== SERVED (REGISTRY) SCORING ================= #
+# =============================================================== #
+
+def score_behavior_anomaly(features: Dict[str, Any], baseline: np.void = None) -> float:
+    """
+    Score how unusual a transaction looks from its extracted features,
+    using the active behavior model version (ml_models/model_registry.py).
+
+    Args:
+        features (Dict): Output of extract_features()
+        baseline (np.void, optional): The account's BaselineStore record;
+            without one, population defaults are used
+
+    Returns:
+        float: Anomaly score in [0, 1]
+    """
+    from ml_models.model_registry import BEHAVIOR_MODEL, get_model_registry
+    return get_model_registry().predict_one(BEHAVIOR_MODEL, features, baseline)
+
+
+def get_ml_risk_score(features: Dict[str, Any]) -> float:
+    """
+    ML risk score in [0, 1] used by tools/risk_scorer.compute_risk_score.
+    """
+    return score_behavior_anomaly(features)
+
+
+def score_behavior_anomaly_batch(feature_rows: Union[FeatureMatrix, List[Dict[str, Any]]],
+                                 baselines: np.ndarray = None,
+                                 found: np.ndarray = None) -> np.ndarray:
+    """
+    Vectorized score_behavior_anomaly() over many feature dicts, as one
+    batched predict() on the active behavior model version.
+
+    Args:
+        feature_rows (FeatureMatrix | List[Dict]): extract_features_batch()
+            output, or extract_features() output per transaction
+        baselines (np.ndarray, optional): BASELINE_DTYPE rows aligned with
+            feature_rows, e.g. from BaselineStore.records()
+        found (np.ndarray, optional): Bool mask of rows that have a
+            baseline; the others use population defaults (default: all)
+
+    Returns:
+        np.ndarray: Anomaly score per row, in input order
+    """
+    from ml_models.model_registry import BEHAVIOR_MODEL, get_model_registry
+    return get_model_registry().predict(BEHAVIOR_MODEL, feature_rows, baselines, found)
+
+
+def score_baseline_anomaly_batch(features: FeatureMatrix, baselines: np.ndarray) -> np.ndarray:
+    """
+    Continuous anomaly score of each row against its own account baseline:
+    amount z-scores, hour-window violations and location membership are
+    whole-column NumPy operations (no per-row timestamp parsing or list
+    search), so a million rows score in well under a second.
+
+    Args:
+        features (FeatureMatrix): extract_features_batch() output
+        baselines (np.ndarray): BASELINE_DTYPE rows aligned with `features`
+
+    Returns:
+        np.ndarray: Anomaly score per row in [0, 1]
+    """
+    return score_behavior_anomaly_batch(features, baselines)
+
 # =============================================================== #
 # ======================== END OF FILE ========================= #
 # =============================================================== #
\ No newline at end of file
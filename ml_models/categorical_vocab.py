@@ -0,0 +1,244 @@
+# =============================================================== #
+# ============== ml_models/categorical_vocab.py ================= #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Stable int32 codes for location / merchant / txn_type
+# 🧮 Codes     : 0 = OOV bucket, 1..N in first-seen order
+# 💾 Persists  : Append-only JSONL log → same codes after a restart
+# ✅ Used by   : feature_engineering.py (FeatureMatrix), baseline store
+# =============================================================== #
+
+import fcntl
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+VOCAB_FILE = os.path.join(os.path.dirname(__file__), "categorical_vocab.jsonl")
+
+OOV_CODE = 0
+OOV_LABEL = "<oov>"
+
+# Vocabulary fields and the max number of distinct values each may learn
+VOCAB_LIMITS = {
+    "location": 65_536,
+    "merchant": 1_000_000,
+    "txn_type": 1_024,
+}
+
+# =============================================================== #
+# ========================== ONE FIELD ========================== #
+# =============================================================== #
+
+class CategoricalVocab:
+    """
+    Value → code mapping for one categorical field.
+
+    Lookups are lock-free dict reads; new values are added under a lock,
+    through `on_add` (the persistence hook) when one is set, before the
+    code is visible to other threads. Once `max_size` values are known,
+    unseen values map to OOV_CODE instead of growing the table. A
+    non-learning miss first calls `on_miss` (if set), which returns True
+    when it may have registered values other processes learned.
+    """
+
+    def __init__(self, field: str, max_size: int, on_add=None, on_miss=None):
+        self.field = field
+        self.max_size = max_size
+        self._codes: Dict[str, int] = {}
+        self._labels: List[str] = [OOV_LABEL]
+        self._on_add = on_add
+        self._on_miss = on_miss
+        self._lock = threading.Lock()
+
+    def _learn(self, value: str) -> int:
+        with self._lock:
+            code = self._codes.get(value)
+            if code is not None:
+                return code
+            if self._on_add is not None:
+                return self._on_add(self, value)
+            if len(self) >= self.max_size:
+                return OOV_CODE
+            return self.restore(value)
+
+    def restore(self, value: str) -> int:
+        """
+        Register a value under the next code (or return its existing code).
+        """
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._labels)
+            self._labels.append(value)
+            self._codes[value] = code
+        return code
+
+    def encode(self, value: Any, learn: bool = True) -> int:
+        """
+        Code for a value; unseen values are learned unless `learn` is False
+        or the vocabulary is full, in which case OOV_CODE is returned.
+        """
+        code = self._codes.get(value)
+        if code is not None:
+            return code
+        if not isinstance(value, str):
+            return OOV_CODE
+        if not learn:
+            if self._on_miss is not None and self._on_miss():
+                return self._codes.get(value, OOV_CODE)
+            return OOV_CODE
+        return self._learn(value)
+
+    def encode_many(self, values: Iterable[Any], learn: bool = True) -> np.ndarray:
+        values = values if isinstance(values, list) else list(values)
+        get = self._codes.get
+        codes = np.fromiter((get(v, -1) for v in values), dtype=np.int32, count=len(values))
+        for i in np.flatnonzero(codes < 0):
+            codes[i] = self.encode(values[i], learn)
+        return codes
+
+    def decode(self, code: int) -> str:
+        return self._labels[code] if 0 <= code < len(self._labels) else OOV_LABEL
+
+    def decode_many(self, codes: np.ndarray) -> np.ndarray:
+        labels = np.empty(len(self._labels), dtype=object)
+        labels[:] = self._labels
+        return labels[np.asarray(codes, dtype=np.int64)]
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self._codes
+
+    def __len__(self) -> int:
+        return len(self._labels) - 1
+
+# =============================================================== #
+# ===================== FEATURE VOCABULARY ====================== #
+# =============================================================== #
+
+class FeatureVocabulary:
+    """
+    One CategoricalVocab per field in VOCAB_LIMITS, persisted to a single
+    append-only JSONL file: each line is {"field": ..., "value": ...} and a
+    value's code is its position among the lines of its field, so codes are
+    never reassigned across restarts.
+
+    Several processes (e.g. sharded detection workers) may share the file:
+    a new value is appended under an exclusive flock after first replaying
+    lines other processes added, so every process agrees on every code.
+    """
+
+    def __init__(self, path: Optional[str] = VOCAB_FILE, limits: Dict[str, int] = None):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._file = None
+        self._offset = 0
+        self.fields = {
+            field: CategoricalVocab(field, max_size, on_add=self._learn if path else None,
+                                    on_miss=self.refresh if path else None)
+            for field, max_size in (limits or VOCAB_LIMITS).items()
+        }
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a+b")
+            with self._write_lock:
+                self._catch_up()
+
+    # ----------------------------------------------------------- #
+    # Persistence
+    # ----------------------------------------------------------- #
+    def _catch_up(self) -> None:
+        """
+        Replay log lines past our offset (caller holds _write_lock).
+        """
+        self._file.seek(self._offset)
+        for line in self._file:
+            if not line.endswith(b"\n"):
+                break  # Partially written by another process; read it next time
+            self._offset += len(line)
+            try:
+                entry = json.loads(line)
+                vocab = self.fields.get(entry["field"])
+                value = entry["value"]
+            except (ValueError, KeyError, TypeError):
+                print(f"[⚠️ WARN] Skipping bad vocabulary entry in {self.path}: {line[:80]!r}")
+                continue
+            if vocab is not None:
+                vocab.restore(value)
+
+    def refresh(self) -> bool:
+        """
+        Read-only catch-up on values other processes (e.g. the baseline
+        writer) appended since our last read; never writes to the log.
+        Returns whether there was anything new to replay.
+        """
+        file = self._file
+        if file is None or os.fstat(file.fileno()).st_size <= self._offset:
+            return False
+        with self._write_lock:
+            if self._file is None:
+                return False
+            self._catch_up()
+        return True
+
+    def _learn(self, vocab: CategoricalVocab, value: str) -> int:
+        with self._write_lock:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                self._catch_up()
+                code = vocab._codes.get(value)
+                if code is not None:
+                    return code
+                if len(vocab) >= vocab.max_size:
+                    return OOV_CODE
+                line = json.dumps({"field": vocab.field, "value": value}).encode("utf-8") + b"\n"
+                self._file.seek(0, os.SEEK_END)
+                self._file.write(line)
+                self._file.flush()
+                self._offset = self._file.tell()
+                return vocab.restore(value)
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    # ----------------------------------------------------------- #
+    # Public API
+    # ----------------------------------------------------------- #
+    def __getitem__(self, field: str) -> CategoricalVocab:
+        return self.fields[field]
+
+    def encode_features(self, features: Dict[str, Any], learn: bool = True) -> Dict[str, Any]:
+        """
+        Copy of an extract_features() dict with the categorical strings
+        replaced by their int codes.
+        """
+        encoded = dict(features)
+        for field, vocab in self.fields.items():
+            if field in encoded:
+                encoded[field] = vocab.encode(encoded[field], learn)
+        return encoded
+
+    def close(self) -> None:
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_default_vocab: Optional[FeatureVocabulary] = None
+_default_vocab_lock = threading.Lock()
+
+
+def get_feature_vocab() -> FeatureVocabulary:
+    """
+    Return the process-wide FeatureVocabulary backed by VOCAB_FILE.
+    """
+    global _default_vocab
+    if _default_vocab is None:
+        with _default_vocab_lock:
+            if _default_vocab is None:
+                _default_vocab = FeatureVocabulary()
+    return _default_vocab
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
@@ -0,0 +1,260 @@
+# =============================================================== #
+# ================== ml_models/entity_graph.py ================== #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Online entity-link graph (accounts linked through
+#                shared email / phone / device / address)
+# 🧮 Method    : Incremental union-find + attribute → entity index
+# ⏱️ Queries   : cluster id / size in O(α(n)) per lookup
+# 💾 Persists  : Periodic pickle snapshot for warm restarts
+# ✅ Used by   : tools/detect_fraud.py (entity_cluster_size feature)
+# =============================================================== #
+
+import os
+import pickle
+import threading
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional
+
+from ml_models.entity_linkage import LINK_KEYS, DisjointSet, link_value
+
+GRAPH_SNAPSHOT_FILE = os.path.join(os.path.dirname(__file__), "entity_graph_snapshot.pkl")
+DEFAULT_SNAPSHOT_INTERVAL = 300.0   # Seconds between automatic snapshots
+SNAPSHOT_CHUNK = 16384              # Items pickled per step while snapshotting
+CLUSTER_SIZE_FIELD = "entity_cluster_size"
+
+# =============================================================== #
+# ======================= ENTITY LINK GRAPH ===================== #
+# =============================================================== #
+
+class EntityLinkGraph:
+    """
+    Entities (e.g. account ids) as union-find nodes. Each (key, value)
+    attribute remembers the first entity seen with it; a later entity with
+    the same attribute is unioned with that one, so clusters merge online
+    exactly as find_linked_entities() would group the full history.
+
+    Missing or blank attribute values never link; structured ones (dicts,
+    lists) link on their canonical form, as in link_components(). Once
+    `snapshot_interval` seconds have passed, an update also starts a
+    background snapshot (atomic rename); the next process loads it on start.
+    """
+
+    def __init__(self, snapshot_path: Optional[str] = GRAPH_SNAPSHOT_FILE,
+                 keys: Iterable[str] = LINK_KEYS,
+                 snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL):
+        self.snapshot_path = snapshot_path
+        self.keys = tuple(keys)
+        self.snapshot_interval = snapshot_interval
+        self._nodes: Dict[Any, int] = {}          # entity id → node
+        self._ids: List[Any] = []                 # node → entity id
+        self._sets = DisjointSet()
+        self._attributes: Dict[tuple, int] = {}   # (key, value) → first node
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._next_snapshot = time.monotonic() + snapshot_interval
+        if snapshot_path:
+            self.load()
+
+    # ----------------------------------------------------------- #
+    # Updates
+    # ----------------------------------------------------------- #
+    def _node(self, entity_id: Any) -> int:
+        node = self._nodes.get(entity_id)
+        if node is None:
+            node = self._nodes[entity_id] = self._sets.add()
+            self._ids.append(entity_id)
+        return node
+
+    def add(self, entity_id: Any, attributes: Dict[str, Any]) -> int:
+        """
+        Add an entity (or new attributes of a known one) and merge every
+        cluster it now links to.
+
+        Returns:
+            int: Size of the entity's cluster afterwards
+        """
+        with self._lock:
+            node = self._node(entity_id)
+            for key in self.keys:
+                value = link_value(attributes.get(key))
+                if value is None:
+                    continue
+                first = self._attributes.setdefault((key, value), node)
+                if first != node:
+                    self._sets.union(node, first)
+            size = self._sets.set_size(node)
+
+        if self.snapshot_path and time.monotonic() >= self._next_snapshot:
+            self.maybe_snapshot()
+        return size
+
+    def add_transaction(self, transaction: Dict[str, Any]) -> int:
+        """
+        Link the transaction's account through its email / phone / device /
+        address fields. Returns the account's cluster size (0 without an
+        account_id).
+        """
+        account_id = transaction.get("account_id")
+        if account_id is None:
+            return 0
+        return self.add(account_id, transaction)
+
+    def enrich(self, transaction: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a transaction's links and return a copy carrying
+        CLUSTER_SIZE_FIELD (left untouched if the caller supplied it).
+        """
+        if transaction.get("account_id") is None:
+            return transaction
+        enriched = dict(transaction)
+        enriched.setdefault(CLUSTER_SIZE_FIELD, self.add_transaction(transaction))
+        return enriched
+
+    # ----------------------------------------------------------- #
+    # Queries
+    # ----------------------------------------------------------- #
+    def cluster_id(self, entity_id: Any) -> Optional[Any]:
+        """
+        Representative entity of the cluster, or None for unknown entities.
+        Stable until the cluster merges with another one.
+        """
+        with self._lock:
+            node = self._nodes.get(entity_id)
+            return None if node is None else self._ids[self._sets.find(node)]
+
+    def cluster_size(self, entity_id: Any) -> int:
+        """
+        Number of entities in the cluster (0 for unknown entities).
+        """
+        with self._lock:
+            node = self._nodes.get(entity_id)
+            return 0 if node is None else self._sets.set_size(node)
+
+    def same_cluster(self, a: Any, b: Any) -> bool:
+        with self._lock:
+            node_a, node_b = self._nodes.get(a), self._nodes.get(b)
+            if node_a is None or node_b is None:
+                return False
+            return self._sets.find(node_a) == self._sets.find(node_b)
+
+    def members(self, entity_id: Any) -> List[Any]:
+        """
+        All entities in the cluster. O(n): meant for investigations, not
+        for the per-transaction path.
+        """
+        with self._lock:
+            node = self._nodes.get(entity_id)
+            if node is None:
+                return []
+            root = self._sets.find(node)
+            return [self._ids[i] for i in range(len(self._ids)) if self._sets.find(i) == root]
+
+    def __contains__(self, entity_id: Any) -> bool:
+        return entity_id in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # ----------------------------------------------------------- #
+    # Snapshots
+    # ----------------------------------------------------------- #
+    def maybe_snapshot(self) -> bool:
+        """
+        Start a background snapshot if the interval elapsed (one writer at
+        a time), so the updating request thread never pays for it.
+        """
+        if not self._snapshot_lock.acquire(blocking=False):
+            return False
+        if time.monotonic() < self._next_snapshot:
+            self._snapshot_lock.release()
+            return False
+        self._next_snapshot = time.monotonic() + self.snapshot_interval
+        threading.Thread(target=self._background_snapshot,
+                         name="entity-graph-snapshot", daemon=True).start()
+        return True
+
+    def _background_snapshot(self) -> None:
+        try:
+            self.snapshot()
+        finally:
+            self._snapshot_lock.release()
+
+    def snapshot(self, path: Optional[str] = None) -> None:
+        """
+        Write the graph to `path` (atomic rename). Only flat copies of the
+        arrays and attribute index are taken under the lock; they are then
+        pickled SNAPSHOT_CHUNK items at a time, so request threads get the
+        GIL back between chunks while a large graph is written.
+        """
+        path = path or self.snapshot_path
+        with self._lock:
+            ids = list(self._ids)
+            parent = list(self._sets.parent)
+            size = list(self._sets.size)
+            attributes = self._attributes.copy()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"version": 2, "keys": self.keys}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                # Sections ids, parent, size, attributes: chunks, each ended by None
+                for items in (iter(ids), iter(parent), iter(size), iter(attributes.items())):
+                    chunk = list(islice(items, SNAPSHOT_CHUNK))
+                    while chunk:
+                        f.write(pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL))
+                        chunk = list(islice(items, SNAPSHOT_CHUNK))
+                    pickle.dump(None, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[⚠️ WARN] Entity graph snapshot failed: {e}")
+
+    def load(self, path: Optional[str] = None) -> bool:
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+                if data["version"] == 1:
+                    ids, parent, size, attributes = (data["ids"], data["parent"],
+                                                     data["size"], data["attributes"])
+                else:
+                    ids, parent, size, attributes = [], [], [], {}
+                    for extend in (ids.extend, parent.extend, size.extend, attributes.update):
+                        chunk = pickle.load(f)
+                        while chunk is not None:
+                            extend(chunk)
+                            chunk = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError) as e:
+            print(f"[⚠️ WARN] Ignoring unreadable entity graph snapshot {path}: {e}")
+            return False
+        with self._lock:
+            self._ids = ids
+            self._nodes = {entity_id: node for node, entity_id in enumerate(ids)}
+            self._sets = DisjointSet()
+            self._sets.parent, self._sets.size = parent, size
+            self._attributes = attributes
+        print(f"[📦 Entity Graph] Restored {len(ids)} entities from {path}")
+        return True
+
+
+_default_graph: Optional[EntityLinkGraph] = None
+_default_graph_lock = threading.Lock()
+
+
+def get_entity_graph() -> EntityLinkGraph:
+    """
+    Return the process-wide EntityLinkGraph. Sharded detection keeps a
+    single graph in the ShardedDetector process and passes cluster sizes
+    down, so workers never split a ring across per-shard graphs.
+    """
+    global _default_graph
+    if _default_graph is None:
+        with _default_graph_lock:
+            if _default_graph is None:
+                _default_graph = EntityLinkGraph(GRAPH_SNAPSHOT_FILE)
+    return _default_graph
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
@@ -1,51 +1,145 @@
 # =============================================================== #
 # ============ ml_models/entity_linkage.py ====================== #
 # --------------------------------------------------------------- #
-# 📌 Purpose   : Identify related entities using dummy linkage logic
-# 🔗 Simulates relationships based on shared metadata
-# 🎯 Output    : List of linked entity pairs or clusters
+# 📌 Purpose   : Link entities that share identifying metadata
+# 🔗 Method    : Hash index per key + disjoint-set (union-find) merge
+# 🎯 Output    : Clusters = full connected components (transitive links)
 # ✅ Used by  : tools/detect_fraud.py or downstream flows
 # =============================================================== #
 
-from typing import List, Dict
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Attributes whose exact (non-empty) value links two entities
+LINK_KEYS = ("email", "phone", "device_id", "address")
+
+_SCALAR_TYPES = (str, int, float)
+
+
+def link_value(value: Any) -> Optional[Any]:
+    """
+    Hashable form of an attribute value for linking, or None if it must
+    not link (missing / blank). Structured values (e.g. an address dict
+    or a list) become canonical JSON, so equal structures still link.
+    """
+    if not value or (type(value) is str and value.isspace()):
+        return None
+    if isinstance(value, _SCALAR_TYPES):
+        return value
+    try:
+        return json.dumps(value, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return None
+
+# =============================================================== #
+# ========================= DISJOINT SET ======================== #
+# =============================================================== #
+
+class DisjointSet:
+    """
+    Union-find over integer ids 0..n-1 with union by size and path
+    halving: any sequence of m operations costs O(m·α(n)), effectively
+    constant per operation. Ids can be appended with add().
+    """
+    __slots__ = ("parent", "size")
+
+    def __init__(self, n: int = 0):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def add(self) -> int:
+        """
+        Append a new singleton set and return its id.
+        """
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        return len(self.parent) - 1
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> int:
+        """
+        Merge the sets of a and b; returns the surviving root.
+        """
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+    def set_size(self, x: int) -> int:
+        return self.size[self.find(x)]
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
 
 # =============================================================== #
-# =============== DUMMY ENTITY LINKAGE FUNCTION ================= #
+# ================== ENTITY LINKAGE (UNION-FIND) ================ #
 # =============================================================== #
 
-def find_linked_entities(entities: List[Dict]) -> List[List[str]]:
+def link_components(entities: Sequence[Dict], keys: Iterable[str] = LINK_KEYS) -> List[List[int]]:
+    """
+    Connected components of entities linked by equal values on any key.
+
+    One pass per key keeps a value → first-entity index, so every entity
+    is unioned with the first one sharing the value: O(n·k·α(n)) instead
+    of comparing all pairs.
+
+    Returns:
+        List[List[int]]: Entity positions per component (including
+        singletons), components ordered by their first member
     """
-    Simulate linkage between entities based on shared metadata
-    (e.g., phone number, address, device ID).
+    n = len(entities)
+    sets = DisjointSet(n)
+    union = sets.union
+    for key in keys:
+        first_seen: Dict[Any, int] = {}
+        for i, value in enumerate([entity.get(key) for entity in entities]):
+            if type(value) is not str or not value or value.isspace():
+                value = link_value(value)
+                if value is None:
+                    continue  # Missing / blank values never link
+            j = first_seen.setdefault(value, i)
+            if j != i:
+                union(i, j)
+
+    find = sets.find
+    components: Dict[int, List[int]] = {}
+    for i in range(n):
+        root = find(i)
+        members = components.get(root)
+        if members is None:
+            components[root] = [i]
+        else:
+            members.append(i)
+    return list(components.values())
+
+
+def find_linked_entities(entities: List[Dict], keys: Iterable[str] = LINK_KEYS) -> List[List[str]]:
+    """
+    Group entities that share metadata (email, phone, device ID, address),
+    following links transitively: if A shares an email with B and B a
+    phone with C, all three are one cluster.
 
     Args:
         entities (List[Dict]): List of entity records, each with metadata
+        keys (Iterable[str]): Attributes that link entities (default LINK_KEYS)
 
     Returns:
-        List[List[str]]: List of clusters (linked entity IDs)
+        List[List[str]]: List of clusters (linked entity IDs), each in
+        input order, clusters ordered by first member; singletons omitted
     """
-
-    clusters = []
-    seen = set()
-
-    for i, entity in enumerate(entities):
-        group = [entity["entity_id"]]
-        for j in range(i + 1, len(entities)):
-            other = entities[j]
-            # Dummy rule: shared email or phone = potential linkage
-            if (
-                entity.get("email") == other.get("email")
-                or entity.get("phone") == other.get("phone")
-            ):
-                group.append(other["entity_id"])
-        if len(group) > 1:
-            # Avoid duplicates
-            group_sorted = tuple(sorted(group))
-            if group_sorted not in seen:
-                clusters.append(group)
-                seen.add(group_sorted)
-
-    return clusters
+    return [[entities[i]["entity_id"] for i in members]
+            for members in link_components(entities, keys) if len(members) > 1]
 
 
 # =============================================================== #
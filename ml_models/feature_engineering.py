@@ -3,12 +3,26 @@
 # --------------------------------------------------------------- #
 # 📌 Purpose   : Extract and preprocess features from transaction data
 # 🔍 Supports: fraud scoring, behavior modeling, rule matching
-# 🎯 Returns  : Normalized feature dicts for modeling
+# 🎯 Returns  : Normalized feature dicts / columnar FeatureMatrix
 # ✅ Used by  : detect_fraud.py, risk_scorer.py, behavior_baseline_model.py
 # =============================================================== #
 
+import math
 from datetime import datetime
-from typing import Dict, Any
+from itertools import repeat
+from typing import Dict, Any, Iterator, List
+
+import numpy as np
+
+from ml_models.categorical_vocab import OOV_CODE, FeatureVocabulary, get_feature_vocab
+
+# Fixed column schema shared by extract_features() and FeatureMatrix
+NUMERIC_FEATURES = ("log_amount", "hour", "day_of_week", "is_weekend", "has_device_id")
+CATEGORICAL_FEATURES = ("location", "merchant", "txn_type")
+FEATURE_SCHEMA = ("log_amount", "hour", "day_of_week", "is_weekend",
+                  "location", "merchant", "txn_type", "has_device_id")
+_INTEGER_FEATURES = frozenset(("hour", "day_of_week", "is_weekend", "has_device_id"))
+_DEFAULT_TIME_FEATURES = (12, 0, 0)   # hour, day_of_week, is_weekend
 
 # =============================================================== #
 # ====================== FEATURE EXTRACTOR ====================== #
@@ -30,6 +44,7 @@ def extract_features(transaction: Dict[str, Any]) -> Dict[str, Any]:
     # Amount (log-scaled)
     amt = float(transaction.get("amount", 0.0))
     features["log_amount"] = round(0 if amt <= 0 else math.log1p(amt), 4)
+    features["amount"] = amt  # Exact value for baseline z-scores (log_amount is rounded)
 
     # Timestamp features
     ts = transaction.get("timestamp", "")
@@ -55,6 +70,206 @@ def extract_features(transaction: Dict[str, Any]) -> Dict[str, Any]:
 
     return features
 
+# =============================================================== #
+# =================== COLUMNAR BATCH EXTRACTOR ================== #
+# =============================================================== #
+
+class FeatureMatrix:
+    """
+    extract_features() output for a batch, stored column-wise.
+
+    `numeric` is an (n, len(NUMERIC_FEATURES)) float64 matrix and `codes`
+    maps each CATEGORICAL_FEATURES name to an int32 array of vocabulary
+    codes (see ml_models/categorical_vocab.py). `amounts` keeps the raw
+    (un-logged) amounts for scoring code that needs them. matrix["hour"]
+    returns a column; matrix[i] / iteration return the same dict
+    extract_features() would build for row i.
+    """
+
+    def __init__(self, numeric: np.ndarray, codes: Dict[str, np.ndarray],
+                 amounts: np.ndarray, vocab, oov_values: Dict[tuple, str] = None):
+        self.numeric = numeric
+        self.codes = codes
+        self.amounts = amounts
+        self.vocab = vocab
+        self._oov_values = oov_values or {}   # (field, row) → string for OOV codes
+        self._positions = {name: i for i, name in enumerate(NUMERIC_FEATURES)}
+
+    def column(self, name: str) -> np.ndarray:
+        if name in self._positions:
+            return self.numeric[:, self._positions[name]]
+        return self.codes[name]
+
+    def labels(self, name: str) -> np.ndarray:
+        """
+        Decoded strings of a categorical column.
+        """
+        labels = self.vocab[name].decode_many(self.codes[name])
+        for (field, index), value in self._oov_values.items():
+            if field == name:
+                labels[index] = value
+        return labels
+
+    def row(self, index: int) -> Dict[str, Any]:
+        values = self.numeric[index]
+        features = {}
+        for name in FEATURE_SCHEMA:
+            if name in self._positions:
+                value = values[self._positions[name]]
+                features[name] = int(value) if name in _INTEGER_FEATURES else float(value)
+            else:
+                code = int(self.codes[name][index])
+                if code == OOV_CODE:
+                    features[name] = self._oov_values[(name, index)]
+                else:
+                    features[name] = self.vocab[name].decode(code)
+        features["amount"] = float(self.amounts[index])
+        return features
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [self.row(i) for i in range(len(self))]
+
+    def __getitem__(self, key):
+        return self.column(key) if isinstance(key, str) else self.row(key)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self.row(i) for i in range(len(self)))
+
+    def __len__(self) -> int:
+        return self.numeric.shape[0]
+
+
+def _time_features_scalar(ts: Any) -> tuple:
+    try:
+        dt = datetime.fromisoformat(ts)
+        return dt.hour, dt.weekday(), int(dt.weekday() >= 5)
+    except:
+        return _DEFAULT_TIME_FEATURES
+
+
+# Naive ISO layout "YYYY-MM-DD[( |T)hh[:mm[:ss[.ffffff]]]]" by character position
+_ISO_DIGIT = None
+_ISO_LAYOUT = ([_ISO_DIGIT] * 4 + ["-"] + [_ISO_DIGIT] * 2 + ["-"] + [_ISO_DIGIT] * 2
+               + [" T"] + [_ISO_DIGIT] * 2 + [":"] + [_ISO_DIGIT] * 2 + [":"]
+               + [_ISO_DIGIT] * 2 + ["."] + [_ISO_DIGIT] * 6)
+_ISO_LENGTHS = (10, 13, 16, 19, 21, 22, 23, 24, 25, 26)
+
+
+def _naive_iso_mask(timestamps: list) -> np.ndarray:
+    """
+    True where a timestamp is a naive ISO string (see _ISO_LAYOUT), checked
+    column-wise on the code points of a fixed-width array. Offsets
+    ("+05:30", "Z", "-08:00") are excluded: the scalar path keeps local
+    wall-clock time whereas datetime64 would shift them to UTC.
+    """
+    n = len(timestamps)
+    strings = np.array([ts if type(ts) is str else "" for ts in timestamps], dtype=str)
+    width = strings.dtype.itemsize // 4
+    if width < 10:
+        return np.zeros(n, dtype=bool)
+    codes = strings.view(np.uint32).reshape(n, width)
+    lengths = np.char.str_len(strings)
+
+    mask = np.isin(lengths, _ISO_LENGTHS)
+    for position, allowed in enumerate(_ISO_LAYOUT[:width]):
+        column = codes[:, position]
+        if allowed is _ISO_DIGIT:
+            ok = (column >= 48) & (column <= 57)
+        else:
+            ok = np.isin(column, [ord(ch) for ch in allowed])
+        mask &= ok | (lengths <= position)
+    return mask
+
+
+def _time_features_batch(timestamps: list) -> np.ndarray:
+    """
+    (n, 3) hour / day_of_week / is_weekend, parsed with datetime64 where
+    possible and via the scalar parser for everything else.
+    """
+    n = len(timestamps)
+    out = np.empty((n, 3), dtype=np.float64)
+    out[:] = _DEFAULT_TIME_FEATURES
+    if not n:
+        return out
+
+    naive = _naive_iso_mask(timestamps)
+    naive_idx, other_idx = np.flatnonzero(naive), np.flatnonzero(~naive)
+    if len(naive_idx):
+        try:
+            parsed = np.array([timestamps[i] for i in naive_idx], dtype="datetime64[s]")
+        except ValueError:
+            other_idx = np.arange(n)   # e.g. 2024-02-30: let the scalar parser decide
+        else:
+            days = parsed.astype("datetime64[D]")
+            weekday = (days.astype(np.int64) + 3) % 7   # 1970-01-01 was a Thursday
+            out[naive_idx, 0] = (parsed - days).astype(np.int64) // 3600
+            out[naive_idx, 1] = weekday
+            out[naive_idx, 2] = weekday >= 5
+    for i in other_idx:
+        out[i] = _time_features_scalar(timestamps[i])
+    return out
+
+
+_CATEGORICAL_FIELDS = ("location", "merchant", "type")   # Transaction field per CATEGORICAL_FEATURES name
+
+
+def _categorical_values(transactions: List[Dict[str, Any]], field: str) -> List[str]:
+    return [value.lower() for value in map(dict.get, transactions, repeat(field), repeat("UNKNOWN"))]
+
+
+def learn_vocabulary(transactions: List[Dict[str, Any]], vocab: FeatureVocabulary = None) -> None:
+    """
+    Offline / training step: register every location, merchant and type
+    of `transactions` in the shared vocabulary. Serving paths never learn,
+    so unseen values stay OOV until a step like this one has run.
+    """
+    vocab = vocab or get_feature_vocab()
+    for name, field in zip(CATEGORICAL_FEATURES, _CATEGORICAL_FIELDS):
+        vocab[name].encode_many(dict.fromkeys(_categorical_values(transactions, field)), learn=True)
+
+
+def extract_features_batch(transactions: List[Dict[str, Any]],
+                           vocab: FeatureVocabulary = None, learn: bool = False) -> FeatureMatrix:
+    """
+    Columnar extract_features() for many transactions: one pass per field,
+    vectorized log amounts and vectorized timestamp parsing. Categorical
+    fields are stored as int32 codes from the shared vocabulary.
+
+    Args:
+        transactions (List[Dict]): Input transactions
+        vocab (FeatureVocabulary, optional): Defaults to get_feature_vocab()
+        learn (bool): Register unseen categorical values (offline / training
+            only; by default they map to OOV_CODE, as on the serving path)
+
+    Returns:
+        FeatureMatrix: Row i matches extract_features(transactions[i])
+    """
+    vocab = vocab or get_feature_vocab()
+    n = len(transactions)
+    amounts = np.fromiter(
+        map(float, map(dict.get, transactions, repeat("amount"), repeat(0.0))),
+        dtype=np.float64, count=n,
+    )
+    numeric = np.empty((n, len(NUMERIC_FEATURES)), dtype=np.float64)
+    non_positive = amounts <= 0
+    numeric[:, 0] = np.where(non_positive, 0.0, np.log1p(np.where(non_positive, 0.0, amounts))).round(4)
+    numeric[:, 1:4] = _time_features_batch(
+        list(map(dict.get, transactions, repeat("timestamp"), repeat(""))))
+    numeric[:, 4] = np.fromiter(
+        (bool(device) for device in map(dict.get, transactions, repeat("device_id"))),
+        dtype=bool, count=n,
+    )
+
+    codes = {}
+    oov_values = {}
+    for name, field in zip(CATEGORICAL_FEATURES, _CATEGORICAL_FIELDS):
+        values = _categorical_values(transactions, field)
+        codes[name] = vocab[name].encode_many(values, learn)
+        for index in np.flatnonzero(codes[name] == OOV_CODE):
+            oov_values[(name, int(index))] = values[index]
+
+    return FeatureMatrix(numeric, codes, amounts, vocab, oov_values)
+
 # =============================================================== #
 # ======================== END OF FILE ========================== #
 # =============================================================== #
\ No newline at end of file
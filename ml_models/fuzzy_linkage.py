@@ -0,0 +1,305 @@
+# =============================================================== #
+# ================= ml_models/fuzzy_linkage.py ================== #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Link entities whose email / address / name are
+#                near-duplicates, not just exactly equal
+# 🧮 Method    : Normalize → character shingles → MinHash signatures
+#                → LSH banding (candidate pairs) → similarity check
+# 🎯 Output    : Same cluster lists as find_linked_entities()
+# ✅ Used by   : Downstream investigation flows
+# =============================================================== #
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ml_models.entity_linkage import LINK_KEYS, DisjointSet, link_components
+
+FUZZY_KEYS = ("email", "address", "name")
+DEFAULT_THRESHOLD = 0.8       # Minimum estimated Jaccard similarity of shingle sets
+DEFAULT_BANDS = 16            # LSH bands × rows = signature length
+DEFAULT_ROWS = 8              # S-curve midpoint ≈ (1/bands)^(1/rows) ≈ 0.71
+DEFAULT_SHINGLE_SIZE = 3
+DEFAULT_MAX_BUCKET = 500      # Larger LSH buckets pair members with one anchor only
+_CHUNK_SHINGLES = 1 << 16     # Shingles hashed per vectorized MinHash step
+
+# =============================================================== #
+# ======================== NORMALIZATION ======================== #
+# =============================================================== #
+
+_ADDRESS_ABBREVIATIONS = {
+    "street": "st", "avenue": "ave", "road": "rd", "boulevard": "blvd",
+    "drive": "dr", "lane": "ln", "court": "ct", "place": "pl",
+    "apartment": "apt", "suite": "ste", "north": "n", "south": "s",
+    "east": "e", "west": "w",
+}
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_email(value: str) -> str:
+    """
+    Lowercase; drop "+tag" and dots from the local part (common provider
+    aliases of the same mailbox).
+    """
+    local, _, domain = value.strip().lower().partition("@")
+    local = local.split("+", 1)[0].replace(".", "")
+    return f"{local}@{domain}" if domain else local
+
+
+def normalize_text(value: str) -> str:
+    """
+    Lowercase, punctuation → spaces, common address words abbreviated.
+    """
+    words = _NON_ALNUM.sub(" ", value.lower()).split()
+    return " ".join(_ADDRESS_ABBREVIATIONS.get(word, word) for word in words)
+
+
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "email": normalize_email,
+    "address": normalize_text,
+    "name": normalize_text,
+}
+
+
+def shingles(texts: Sequence[str], size: int = DEFAULT_SHINGLE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Byte `size`-grams of every text, each packed into a uint64 (so
+    size <= 8), flattened across texts. Texts shorter than `size` give one
+    zero-padded gram; empty texts give none. Grams may repeat within a
+    text, which MinHash ignores.
+
+    Returns:
+        (np.ndarray, np.ndarray): Flat grams and the gram count per text
+    """
+    if not 1 <= size <= 8:
+        raise ValueError("shingle size must be between 1 and 8")
+    encoded = [text.encode("utf-8").ljust(size, b"\0") if text else b"" for text in texts]
+    sizes = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    counts = np.maximum(sizes - size + 1, 0)
+    data = np.frombuffer(b"".join(encoded) + b"\0" * size, dtype=np.uint8).astype(np.uint64)
+
+    # Start of every gram: text offset + 0..count-1
+    offsets = np.cumsum(sizes) - sizes
+    positions = np.repeat(offsets - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    grams = np.zeros(len(positions), dtype=np.uint64)
+    for j in range(size):
+        grams = (grams << np.uint64(8)) | data[positions + j]
+    return grams, counts
+
+# =============================================================== #
+# ========================== MINHASH LSH ======================== #
+# =============================================================== #
+
+class MinHashLSH:
+    """
+    MinHash signatures (bands × rows values per record) bucketed by LSH.
+
+    Each signature value is the minimum of one random multiply-shift hash
+    over the record's shingles, so two records agree on it with
+    probability equal to their Jaccard similarity. Records sharing all
+    `rows` values of any band land in the same bucket and become a
+    candidate pair: a pair with similarity s is found with probability
+    1 - (1 - s^rows)^bands. Only candidates get their similarity
+    estimated, so work grows with the number of near-duplicates rather
+    than with n².
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, bands: int = DEFAULT_BANDS,
+                 rows: int = DEFAULT_ROWS, max_bucket_size: int = DEFAULT_MAX_BUCKET,
+                 seed: int = 1):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        if bands < 1 or rows < 1:
+            raise ValueError("bands and rows must be >= 1")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.max_bucket_size = max_bucket_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, self.num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 2 ** 63, rows, dtype=np.uint64) | np.uint64(1)
+
+    @property
+    def num_perm(self) -> int:
+        return self.bands * self.rows
+
+    def signatures(self, grams: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            grams (np.ndarray), counts (np.ndarray): Output of shingles()
+
+        Returns:
+            (np.ndarray, np.ndarray): (n, num_perm) uint32 signatures and a
+            bool mask of records that had any shingles
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        signatures = np.full((len(counts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        valid = counts > 0
+        records = np.flatnonzero(valid)
+        ends = np.cumsum(counts)[records]
+        starts = ends - counts[records]
+        a, b = self._a[:, None], self._b[:, None]
+        first = 0
+        while first < len(records):
+            # Consecutive records with about _CHUNK_SHINGLES shingles in total
+            last = max(first + 1, int(np.searchsorted(ends, starts[first] + _CHUNK_SHINGLES, "right")))
+            lo, hi = starts[first], ends[last - 1]
+            hashed = ((a * grams[lo:hi] + b) >> np.uint64(32)).astype(np.uint32)
+            signatures[records[first:last]] = np.minimum.reduceat(
+                hashed, starts[first:last] - lo, axis=1).T
+            first = last
+        return signatures, valid
+
+    def candidate_pairs(self, signatures: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        """
+        Distinct (i, j) record pairs, i < j, sharing at least one LSH bucket.
+        A bucket larger than `max_bucket_size` (e.g. thousands of
+        template-generated texts) gives only its (first, member) pairs,
+        so its members still link through the first one while the pair
+        count stays linear in the bucket size.
+
+        Returns:
+            np.ndarray: (m, 2) int64 pairs
+        """
+        records = np.flatnonzero(valid)
+        pairs = []
+        for band in range(self.bands):
+            # One 64-bit key per band; rare key collisions only add
+            # candidates, which the similarity check then rejects
+            block = signatures[records, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+            keys = (block * self._band_mix).sum(axis=1, dtype=np.uint64)
+            _, bucket, counts = np.unique(keys, return_inverse=True, return_counts=True)
+            shared = counts[bucket] > 1
+            if not shared.any():
+                continue
+            members, bucket = records[shared], bucket[shared]
+            order = np.argsort(bucket, kind="stable")
+            members, bucket = members[order], bucket[order]
+            boundaries = np.flatnonzero(np.diff(bucket)) + 1
+            for group in np.split(members, boundaries):
+                if len(group) > self.max_bucket_size:
+                    pairs.append(np.stack([np.full(len(group) - 1, group[0]), group[1:]], axis=1))
+                    continue
+                left, right = np.triu_indices(len(group), 1)
+                pairs.append(np.stack([group[left], group[right]], axis=1))
+        if not pairs:
+            return np.empty((0, 2), dtype=np.int64)
+        return np.unique(np.concatenate(pairs), axis=0)
+
+    def similar_pairs(self, grams: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Candidate pairs whose estimated Jaccard similarity (share of equal
+        signature values) reaches the threshold.
+
+        Returns:
+            (np.ndarray, np.ndarray): (m, 2) pairs and their similarities
+        """
+        signatures, valid = self.signatures(grams, counts)
+        pairs = self.candidate_pairs(signatures, valid)
+        similarity = np.empty(len(pairs), dtype=np.float64)
+        step = max(1, _CHUNK_SHINGLES // self.num_perm)
+        for lo in range(0, len(pairs), step):
+            chunk = pairs[lo:lo + step]
+            similarity[lo:lo + step] = (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).mean(axis=1)
+        keep = similarity >= self.threshold
+        return pairs[keep], similarity[keep]
+
+# =============================================================== #
+# ======================== FUZZY LINKAGE ======================== #
+# =============================================================== #
+
+def _attribute_texts(entities: Sequence[Dict], key: str) -> List[str]:
+    normalize = NORMALIZERS.get(key, normalize_text)
+    return [normalize(value) if isinstance(value, str) and value.strip() else ""
+            for value in (entity.get(key) for entity in entities)]
+
+
+def fuzzy_link_components(entities: Sequence[Dict], keys: Iterable[str] = FUZZY_KEYS,
+                          threshold: float = DEFAULT_THRESHOLD, bands: int = DEFAULT_BANDS,
+                          rows: int = DEFAULT_ROWS, exact_keys: Optional[Iterable[str]] = LINK_KEYS,
+                          shingle_size: int = DEFAULT_SHINGLE_SIZE,
+                          max_bucket_size: int = DEFAULT_MAX_BUCKET) -> List[List[int]]:
+    """
+    Connected components where entities link if any fuzzy key is similar
+    enough (MinHash/LSH per key) or any exact key is equal (as in
+    link_components(); pass exact_keys=None to skip exact links).
+    Entities with the same normalized text are linked directly; MinHash
+    only runs over the distinct texts.
+
+    Returns:
+        List[List[int]]: Entity positions per component (including
+        singletons), components ordered by their first member
+    """
+    n = len(entities)
+    sets = DisjointSet(n)
+    if exact_keys:
+        for members in link_components(entities, exact_keys):
+            for i in members[1:]:
+                sets.union(members[0], i)
+
+    lsh = MinHashLSH(threshold, bands, rows, max_bucket_size)
+    for key in keys:
+        first: Dict[str, int] = {}       # distinct text → first entity with it
+        for i, text in enumerate(_attribute_texts(entities, key)):
+            if not text:
+                continue
+            j = first.setdefault(text, i)
+            if j != i:
+                sets.union(j, i)
+        representatives = list(first.values())
+        pairs, _ = lsh.similar_pairs(*shingles(list(first), shingle_size))
+        for i, j in pairs.tolist():
+            sets.union(representatives[i], representatives[j])
+
+    components: Dict[int, List[int]] = {}
+    for i in range(n):
+        components.setdefault(sets.find(i), []).append(i)
+    return list(components.values())
+
+
+def find_fuzzy_linked_entities(entities: List[Dict], keys: Iterable[str] = FUZZY_KEYS,
+                               threshold: float = DEFAULT_THRESHOLD, bands: int = DEFAULT_BANDS,
+                               rows: int = DEFAULT_ROWS,
+                               exact_keys: Optional[Iterable[str]] = LINK_KEYS) -> List[List[str]]:
+    """
+    find_linked_entities() that also links near-duplicate emails,
+    addresses and names (e.g. "j.doe+1@mail.com" / "jdoe@mail.com",
+    "12 Main Street" / "12 Main St.").
+
+    Args:
+        entities (List[Dict]): Entity records with entity_id and metadata
+        keys (Iterable[str]): Attributes compared fuzzily
+        threshold (float): Minimum estimated Jaccard similarity to link
+        bands (int), rows (int): LSH banding; more bands find more
+            low-similarity candidates, more rows fewer
+        exact_keys (Iterable[str], optional): Attributes that link on
+            equality (default LINK_KEYS; None to disable)
+
+    Returns:
+        List[List[str]]: Clusters of linked entity IDs (input order)
+    """
+    return [[entities[i]["entity_id"] for i in members]
+            for members in fuzzy_link_components(entities, keys, threshold, bands, rows, exact_keys)
+            if len(members) > 1]
+
+
+# =============================================================== #
+# ======================= SAMPLE USAGE ========================== #
+# =============================================================== #
+
+if __name__ == "__main__":
+    test_entities = [
+        {"entity_id": "A1", "email": "john.doe+shop@mail.com", "address": "12 Main Street, Springfield"},
+        {"entity_id": "A2", "email": "johndoe@mail.com", "address": "99 Elm Road"},
+        {"entity_id": "B1", "email": "mary@mail.com", "address": "12 Main St. Springfield"},
+        {"entity_id": "C1", "email": "zed@other.com", "address": "1 Ocean Drive"},
+    ]
+
+    for cluster in find_fuzzy_linked_entities(test_entities):
+        print("Linked entities:", cluster)
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
@@ -0,0 +1,438 @@
+# =============================================================== #
+# ================= ml_models/model_registry.py ================= #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Load, warm up and serve versioned scoring models
+# 📁 Artifacts : ml_models/artifacts/<model>/<version>/
+#                  model.json (kind + scalar params) + <weight>.npy
+# 🔁 Swaps     : activate() warms the new version, then swaps it in;
+#                <model>/ACTIVE records the version for other processes
+#                (followed by a background sync thread)
+# 📊 Stats     : Per-version call / row counts and latency percentiles
+# ✅ Used by   : behavior_baseline_model.py, main/server.py, workers
+# =============================================================== #
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from ml_models.behavior_baseline_model import anomaly_score, anomaly_scores, default_model_params
+from ml_models.feature_engineering import extract_features_batch
+from resources.monitoring.rule_profiler import HISTOGRAM_SIZE, histogram_bucket, histogram_percentile_ns
+
+ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "artifacts")
+ACTIVE_FILE = "ACTIVE"
+MODEL_FILE = "model.json"
+
+BEHAVIOR_MODEL = "behavior_anomaly"
+BUILTIN_VERSION = "builtin"          # Served when no artifact has been activated
+WARMUP_ROWS = 256
+ACTIVE_CHECK_INTERVAL = 5.0          # Seconds between checks of ACTIVE files
+
+# =============================================================== #
+# ============================ MODELS =========================== #
+# =============================================================== #
+
+class BehaviorAnomalyModel:
+    """
+    The behavior anomaly scorer as a versioned artifact: scalar parameters
+    from model.json and weight arrays (e.g. `hour_risk`) from .npy files.
+
+    Artifact weights are memory-mapped read-only, so every process serving
+    the same version shares one copy through the page cache; the builtin
+    version's arrays are frozen (read-only) and shared copy-on-write by
+    workers forked after preload().
+    """
+    kind = BEHAVIOR_MODEL
+
+    def __init__(self, version: str, params: Dict[str, Any]):
+        self.version = version
+        self.params = params
+        for value in params.values():
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+
+    @classmethod
+    def builtin(cls) -> "BehaviorAnomalyModel":
+        return cls(BUILTIN_VERSION, default_model_params())
+
+    def predict(self, feature_rows, baselines: np.ndarray = None,
+                found: np.ndarray = None) -> np.ndarray:
+        return anomaly_scores(feature_rows, baselines, found, self.params)
+
+    def predict_one(self, features: Dict[str, Any], baseline: np.void = None) -> float:
+        return anomaly_score(features, baseline, self.params)
+
+    def warm_up(self, rows: int = WARMUP_ROWS) -> None:
+        """
+        Run the batch and scalar paths once on synthetic rows so lazy
+        imports, vocabulary files and NumPy code paths are initialized
+        before the version takes traffic.
+        """
+        rng = np.random.default_rng(0)
+        transactions = [{
+            "amount": float(amount),
+            "timestamp": f"2024-01-01T{hour:02d}:00:00",
+            "device_id": "warmup" if i % 2 else None,
+        } for i, (amount, hour) in enumerate(zip(rng.lognormal(5, 1.5, rows),
+                                                 rng.integers(0, 24, rows)))]
+        matrix = extract_features_batch(transactions, learn=False)   # Never grows the vocabulary
+        self.predict(matrix)
+        self.predict_one(matrix.row(0))
+
+
+MODEL_KINDS = {BEHAVIOR_MODEL: BehaviorAnomalyModel}
+
+# =============================================================== #
+# =========================== ARTIFACTS ========================= #
+# =============================================================== #
+
+def save_artifact(model, root: str = ARTIFACT_DIR, version: Optional[str] = None) -> str:
+    """
+    Write a model as <root>/<kind>/<version>/ (scalars to model.json, each
+    array to <name>.npy). Built in a temp directory and renamed into
+    place, so a half-written version is never visible.
+
+    Returns:
+        str: Path of the version directory
+    """
+    version = version or model.version
+    target = os.path.join(root, model.kind, version)
+    if os.path.exists(target):
+        raise FileExistsError(f"Model artifact {target} already exists")
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    scalars, arrays = {}, []
+    for name, value in model.params.items():
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(tmp, name + ".npy"), value)
+            arrays.append(name)
+        else:
+            scalars[name] = value
+    with open(os.path.join(tmp, MODEL_FILE), "w") as f:
+        json.dump({"kind": model.kind, "version": version, "params": scalars,
+                   "arrays": arrays, "created_at": time.time()}, f, indent=2)
+    os.replace(tmp, target)
+    return target
+
+
+def load_artifact(name: str, version: str, root: str = ARTIFACT_DIR):
+    """
+    Load <root>/<name>/<version>/ (weights memory-mapped read-only).
+    """
+    if version == BUILTIN_VERSION:
+        return MODEL_KINDS[name].builtin()
+    path = os.path.join(root, name, version)
+    with open(os.path.join(path, MODEL_FILE), "r") as f:
+        spec = json.load(f)
+    kind = MODEL_KINDS.get(spec.get("kind"))
+    if kind is None:
+        raise ValueError(f"{path}: unknown model kind {spec.get('kind')!r}")
+    params = dict(spec.get("params", {}))
+    for array_name in spec.get("arrays", []):
+        params[array_name] = np.load(os.path.join(path, array_name + ".npy"), mmap_mode="r")
+    return kind(version, params)
+
+# =============================================================== #
+# ========================= LATENCY STATS ======================= #
+# =============================================================== #
+
+class VersionStats:
+    """
+    Counters for one model version. Like RuleStats, updates are lock-free
+    attribute increments; latency uses the rule profiler's log-bucketed
+    histogram (per call, so batch and scalar calls are both represented).
+    """
+    __slots__ = ("calls", "rows", "errors", "total_ns", "histogram", "loaded_at", "warmup_ms")
+
+    def __init__(self, warmup_ms: float = 0.0):
+        self.calls = 0
+        self.rows = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.histogram = [0] * HISTOGRAM_SIZE
+        self.loaded_at = time.time()
+        self.warmup_ms = warmup_ms
+
+    def record(self, rows: int, elapsed_ns: int) -> None:
+        self.calls += 1
+        self.rows += rows
+        self.total_ns += elapsed_ns
+        self.histogram[histogram_bucket(elapsed_ns)] += 1
+
+    def percentile_ns(self, q: float) -> int:
+        return histogram_percentile_ns(self.histogram, self.calls, q)
+
+    def to_dict(self) -> Dict[str, Any]:
+        calls = self.calls
+        return {
+            "calls": calls,
+            "rows": self.rows,
+            "errors": self.errors,
+            "mean_us": round(self.total_ns / calls / 1e3, 3) if calls else 0.0,
+            "p50_us": round(self.percentile_ns(0.5) / 1e3, 3),
+            "p99_us": round(self.percentile_ns(0.99) / 1e3, 3),
+            "us_per_row": round(self.total_ns / self.rows / 1e3, 3) if self.rows else 0.0,
+            "warmup_ms": round(self.warmup_ms, 3),
+            "loaded_at": self.loaded_at,
+        }
+
+# =============================================================== #
+# =========================== REGISTRY ========================== #
+# =============================================================== #
+
+class ModelRegistry:
+    """
+    Loaded model versions by name, with one active version per name.
+
+    Swapping is a single dict assignment of an already-warm model, so a
+    request sees either the old or the new version, never a mix, and a
+    predict() call that started on the old version finishes on it.
+    Other processes follow the ACTIVE file: every ACTIVE_CHECK_INTERVAL
+    seconds get() starts a background sync that loads and warms a changed
+    version before swapping it in, so requests only read the reference.
+    """
+
+    def __init__(self, root: str = ARTIFACT_DIR):
+        self.root = root
+        self._active: Dict[str, Any] = {}
+        self._loaded: Dict[tuple, Any] = {}
+        self._stats: Dict[tuple, VersionStats] = {}
+        self._active_mtimes: Dict[str, Optional[int]] = {}
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._next_check = time.monotonic() + ACTIVE_CHECK_INTERVAL
+
+    # ----------------------------------------------------------- #
+    # Loading & activation
+    # ----------------------------------------------------------- #
+    def _active_path(self, name: str) -> str:
+        return os.path.join(self.root, name, ACTIVE_FILE)
+
+    def _read_active(self, name: str) -> str:
+        try:
+            with open(self._active_path(name), "r") as f:
+                return f.read().strip() or BUILTIN_VERSION
+        except OSError:
+            return BUILTIN_VERSION
+
+    def load(self, name: str, version: str):
+        """
+        Load and warm up a version (once per process); does not activate it.
+        """
+        key = (name, version)
+        model = self._loaded.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._loaded.get(key)
+            if model is None:
+                model = load_artifact(name, version, self.root)
+                started = time.perf_counter()
+                model.warm_up()
+                self._stats[key] = VersionStats((time.perf_counter() - started) * 1000.0)
+                self._loaded[key] = model
+        return model
+
+    def activate(self, name: str, version: str, persist: bool = True):
+        """
+        Load + warm `version`, then atomically make it the active one. With
+        persist, the ACTIVE file is rewritten (atomic rename) so other
+        processes switch too.
+        """
+        model = self.load(name, version)
+        with self._lock:
+            previous = self._active.get(name)
+            self._active[name] = model
+            if persist:
+                os.makedirs(os.path.join(self.root, name), exist_ok=True)
+                tmp = self._active_path(name) + ".tmp"
+                with open(tmp, "w") as f:
+                    f.write(version + "\n")
+                os.replace(tmp, self._active_path(name))
+                self._active_mtimes[name] = os.stat(self._active_path(name)).st_mtime_ns
+        if previous is not None and previous.version != version:
+            print(f"[🔁 Models] {name}: {previous.version} → {version}")
+        return model
+
+    def preload(self, names: List[str] = (BEHAVIOR_MODEL,)) -> None:
+        """
+        Load and warm the active version of each model. Call at startup
+        (and before forking workers, so they share the loaded weights).
+        """
+        for name in names:
+            self._sync(name)
+
+    def _sync(self, name: str) -> None:
+        try:
+            mtime = os.stat(self._active_path(name)).st_mtime_ns
+        except OSError:
+            mtime = None
+        if name in self._active and self._active_mtimes.get(name) == mtime:
+            return
+        version = self._read_active(name)
+        try:
+            self.activate(name, version, persist=False)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[⚠️ WARN] Could not load {name} version {version!r}: {e}")
+            if name not in self._active:
+                self.activate(name, BUILTIN_VERSION, persist=False)
+        self._active_mtimes[name] = mtime
+
+    def maybe_sync(self) -> bool:
+        """
+        Start a background check of every active model's ACTIVE file if
+        the interval elapsed (one sync at a time), so the request thread
+        never pays for loading or warming a new version.
+        """
+        if time.monotonic() < self._next_check or not self._sync_lock.acquire(blocking=False):
+            return False
+        if time.monotonic() < self._next_check:
+            self._sync_lock.release()
+            return False
+        self._next_check = time.monotonic() + ACTIVE_CHECK_INTERVAL
+        threading.Thread(target=self._background_sync,
+                         name="model-registry-sync", daemon=True).start()
+        return True
+
+    def _background_sync(self) -> None:
+        try:
+            for name in list(self._active):
+                try:
+                    self._sync(name)
+                except Exception as e:
+                    print(f"[⚠️ WARN] Model sync failed for {name}: {e}")
+        finally:
+            self._sync_lock.release()
+
+    def get(self, name: str):
+        """
+        The active model for `name`. Only a model never preloaded is loaded
+        here (once); version changes are picked up by maybe_sync().
+        """
+        model = self._active.get(name)
+        if model is None:
+            with self._lock:
+                if name not in self._active:
+                    self._sync(name)
+                model = self._active[name]
+        self.maybe_sync()
+        return model
+
+    # ----------------------------------------------------------- #
+    # Serving
+    # ----------------------------------------------------------- #
+    def predict(self, name: str, feature_rows, *args) -> np.ndarray:
+        """
+        Batched scoring on the active version (extra args go to the model,
+        e.g. baselines and found for the behavior model).
+        """
+        model = self.get(name)
+        stats = self._stats[(name, model.version)]
+        started = time.perf_counter_ns()
+        try:
+            scores = model.predict(feature_rows, *args)
+        except Exception:
+            stats.errors += 1
+            raise
+        stats.record(len(scores), time.perf_counter_ns() - started)
+        return scores
+
+    def predict_one(self, name: str, features: Dict[str, Any], *args) -> float:
+        model = self.get(name)
+        stats = self._stats[(name, model.version)]
+        started = time.perf_counter_ns()
+        try:
+            score = model.predict_one(features, *args)
+        except Exception:
+            stats.errors += 1
+            raise
+        stats.record(1, time.perf_counter_ns() - started)
+        return score
+
+    # ----------------------------------------------------------- #
+    # Introspection
+    # ----------------------------------------------------------- #
+    def versions(self, name: str) -> List[str]:
+        """
+        Versions available for `name` (artifact directories + builtin).
+        """
+        directory = os.path.join(self.root, name)
+        found = []
+        if os.path.isdir(directory):
+            found = sorted(entry for entry in os.listdir(directory)
+                           if os.path.isfile(os.path.join(directory, entry, MODEL_FILE)))
+        return [BUILTIN_VERSION] + found
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            dict: {model: {"active": version, "versions": {version: {calls,
+                   rows, errors, mean_us, p50_us, p99_us, us_per_row, ...}}}}
+        """
+        out: Dict[str, Dict[str, Any]] = {}
+        for (name, version), stats in list(self._stats.items()):
+            entry = out.setdefault(name, {"active": None, "versions": {}})
+            entry["versions"][version] = stats.to_dict()
+        for name, model in list(self._active.items()):
+            out.setdefault(name, {"versions": {}})["active"] = model.version
+        return out
+
+
+_default_registry: Optional[ModelRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """
+    Return the process-wide ModelRegistry backed by ARTIFACT_DIR.
+    """
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = ModelRegistry()
+    return _default_registry
+
+# =============================================================== #
+# ============================= CLI ============================= #
+# =============================================================== #
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Manage versioned scoring models")
+    parser.add_argument("--root", default=ARTIFACT_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    listing = commands.add_parser("list", help="Show versions and the active one")
+    listing.add_argument("--model", default=BEHAVIOR_MODEL)
+    export = commands.add_parser("export-builtin", help="Save the built-in model as an artifact")
+    export.add_argument("version")
+    activate = commands.add_parser("activate", help="Make a version active for all processes")
+    activate.add_argument("version")
+    activate.add_argument("--model", default=BEHAVIOR_MODEL)
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.root)
+    if args.command == "list":
+        active = registry._read_active(args.model)
+        for version in registry.versions(args.model):
+            print(f"{'*' if version == active else ' '} {version}")
+    elif args.command == "export-builtin":
+        print(f"📦 Saved {save_artifact(BehaviorAnomalyModel.builtin(), args.root, args.version)}")
+    else:
+        registry.activate(args.model, args.version)
+        print(f"✅ {args.model} → {args.version}")
+
+
+if __name__ == "__main__":
+    main()
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
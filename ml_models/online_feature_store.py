@@ -0,0 +1,321 @@
+# =============================================================== #
+# ============== ml_models/online_feature_store.py ============== #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Per-account behavior aggregates updated per transaction
+# 🧮 State     : Welford mean/var, t-digest amount quantiles,
+#                24-bin hour histogram, top-k locations
+# 💾 Persists  : Periodic pickle snapshot for warm restarts
+# ✅ Used by   : tools/detect_fraud.py
+# =============================================================== #
+
+import math
+import os
+import pickle
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from ml_models.quantile_sketch import TDigest
+
+SNAPSHOT_FILE = os.path.join(os.path.dirname(__file__), "feature_store_snapshot.pkl")
+# Set by main/sharded_workers.py so each shard keeps its own snapshot
+SHARD_ENV_VAR = "FRAUD_DETECT_SHARD"
+
+DEFAULT_TOP_K = 16                 # Space-saving counters per account
+DEFAULT_MAX_ACCOUNTS = 1_000_000
+DEFAULT_SNAPSHOT_INTERVAL = 300.0  # Seconds between automatic snapshots
+SNAPSHOT_CHUNK = 64                # Accounts pickled per lock hold while snapshotting
+BASELINE_LOCATIONS = 3             # Same as build_baseline()'s common_locations
+AMOUNT_DIGEST_COMPRESSION = 50     # ≈30 centroids (~0.5 KB) per account
+
+# =============================================================== #
+# ====================== PER-ACCOUNT STATE ====================== #
+# =============================================================== #
+
+class AccountAggregates:
+    """
+    Fixed-size running aggregates for one account.
+
+    Amounts use Welford's update (numerically stable mean/variance in one
+    pass) plus a t-digest for outlier-robust p95 / p99. Locations use the
+    space-saving sketch: `top_k` counters, and an unseen location replaces
+    the smallest one, inheriting its count as the error bound, so any
+    location with more than count/top_k occurrences is guaranteed to be
+    tracked. All parts merge, so per-shard aggregates can be combined.
+    """
+    __slots__ = ("count", "mean", "m2", "amounts", "hours", "locations")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.amounts = TDigest(AMOUNT_DIGEST_COMPRESSION)
+        self.hours = array("I", bytes(4 * 24))
+        self.locations: Dict[Any, list] = {}    # location → [count, error]
+
+    def update(self, amount: float, hour: int, location: Any, top_k: int) -> None:
+        self.count += 1
+        delta = amount - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (amount - self.mean)
+        self.amounts.update(amount)
+        self.hours[hour] += 1
+
+        counter = self.locations.get(location)
+        if counter is not None:
+            counter[0] += 1
+        elif len(self.locations) < top_k:
+            self.locations[location] = [1, 0]
+        else:
+            evicted = min(self.locations, key=lambda loc: self.locations[loc][0])
+            floor = self.locations.pop(evicted)[0]
+            self.locations[location] = [floor + 1, floor]
+
+    def merge(self, other: "AccountAggregates", top_k: int) -> None:
+        """
+        Fold another account state in (Chan et al. parallel variance; summed
+        space-saving counters and errors, trimmed back to `top_k`).
+        """
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.amounts.merge(other.amounts)
+        for hour in range(24):
+            self.hours[hour] += other.hours[hour]
+        for location, (hits, error) in other.locations.items():
+            counter = self.locations.setdefault(location, [0, 0])
+            counter[0] += hits
+            counter[1] += error
+        if len(self.locations) > top_k:
+            kept = sorted(self.locations, key=lambda loc: -self.locations[loc][0])[:top_k]
+            self.locations = {loc: self.locations[loc] for loc in kept}
+
+    def baseline(self) -> Dict[str, Any]:
+        """
+        Same shape as build_baseline(): amount mean/std are population
+        statistics, p95/p99 t-digest estimates, common_locations the top
+        space-saving counters.
+        """
+        active = [hour for hour in range(24) if self.hours[hour]]
+        # Rank by guaranteed occurrences (count - error): exact for locations
+        # tracked since their first appearance, conservative otherwise
+        top = sorted(((loc, count - error) for loc, (count, error) in self.locations.items()),
+                     key=lambda item: -item[1])[:BASELINE_LOCATIONS]
+        amount_p95, amount_p99 = self.amounts.quantiles([0.95, 0.99])
+        return {
+            "amount_mean": np.float64(self.mean),
+            "amount_std": np.float64(math.sqrt(self.m2 / self.count)) if self.count else np.float64(1.0),
+            "amount_p95": np.float64(amount_p95),
+            "amount_p99": np.float64(amount_p99),
+            "hour_range": (active[0], active[-1]) if active else (8, 20),
+            "common_locations": top,
+        }
+
+    def __getstate__(self):
+        return (self.count, self.mean, self.m2, self.hours, self.locations, self.amounts)
+
+    def __setstate__(self, state):
+        if len(state) == 5:   # Snapshot from before amount digests: quantiles start empty
+            state = (*state, TDigest(AMOUNT_DIGEST_COMPRESSION))
+        self.count, self.mean, self.m2, self.hours, self.locations, self.amounts = state
+
+# =============================================================== #
+# ========================= FEATURE STORE ======================= #
+# =============================================================== #
+
+class OnlineFeatureStore:
+    """
+    In-process map of account_id → AccountAggregates.
+
+    update() and baseline() are O(1) in the account's history (bounded by
+    24 hour bins and `top_k` counters). At most `max_accounts` accounts are
+    kept, least recently updated first out. Every `snapshot_interval`
+    seconds an update also starts a background snapshot (atomic rename)
+    that the next process loads on start.
+    """
+
+    def __init__(self, snapshot_path: Optional[str] = SNAPSHOT_FILE,
+                 top_k: int = DEFAULT_TOP_K,
+                 max_accounts: int = DEFAULT_MAX_ACCOUNTS,
+                 snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL):
+        self.snapshot_path = snapshot_path
+        self.top_k = max(BASELINE_LOCATIONS, top_k)
+        self.max_accounts = max_accounts
+        self.snapshot_interval = snapshot_interval
+        self._accounts: "OrderedDict[str, AccountAggregates]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._next_snapshot = time.monotonic() + snapshot_interval
+        if snapshot_path:
+            self.load()
+
+    # ----------------------------------------------------------- #
+    # Updates & reads
+    # ----------------------------------------------------------- #
+    def update(self, account_id: str, amount: float, hour: int, location: Any) -> None:
+        with self._lock:
+            state = self._accounts.get(account_id)
+            if state is None:
+                state = self._accounts[account_id] = AccountAggregates()
+                if len(self._accounts) > self.max_accounts:
+                    self._accounts.popitem(last=False)
+            else:
+                self._accounts.move_to_end(account_id)
+            state.update(amount, hour, location, self.top_k)
+
+        if self.snapshot_path and time.monotonic() >= self._next_snapshot:
+            self.maybe_snapshot()
+
+    def update_transaction(self, transaction: Dict[str, Any]) -> None:
+        """
+        Fold one raw transaction into its account's aggregates, reading
+        fields the way build_baseline() does (unparseable time → noon).
+        """
+        account_id = transaction.get("account_id")
+        if account_id is None:
+            return
+        try:
+            amount = float(transaction.get("amount", 0.0) or 0.0)
+        except (TypeError, ValueError):
+            return
+        try:
+            hour = datetime.fromisoformat(transaction.get("timestamp")).hour
+        except (TypeError, ValueError):
+            hour = 12
+        self.update(account_id, amount, hour, transaction.get("location", "UNKNOWN"))
+
+    def baseline(self, account_id: str) -> Optional[Dict[str, Any]]:
+        """
+        build_baseline()-compatible profile for an account, or None.
+        """
+        with self._lock:
+            state = self._accounts.get(account_id)
+            return state.baseline() if state is not None else None
+
+    def get(self, account_id: str) -> Optional[AccountAggregates]:
+        return self._accounts.get(account_id)
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def merge(self, other: "OnlineFeatureStore") -> None:
+        """
+        Fold another store (e.g. another shard's or period's snapshot) in.
+        """
+        with self._lock:
+            for account_id, state in other._accounts.items():
+                mine = self._accounts.get(account_id)
+                if mine is None:
+                    mine = self._accounts[account_id] = AccountAggregates()
+                mine.merge(state, self.top_k)
+            while len(self._accounts) > self.max_accounts:
+                self._accounts.popitem(last=False)
+
+    # ----------------------------------------------------------- #
+    # Snapshots
+    # ----------------------------------------------------------- #
+    def maybe_snapshot(self) -> bool:
+        """
+        Start a background snapshot if the interval elapsed (one writer at
+        a time), so the updating request thread never pays for it.
+        """
+        if not self._snapshot_lock.acquire(blocking=False):
+            return False
+        if time.monotonic() < self._next_snapshot:
+            self._snapshot_lock.release()
+            return False
+        self._next_snapshot = time.monotonic() + self.snapshot_interval
+        threading.Thread(target=self._background_snapshot,
+                         name="feature-store-snapshot", daemon=True).start()
+        return True
+
+    def _background_snapshot(self) -> None:
+        try:
+            self.snapshot()
+        finally:
+            self._snapshot_lock.release()
+
+    def snapshot(self, path: Optional[str] = None) -> None:
+        """
+        Write every account to `path` (atomic rename). Accounts are pickled
+        SNAPSHOT_CHUNK at a time, each under a short hold of the lock, so
+        updates keep flowing while a large store is written. Each account
+        is captured consistently; one updated meanwhile may be captured
+        before or after that update.
+        """
+        path = path or self.snapshot_path
+        with self._lock:
+            account_ids = list(self._accounts)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"version": 2, "top_k": self.top_k}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                for start in range(0, len(account_ids), SNAPSHOT_CHUNK):
+                    with self._lock:
+                        chunk = [(account_id, self._accounts[account_id])
+                                 for account_id in account_ids[start:start + SNAPSHOT_CHUNK]
+                                 if account_id in self._accounts]
+                        payload = pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL)
+                    f.write(payload)
+                pickle.dump(None, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[⚠️ WARN] Feature store snapshot failed: {e}")
+
+    def load(self, path: Optional[str] = None) -> bool:
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+                if data["version"] == 1:
+                    accounts = data["accounts"]
+                else:
+                    # Version 2: header, then (account_id, state) chunks, then None
+                    accounts = OrderedDict()
+                    chunk = pickle.load(f)
+                    while chunk is not None:
+                        accounts.update(chunk)
+                        chunk = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError) as e:
+            print(f"[⚠️ WARN] Ignoring unreadable feature store snapshot {path}: {e}")
+            return False
+        with self._lock:
+            self._accounts = accounts
+            while len(self._accounts) > self.max_accounts:
+                self._accounts.popitem(last=False)
+        print(f"[📦 Feature Store] Restored {len(accounts)} accounts from {path}")
+        return True
+
+
+_default_store: Optional[OnlineFeatureStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_feature_store() -> OnlineFeatureStore:
+    """
+    Return the process-wide OnlineFeatureStore (one snapshot file per shard
+    when running under sharded detection workers).
+    """
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                shard = os.environ.get(SHARD_ENV_VAR)
+                path = SNAPSHOT_FILE if shard is None else SNAPSHOT_FILE.replace(".pkl", f".shard{shard}.pkl")
+                _default_store = OnlineFeatureStore(path)
+    return _default_store
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
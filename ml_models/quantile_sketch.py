@@ -0,0 +1,226 @@
+# =============================================================== #
+# ================ ml_models/quantile_sketch.py ================= #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Fixed-memory, mergeable quantiles of a value stream
+# 🧮 Method    : Merging t-digest (Dunning & Ertl), k1 scale function
+# 💾 Persists  : Compact bytes (header + centroid means / weights)
+# ✅ Used by   : online_feature_store.py (per-account amount p95 / p99)
+# =============================================================== #
+
+import math
+import struct
+from array import array
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_COMPRESSION = 100   # ≈ max centroids; higher = more memory, better accuracy
+BUFFER_FACTOR = 2           # Unmerged values buffered per unit of compression
+
+_HEADER = struct.Struct("<BHQddI")   # version, compression, n, min, max, centroids
+_VERSION = 1
+
+# =============================================================== #
+# =========================== T-DIGEST ========================== #
+# =============================================================== #
+
+class TDigest:
+    """
+    Stream quantile sketch holding at most ~`compression` centroids
+    (mean, weight) however many values are added.
+
+    New values are buffered and periodically merged: all points are sorted
+    and neighbours are combined while the cluster stays within one unit of
+    the k1 scale function k(q) = δ/2π · asin(2q − 1). That scale allows
+    only tiny clusters near q = 0 and q = 1, so tail quantiles such as
+    p95 / p99 stay accurate while the middle is summarized coarsely.
+    Digests merge by pooling centroids and re-clustering, so per-shard or
+    per-period digests combine into one.
+    """
+    __slots__ = ("compression", "n", "min", "max", "_means", "_weights", "_buffer")
+
+    def __init__(self, compression: int = DEFAULT_COMPRESSION):
+        if compression < 10:
+            raise ValueError("compression must be >= 10")
+        self.compression = int(compression)
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means = np.empty(0, dtype=np.float64)
+        self._weights = np.empty(0, dtype=np.float64)
+        self._buffer = array("d")
+
+    # ----------------------------------------------------------- #
+    # Updates
+    # ----------------------------------------------------------- #
+    def update(self, value: float) -> None:
+        value = float(value)
+        if value != value:
+            return  # NaN carries no rank information
+        self.n += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self._buffer.append(value)
+        if len(self._buffer) >= BUFFER_FACTOR * self.compression:
+            self._flush()
+
+    def extend(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.update(value)
+
+    def _flush(self, means: np.ndarray = None, weights: np.ndarray = None) -> None:
+        """
+        Merge buffered values (and optional extra centroids) into the digest.
+        """
+        if not self._buffer and means is None:
+            return
+        buffered = np.frombuffer(self._buffer, dtype=np.float64) if self._buffer else np.empty(0)
+        values = np.concatenate([self._means, buffered] + ([means] if means is not None else []))
+        counts = np.concatenate([self._weights, np.ones(len(buffered))]
+                                + ([weights] if weights is not None else []))
+        self._buffer = array("d")
+        order = np.argsort(values, kind="stable")
+        values, counts = values[order].tolist(), counts[order].tolist()
+        total = sum(counts)
+
+        scale = self.compression / (2.0 * math.pi)
+        merged_means, merged_weights = [], []
+        mean, weight = values[0], counts[0]
+        done = 0.0
+        limit = total * _k1_inverse(_k1(0.0, scale) + 1.0, scale)
+        for value, count in zip(values[1:], counts[1:]):
+            if done + weight + count <= limit:
+                weight += count
+                mean += (value - mean) * count / weight
+            else:
+                merged_means.append(mean)
+                merged_weights.append(weight)
+                done += weight
+                limit = total * _k1_inverse(_k1(done / total, scale) + 1.0, scale)
+                mean, weight = value, count
+        merged_means.append(mean)
+        merged_weights.append(weight)
+        self._means = np.array(merged_means, dtype=np.float64)
+        self._weights = np.array(merged_weights, dtype=np.float64)
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """
+        Fold another digest into this one (in place) and return self.
+        """
+        if other.n == 0:
+            return self
+        buffered = np.frombuffer(other._buffer, dtype=np.float64) if other._buffer else np.empty(0)
+        self._flush(np.concatenate([other._means, buffered]),
+                    np.concatenate([other._weights, np.ones(len(buffered))]))
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    # ----------------------------------------------------------- #
+    # Queries
+    # ----------------------------------------------------------- #
+    def _curve(self):
+        """
+        Piecewise-linear (cumulative weight → value) through the centroid
+        centres, pinned to the exact min and max at the ends.
+        """
+        self._flush()
+        centres = np.cumsum(self._weights) - self._weights / 2.0
+        ranks = np.concatenate([[0.0], centres, [float(self.n)]])
+        values = np.concatenate([[self.min], self._means, [self.max]])
+        return ranks, values
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """
+        Approximate values at ranks `qs` (each in [0, 1]); NaN when empty.
+        """
+        qs = np.clip(np.asarray(qs, dtype=np.float64), 0.0, 1.0)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        ranks, values = self._curve()
+        return np.interp(qs * self.n, ranks, values)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def rank(self, value: float) -> float:
+        """
+        Approximate fraction of added values <= `value`; NaN when empty.
+        """
+        if self.n == 0:
+            return math.nan
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        ranks, values = self._curve()
+        return float(np.interp(value, values, ranks) / self.n)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def num_centroids(self) -> int:
+        self._flush()
+        return len(self._means)
+
+    # ----------------------------------------------------------- #
+    # Serialization
+    # ----------------------------------------------------------- #
+    def to_bytes(self) -> bytes:
+        """
+        Header, then centroid means (float64) and weights (uint32).
+        """
+        self._flush()
+        return b"".join((
+            _HEADER.pack(_VERSION, self.compression, self.n, self.min, self.max, len(self._means)),
+            self._means.astype("<f8").tobytes(),
+            self._weights.astype("<u4").tobytes(),
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TDigest":
+        version, compression, n, lo, hi, size = _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported t-digest version {version}")
+        digest = cls(compression)
+        digest.n, digest.min, digest.max = n, lo, hi
+        offset = _HEADER.size
+        digest._means = np.frombuffer(data, dtype="<f8", count=size, offset=offset).astype(np.float64)
+        digest._weights = np.frombuffer(data, dtype="<u4", count=size,
+                                        offset=offset + 8 * size).astype(np.float64)
+        return digest
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        restored = TDigest.from_bytes(state)
+        for name in TDigest.__slots__:
+            setattr(self, name, getattr(restored, name))
+
+
+def _k1(q: float, scale: float) -> float:
+    return scale * math.asin(2.0 * q - 1.0)
+
+
+def _k1_inverse(k: float, scale: float) -> float:
+    return (math.sin(min(max(k / scale, -math.pi / 2), math.pi / 2)) + 1.0) / 2.0
+
+
+def merge_digests(digests: Iterable[TDigest], compression: Optional[int] = None) -> TDigest:
+    """
+    Merge digests (e.g. one per shard) into a new digest.
+    """
+    digests = list(digests)
+    merged = TDigest(compression or (digests[0].compression if digests else DEFAULT_COMPRESSION))
+    for digest in digests:
+        merged.merge(digest)
+    return merged
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
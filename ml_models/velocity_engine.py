@@ -0,0 +1,268 @@
+# =============================================================== #
+# ================ ml_models/velocity_engine.py ================= #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Server-side sliding-window velocity per account_id
+# 🧮 Windows   : 1m / 1h / 24h counts and amount sums (bucketed rings)
+# 🎯 Injects   : txn_count_last_minute & friends before rules/features
+# ✅ Used by   : tools/detect_fraud.py
+# =============================================================== #
+
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# =============================================================== #
+# ======================= WINDOW CONFIG ========================= #
+# =============================================================== #
+
+# (field suffix, window span in seconds, number of buckets)
+VELOCITY_WINDOWS = (
+    ("last_minute", 60, 6),      # 10s buckets
+    ("last_hour", 3600, 12),     # 5m buckets
+    ("last_24h", 86400, 24),     # 1h buckets
+)
+
+DEFAULT_MAX_ACCOUNTS = 500_000
+DEFAULT_IDLE_TTL = 86400.0       # Drop accounts idle longer than the widest window
+
+# =============================================================== #
+# ===================== PER-ACCOUNT RING STATE ================== #
+# =============================================================== #
+
+class _AccountWindows:
+    """
+    Fixed-size bucket rings for every window, stored in flat typed arrays.
+
+    Each window keeps a running count/sum so reads are O(1); moving the
+    head forward only clears the buckets that fell out of the window,
+    which is bounded by the bucket count, never by account history.
+    """
+    __slots__ = ("counts", "sums", "heads", "total_counts", "total_sums", "last_seen")
+
+    def __init__(self, total_buckets: int, n_windows: int):
+        self.counts = array("I", bytes(4 * total_buckets))
+        self.sums = array("d", bytes(8 * total_buckets))
+        self.heads = array("q", [-1] * n_windows)
+        self.total_counts = array("q", bytes(8 * n_windows))
+        self.total_sums = array("d", bytes(8 * n_windows))
+        self.last_seen = 0.0
+
+# =============================================================== #
+# ======================= VELOCITY ENGINE ======================= #
+# =============================================================== #
+
+class VelocityEngine:
+    """
+    In-process velocity counters keyed by account_id.
+
+    Memory is bounded by `max_accounts` (least recently active accounts are
+    evicted first) and accounts idle for longer than `idle_ttl` seconds are
+    dropped as new events arrive. Idleness is measured on the process's
+    monotonic clock, not event time, so one future-dated transaction
+    cannot make every other account look idle. Window totals are bucket-granular: a
+    1-minute window with 10s buckets covers the last 50-60 seconds.
+    """
+
+    def __init__(self, windows=VELOCITY_WINDOWS,
+                 max_accounts: int = DEFAULT_MAX_ACCOUNTS,
+                 idle_ttl: float = DEFAULT_IDLE_TTL):
+        self.windows = tuple(windows)
+        self.max_accounts = max_accounts
+        self.idle_ttl = idle_ttl
+
+        self._widths = [span / buckets for _, span, buckets in self.windows]
+        self._sizes = [buckets for _, _, buckets in self.windows]
+        self._offsets = []
+        offset = 0
+        for size in self._sizes:
+            self._offsets.append(offset)
+            offset += size
+        self._total_buckets = offset
+        self._zero_counts = [array("I", bytes(4 * size)) for size in self._sizes]
+        self._zero_sums = [array("d", bytes(8 * size)) for size in self._sizes]
+        self._fields = [(f"txn_count_{suffix}", f"amount_sum_{suffix}")
+                        for suffix, _, _ in self.windows]
+
+        self._accounts: "OrderedDict[str, _AccountWindows]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------- #
+    # Core ring maintenance
+    # ----------------------------------------------------------- #
+    def _advance(self, state: _AccountWindows, w: int, epoch: int) -> None:
+        head = state.heads[w]
+        if epoch <= head:
+            return
+        size, offset = self._sizes[w], self._offsets[w]
+        if head < 0:
+            pass  # Fresh ring, already zeroed
+        elif epoch - head >= size:
+            state.counts[offset:offset + size] = self._zero_counts[w]
+            state.sums[offset:offset + size] = self._zero_sums[w]
+            state.total_counts[w] = 0
+            state.total_sums[w] = 0.0
+        else:
+            for e in range(head + 1, epoch + 1):
+                i = offset + e % size
+                state.total_counts[w] -= state.counts[i]
+                state.total_sums[w] -= state.sums[i]
+                state.counts[i] = 0
+                state.sums[i] = 0.0
+        state.heads[w] = epoch
+
+    def _snapshot(self, state: _AccountWindows) -> Dict[str, Any]:
+        derived = {}
+        for w, (count_field, sum_field) in enumerate(self._fields):
+            derived[count_field] = state.total_counts[w]
+            derived[sum_field] = round(state.total_sums[w], 2)
+        return derived
+
+    def _evict(self, now: float) -> None:
+        """
+        Enforce max_accounts, then drop accounts whose last event arrived
+        more than idle_ttl seconds before `now` (time.monotonic()).
+        """
+        accounts = self._accounts
+        while len(accounts) > self.max_accounts:
+            accounts.popitem(last=False)
+        # Amortised idle sweep: only ever inspects the oldest entries
+        while accounts:
+            oldest = next(iter(accounts.values()))
+            if now - oldest.last_seen <= self.idle_ttl:
+                break
+            accounts.popitem(last=False)
+
+    # ----------------------------------------------------------- #
+    # Public API
+    # ----------------------------------------------------------- #
+    def record(self, account_id: str, amount: float = 0.0,
+               ts: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Record one transaction and return the updated window aggregates.
+
+        Args:
+            account_id (str): Account the transaction belongs to
+            amount (float): Transaction amount
+            ts (float, optional): Event time (epoch seconds), defaults to now
+
+        Returns:
+            dict: txn_count_<window> and amount_sum_<window> for every window
+        """
+        ts = time.time() if ts is None else ts
+        try:
+            amount = float(amount or 0.0)
+        except (TypeError, ValueError):
+            amount = 0.0
+
+        with self._lock:
+            state = self._accounts.get(account_id)
+            if state is None:
+                state = _AccountWindows(self._total_buckets, len(self.windows))
+                self._accounts[account_id] = state
+            else:
+                self._accounts.move_to_end(account_id)
+
+            heads = state.heads
+            for w, width in enumerate(self._widths):
+                epoch = int(ts // width)
+                if epoch > heads[w]:
+                    self._advance(state, w, epoch)
+                size = self._sizes[w]
+                # Late events still count if their bucket is inside the ring
+                if epoch > heads[w] - size:
+                    i = self._offsets[w] + epoch % size
+                    state.counts[i] += 1
+                    state.sums[i] += amount
+                    state.total_counts[w] += 1
+                    state.total_sums[w] += amount
+
+            # Accounts stay ordered by last activity (move_to_end above)
+            state.last_seen = time.monotonic()
+            derived = self._snapshot(state)
+            self._evict(state.last_seen)
+
+        return derived
+
+    def peek(self, account_id: str, ts: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Read the window aggregates for an account without recording an event.
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            state = self._accounts.get(account_id)
+            if state is None:
+                return self._snapshot(_AccountWindows(self._total_buckets, len(self.windows)))
+            for w, width in enumerate(self._widths):
+                self._advance(state, w, int(ts // width))
+            return self._snapshot(state)
+
+    def enrich(self, transaction: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a transaction and return a copy carrying the derived velocity
+        fields. Values the caller already supplied are left untouched.
+
+        Args:
+            transaction (dict): Raw transaction with account_id/amount/timestamp
+
+        Returns:
+            dict: Transaction copy with txn_count_* / amount_sum_* fields
+        """
+        account_id = transaction.get("account_id")
+        if account_id is None:
+            return transaction
+
+        derived = self.record(
+            account_id,
+            transaction.get("amount", 0.0),
+            _event_time(transaction.get("timestamp")),
+        )
+        enriched = dict(transaction)
+        for field, value in derived.items():
+            enriched.setdefault(field, value)
+        return enriched
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+# =============================================================== #
+# =========================== HELPERS =========================== #
+# =============================================================== #
+
+def _event_time(timestamp: Any) -> Optional[float]:
+    """
+    Parse an ISO timestamp to epoch seconds (naive = UTC); None if unusable.
+    """
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if not timestamp:
+        return None
+    try:
+        dt = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+_default_engine: Optional[VelocityEngine] = None
+_default_engine_lock = threading.Lock()
+
+
+def get_velocity_engine() -> VelocityEngine:
+    """
+    Return the process-wide VelocityEngine.
+    """
+    global _default_engine
+    if _default_engine is None:
+        with _default_engine_lock:
+            if _default_engine is None:
+                _default_engine = VelocityEngine()
+    return _default_engine
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
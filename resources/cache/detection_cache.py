@@ -0,0 +1,280 @@
+# =============================================================== #
+# ============= resources/cache/detection_cache.py ============== #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Idempotent detect_fraud results for upstream retries
+# 🔑 Key       : transaction_id + content hash of the payload
+# 🧯 Bounds    : LRU capacity + TTL, in-flight requests coalesced
+# ✅ Used by   : tools/detect_fraud.py
+# =============================================================== #
+
+import asyncio
+import hashlib
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_TTL_SECONDS = 3600.0
+
+_encode = json.JSONEncoder(sort_keys=True, default=str).encode
+
+
+def _freeze(result: Any) -> bytes:
+    return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+
+# =============================================================== #
+# ============================ KEYS ============================= #
+# =============================================================== #
+
+def cache_key(transaction: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    (transaction_id, content hash) for a transaction, or None when it has
+    no transaction_id or cannot be serialised (such requests are not cached).
+    A retry with the same id but a different payload gets a different key.
+    """
+    transaction_id = transaction.get("transaction_id")
+    if transaction_id is None:
+        return None
+    try:
+        payload = _encode(transaction).encode("utf-8")
+    except (TypeError, ValueError):
+        return None
+    return str(transaction_id), hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+# =============================================================== #
+# ======================= DETECTION CACHE ======================= #
+# =============================================================== #
+
+class _InFlight:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[bytes] = None
+        self.error: Optional[BaseException] = None
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def add_waiter(self) -> asyncio.Future:
+        """
+        Awaitable completion for a coroutine (register under the cache lock).
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.waiters.append((loop, future))
+        return future
+
+    def finish(self) -> None:
+        self.event.set()
+        for loop, future in self.waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class DetectionCache:
+    """
+    Bounded LRU/TTL map from cache_key() to a detection result.
+
+    Entries expire `ttl` seconds after they were stored and the least
+    recently used entry is evicted once `max_entries` is reached, so memory
+    stays capped. Results are stored pickled (compact, and far cheaper than
+    deepcopy) and every hit returns a fresh object, so callers can mutate
+    what they get back. Failed computations are never cached.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, bytes]]" = OrderedDict()
+        self._inflight: Dict[Hashable, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ("hits", "misses", "coalesced", "evictions", "expirations"), 0)
+
+    # ----------------------------------------------------------- #
+    # Internal (caller holds the lock)
+    # ----------------------------------------------------------- #
+    def _get_locked(self, key: Hashable, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self._counts["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def _put_locked(self, key: Hashable, frozen: bytes, now: float) -> None:
+        entries = self._entries
+        entries[key] = (now + self.ttl, frozen)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self._counts["evictions"] += 1
+
+    # ----------------------------------------------------------- #
+    # Public API
+    # ----------------------------------------------------------- #
+    def lookup(self, key: Optional[Hashable]) -> Optional[Any]:
+        """
+        Cached result for a key (a copy), or None. Counts a hit or a miss.
+        """
+        if key is None:
+            return None
+        with self._lock:
+            result = self._get_locked(key, time.monotonic())
+            self._counts["hits" if result is not None else "misses"] += 1
+        return pickle.loads(result) if result is not None else None
+
+    def store(self, key: Optional[Hashable], result: Any) -> None:
+        if key is None:
+            return
+        frozen = _freeze(result)
+        with self._lock:
+            self._put_locked(key, frozen, time.monotonic())
+
+    def get_or_compute(self, key: Optional[Hashable],
+                       compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Return the cached result for `key`, or run `compute()` once and
+        cache it. Concurrent callers with the same key wait for the first
+        one instead of recomputing.
+
+        Args:
+            key (hashable | None): cache_key() value; None bypasses the cache
+            compute (callable): Produces the result on a miss
+
+        Returns:
+            tuple: (result, cached) where cached is True if no computation
+                   ran on behalf of this caller
+        """
+        if key is None:
+            return compute(), False
+
+        hit, pending, owner, _ = self._claim(key)
+        if hit is not None:
+            return hit, True
+        if not owner:
+            pending.event.wait()
+            return self._shared_result(pending), True
+
+        try:
+            result = compute()
+            pending.result = _freeze(result)
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            self._release(key, pending)
+        return result, False
+
+    async def get_or_compute_async(self, key: Optional[Hashable],
+                                   compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        get_or_compute() for coroutines: `compute()` is awaited, and
+        concurrent callers (sync or async) with the same key share one run
+        without blocking the event loop while they wait.
+        """
+        if key is None:
+            return await compute(), False
+
+        hit, pending, owner, waiter = self._claim(key, wait_async=True)
+        if hit is not None:
+            return hit, True
+        if not owner:
+            await waiter
+            return self._shared_result(pending), True
+
+        try:
+            result = await compute()
+            pending.result = _freeze(result)
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            self._release(key, pending)
+        return result, False
+
+    def _claim(self, key: Hashable, wait_async: bool = False):
+        """
+        (result, pending, owner, waiter): the cached result on a hit;
+        otherwise the in-flight entry, whether this caller must compute it,
+        and (wait_async joiners only) a future resolved when it finishes.
+        """
+        with self._lock:
+            result = self._get_locked(key, time.monotonic())
+            if result is not None:
+                self._counts["hits"] += 1
+                return pickle.loads(result), None, False, None
+            pending = self._inflight.get(key)
+            if pending is None:
+                self._counts["misses"] += 1
+                pending = self._inflight[key] = _InFlight()
+                return None, pending, True, None
+            self._counts["coalesced"] += 1
+            waiter = pending.add_waiter() if wait_async else None
+            return None, pending, False, waiter
+
+    def _release(self, key: Hashable, pending: _InFlight) -> None:
+        with self._lock:
+            del self._inflight[key]
+            if pending.error is None:
+                self._put_locked(key, pending.result, time.monotonic())
+        pending.finish()
+
+    @staticmethod
+    def _shared_result(pending: _InFlight) -> Any:
+        if pending.error is not None:
+            raise pending.error
+        return pickle.loads(pending.result)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            dict: hits, misses, coalesced (in-flight dedupes), evictions,
+                  expirations, size, max_entries, hit_rate
+        """
+        with self._lock:
+            stats = dict(self._counts)
+            stats["size"] = len(self._entries)
+            stats["in_flight"] = len(self._inflight)
+        stats["max_entries"] = self.max_entries
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_default_cache: Optional[DetectionCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_detection_cache() -> DetectionCache:
+    """
+    Return the process-wide DetectionCache.
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = DetectionCache()
+    return _default_cache
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
@@ -0,0 +1,281 @@
+# =============================================================== #
+# ================= resources/db/case_writer.py ================= #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Group-commit writer for fraud case inserts and
+#                status updates
+# 🧮 Method    : One writer thread drains a FIFO queue; each batch
+#                (size- or time-bounded) commits in one transaction
+# 🎯 Returns   : Futures resolved once the batch is durable
+# ✅ Used by   : resources/db/fraud_cases_db.py, tools/create_case.py
+# =============================================================== #
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from resources.db.connection import ConnectionManager
+
+DEFAULT_MAX_BATCH = 1000        # Operations (or bulk rows) per transaction
+DEFAULT_FLUSH_INTERVAL = 0.005  # Seconds a batch waits for more work
+DEFAULT_SYNCHRONOUS = "FULL"    # fsync every commit: acknowledged = durable
+
+CASE_COLUMNS = ("case_id", "customer_id", "status", "risk_score", "created_at", "updated_at", "metadata")
+
+_INSERT_SQL = """
+    INSERT INTO fraud_cases (case_id, customer_id, status, risk_score, created_at, updated_at, metadata)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+_STATUS_SQL = """
+    UPDATE fraud_cases
+    SET status = ?, notes = COALESCE(?, notes), updated_at = ?
+    WHERE case_id = ?
+"""
+
+
+def case_row(case: Dict[str, Any]) -> tuple:
+    """
+    fraud_cases row from a case dict. `account_id` stands in for a missing
+    `customer_id`; other non-column fields (description, severity, flags,
+    ...) are stored as JSON metadata unless `metadata` is given.
+    """
+    created_at = case.get("created_at") or datetime.utcnow().isoformat()
+    metadata = case.get("metadata")
+    if metadata is None:
+        extras = {k: v for k, v in case.items() if k not in CASE_COLUMNS and k != "account_id"}
+        metadata = json.dumps(extras, default=str) if extras else ""
+    elif not isinstance(metadata, str):
+        metadata = json.dumps(metadata, default=str)
+    return (
+        case["case_id"],
+        case.get("customer_id", case.get("account_id")),
+        case.get("status") or "open",
+        case.get("risk_score"),
+        created_at,
+        case.get("updated_at") or created_at,
+        metadata,
+    )
+
+# =============================================================== #
+# ========================= CASE WRITER ========================= #
+# =============================================================== #
+
+class _Op:
+    __slots__ = ("kind", "params", "future", "urgent")
+
+    def __init__(self, kind: str, params: Any, urgent: bool):
+        self.kind = kind
+        self.params = params
+        self.future: Future = Future()
+        self.urgent = urgent
+
+
+class CaseWriter:
+    """
+    Queues case writes and commits them in batches from one background
+    thread, so a burst of N cases costs a handful of transactions (and
+    fsyncs) instead of N.
+
+    Operations are applied in submission order, which keeps inserts and
+    status updates of the same case_id ordered. A batch closes when it
+    holds `max_batch` operations, when `flush_interval` has passed since
+    its first operation, or as soon as it contains an urgent operation (a
+    caller blocking on the result). Each returned Future resolves after
+    the batch has committed; if a batch fails, its operations are
+    replayed one per transaction so only the failing ones get the
+    exception.
+    """
+
+    def __init__(self, manager: ConnectionManager, max_batch: int = DEFAULT_MAX_BATCH,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 synchronous: Optional[str] = DEFAULT_SYNCHRONOUS):
+        self.manager = manager
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self._queue: "queue.Queue[Optional[_Op]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    # ----------------------------------------------------------- #
+    # Submission
+    # ----------------------------------------------------------- #
+    def _submit(self, kind: str, params: Any, urgent: bool = False) -> Future:
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    # A forked child gets its own queue and writer thread
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._run, name="case-writer", daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+        op = _Op(kind, params, urgent)
+        self._queue.put(op)
+        return op.future
+
+    def insert_case(self, case: Dict[str, Any], urgent: bool = False) -> Future:
+        """
+        Queue one case insert (see case_row()). Resolves to True.
+        """
+        return self._submit("insert", case_row(case), urgent)
+
+    def update_status(self, case_id: str, new_status: str, notes: Optional[str] = None,
+                      urgent: bool = False) -> Future:
+        """
+        Queue a status update (notes are kept unless given). Resolves to
+        whether the case existed.
+        """
+        params = (new_status, notes, datetime.utcnow().isoformat(), case_id)
+        return self._submit("status", params, urgent)
+
+    def insert_cases(self, cases: Iterable[Dict[str, Any]]) -> Future:
+        """
+        Queue many inserts as chunks of `max_batch` rows (one executemany
+        each). Resolves to the number of rows inserted once every chunk
+        has committed, or to the first chunk's error.
+        """
+        futures, chunk = [], []
+        for case in cases:
+            chunk.append(case_row(case))
+            if len(chunk) >= self.max_batch:
+                futures.append(self._submit("bulk", chunk))
+                chunk = []
+        if chunk:
+            futures.append(self._submit("bulk", chunk))
+        return _gather(futures)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        Block until everything queued before this call has committed.
+        """
+        self._submit("barrier", None, urgent=True).result(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Commit what is queued and stop the writer thread.
+        """
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    # ----------------------------------------------------------- #
+    # Writer thread
+    # ----------------------------------------------------------- #
+    def _run(self) -> None:
+        if self.synchronous:
+            self.manager.connection().execute(f"PRAGMA synchronous = {self.synchronous}")
+        running = True
+        while running:
+            op = self._queue.get()
+            if op is None:
+                break
+            batch = [op]
+            urgent = op.urgent
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                wait = 0.0 if urgent else deadline - time.monotonic()
+                try:
+                    op = self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is None:
+                    running = False
+                    break
+                batch.append(op)
+                urgent = urgent or op.urgent
+            self._commit([op for op in batch if op.future.set_running_or_notify_cancel()])
+
+    def _apply(self, conn, op: _Op) -> Any:
+        if op.kind == "insert":
+            conn.execute(_INSERT_SQL, op.params)
+            return True
+        if op.kind == "status":
+            return conn.execute(_STATUS_SQL, op.params).rowcount > 0
+        if op.kind == "bulk":
+            conn.executemany(_INSERT_SQL, op.params)
+            return len(op.params)
+        return None
+
+    def _commit(self, batch: List[_Op]) -> None:
+        if not batch:
+            return
+        try:
+            with self.manager.transaction() as conn:
+                results = [self._apply(conn, op) for op in batch]
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+                return
+            # Isolate the failing operation(s); the rest still commit in order
+            for op in batch:
+                self._commit_one(op)
+            return
+        for op, result in zip(batch, results):
+            op.future.set_result(result)
+
+    def _commit_one(self, op: _Op) -> None:
+        try:
+            with self.manager.transaction() as conn:
+                result = self._apply(conn, op)
+        except Exception as e:
+            op.future.set_exception(e)
+        else:
+            op.future.set_result(result)
+
+
+def _gather(futures: List[Future]) -> Future:
+    """
+    Future of the summed results of `futures` (first error wins).
+    """
+    combined: Future = Future()
+    if not futures:
+        combined.set_result(0)
+        return combined
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            combined.set_exception(errors[0])
+        else:
+            combined.set_result(sum(f.result() for f in futures))
+
+    for future in futures:
+        future.add_done_callback(on_done)
+    return combined
+
+
+_default_writer: Optional[CaseWriter] = None
+_default_writer_lock = threading.Lock()
+
+
+def get_case_writer() -> CaseWriter:
+    """
+    Return the process-wide CaseWriter for the fraud case database
+    (schema created on first use, queue committed at interpreter exit).
+    """
+    global _default_writer
+    if _default_writer is None:
+        with _default_writer_lock:
+            if _default_writer is None:
+                from resources.db.fraud_cases_db import get_case_db, init_db
+                init_db()
+                writer = CaseWriter(get_case_db())
+                atexit.register(writer.close)
+                _default_writer = writer
+    return _default_writer
+
+# =============================================================== #
+# ========================= END OF FILE ========================= #
+# =============================================================== #
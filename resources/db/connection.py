@@ -0,0 +1,149 @@
+# =============================================================== #
+# ================= resources/db/connection.py ================== #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Shared SQLite connections for the case database
+# 🔄 Supports  : Per-thread connections, WAL, tuned pragmas,
+#                prepared statement cache, write transactions
+# ✅ Used by   : resources/db/fraud_cases_db.py, tools, monitoring
+# =============================================================== #
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+STATEMENT_CACHE_SIZE = 256   # Prepared statements kept per connection (keyed by SQL text)
+BUSY_TIMEOUT = 5.0           # Seconds a writer waits for the write lock
+
+# WAL lets readers run alongside the single writer; NORMAL sync is
+# durable across application crashes (only an OS crash can drop the
+# last commits) and skips an fsync per transaction.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -32768,         # KiB (negative) → 32 MiB page cache per connection
+    "mmap_size": 268435456,       # 256 MiB memory-mapped reads
+    "temp_store": "MEMORY",
+}
+
+# =============================================================== #
+# ====================== CONNECTION MANAGER ===================== #
+# =============================================================== #
+
+class ConnectionManager:
+    """
+    One lazily opened connection per thread (and per process: a forked
+    child opens its own instead of reusing the parent's).
+
+    Connections run in autocommit mode; writes go through transaction(),
+    which takes the write lock up front (BEGIN IMMEDIATE) so concurrent
+    writers queue on busy_timeout instead of failing on lock upgrade.
+    Statements are prepared once per connection and reused from
+    sqlite3's statement cache, so callers should pass the same SQL text
+    with ? parameters rather than formatting values in.
+    """
+
+    def __init__(self, path: str, pragmas: Optional[Dict[str, Any]] = None,
+                 cached_statements: int = STATEMENT_CACHE_SIZE, timeout: float = BUSY_TIMEOUT):
+        self.path = path
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        The calling thread's connection, opened on first use.
+        """
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is None or local.pid != os.getpid():
+            conn = self._open()
+            local.conn, local.pid, local.depth = conn, os.getpid(), 0
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               cached_statements=self.cached_statements,
+                               check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Write transaction on the thread's connection: committed on exit,
+        rolled back on error. Nested use joins the outer transaction.
+        """
+        conn = self.connection()
+        local = self._local
+        if local.depth:
+            local.depth += 1
+            try:
+                yield conn
+            finally:
+                local.depth -= 1
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            local.depth = 0
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return self.connection().execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return self.connection().execute(sql, params).fetchall()
+
+    def close_all(self) -> None:
+        """
+        Close every connection this manager opened (e.g. at shutdown).
+        Threads transparently reopen on their next call.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(path: str) -> ConnectionManager:
+    """
+    Return the process-wide ConnectionManager for a database file.
+    """
+    key = os.path.abspath(path)
+    manager = _managers.get(key)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.get(key)
+            if manager is None:
+                manager = _managers[key] = ConnectionManager(path)
+    return manager
+
+# =============================================================== #
+# ========================= END OF FILE ========================= #
+# =============================================================== #
@@ -3,82 +3,218 @@
 # --------------------------------------------------------------- #
 # 📌 Purpose   : Handles SQLite DB for fraud cases
 # 🗂️ Tables     : fraud_cases
-# 🔄 Supports   : insert, update, fetch by ID or status
+# 🔄 Supports   : insert (group-commit writer), bulk insert, update,
+#                fetch by ID, keyset-paginated filtered queries
 # ✅ Used by   : tools, flows, UI components
 # =============================================================== #
 
-import sqlite3
 import os
+from concurrent.futures import Future
 from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from resources.db.case_writer import get_case_writer
+from resources.db.connection import ConnectionManager, get_connection_manager
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "fraud_cases.db")
 
+# Column order of every row returned by the fetch helpers; selected by
+# name, so rows keep this layout whatever order the table's columns are in
+CASE_COLUMNS = ("case_id", "customer_id", "status", "risk_score",
+                "created_at", "updated_at", "metadata", "notes")
+_SELECT_CASES = f"SELECT {', '.join(CASE_COLUMNS)} FROM fraud_cases"
+_CURSOR_COLUMNS = (CASE_COLUMNS.index("created_at"), CASE_COLUMNS.index("case_id"))
+
+
+def get_db_path() -> str:
+    return DB_PATH
+
+
+def get_case_db() -> ConnectionManager:
+    """
+    Shared connection manager for the fraud case database.
+    """
+    return get_connection_manager(DB_PATH)
+
 # =============================================================== #
 # ========================= INIT SCHEMA ========================= #
 # =============================================================== #
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS fraud_cases (
-            case_id TEXT PRIMARY KEY,
-            customer_id TEXT,
-            status TEXT,
-            risk_score INTEGER,
-            created_at TEXT,
-            updated_at TEXT,
-            metadata TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    with get_case_db().transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fraud_cases (
+                case_id TEXT PRIMARY KEY,
+                customer_id TEXT,
+                status TEXT,
+                risk_score INTEGER,
+                created_at TEXT,
+                updated_at TEXT,
+                metadata TEXT,
+                notes TEXT
+            )
+        """)
+        # Databases created before the notes column
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(fraud_cases)")}
+        if "notes" not in columns:
+            conn.execute("ALTER TABLE fraud_cases ADD COLUMN notes TEXT")
+        # Each index ends in (created_at, case_id): the keyset order of
+        # fetch_cases_page(), so filtered pages are index range scans
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_fraud_cases_status
+            ON fraud_cases (status, created_at, case_id)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_fraud_cases_customer
+            ON fraud_cases (customer_id, created_at, case_id)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_fraud_cases_created
+            ON fraud_cases (created_at, case_id)
+        """)
 
 # =============================================================== #
 # ======================== DB OPERATIONS ======================== #
 # =============================================================== #
 
 def insert_case(case_id, customer_id, risk_score, metadata=""):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    timestamp = datetime.utcnow().isoformat()
-    c.execute("""
-        INSERT INTO fraud_cases (case_id, customer_id, status, risk_score, created_at, updated_at, metadata)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (case_id, customer_id, "open", risk_score, timestamp, timestamp, metadata))
-    conn.commit()
-    conn.close()
-
-
-def update_case_status(case_id, new_status):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    timestamp = datetime.utcnow().isoformat()
-    c.execute("""
-        UPDATE fraud_cases
-        SET status = ?, updated_at = ?
-        WHERE case_id = ?
-    """, (new_status, timestamp, case_id))
-    conn.commit()
-    conn.close()
+    get_case_writer().insert_case({
+        "case_id": case_id,
+        "customer_id": customer_id,
+        "risk_score": risk_score,
+        "metadata": metadata,
+    }, urgent=True).result()
+
+
+def insert_case_record(case_data: Dict[str, Any]) -> Future:
+    """
+    Queue a case insert on the group-commit writer without waiting.
+
+    Args:
+        case_data (Dict): case_id plus column values; account_id maps to
+            customer_id and other fields are kept as JSON metadata
+
+    Returns:
+        Future: Resolves once the case is committed
+    """
+    return get_case_writer().insert_case(case_data)
+
+
+def insert_cases(cases: Iterable[Dict[str, Any]]) -> Future:
+    """
+    Bulk insert; the Future resolves to the number of rows committed.
+    """
+    return get_case_writer().insert_cases(cases)
+
+
+def update_case_status(case_id, new_status, notes=None):
+    return get_case_writer().update_status(case_id, new_status, notes, urgent=True).result()
 
 
 def fetch_case(case_id):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT * FROM fraud_cases WHERE case_id = ?", (case_id,))
-    row = c.fetchone()
-    conn.close()
-    return row
+    return get_case_db().fetchone(f"{_SELECT_CASES} WHERE case_id = ?", (case_id,))
 
 
 def fetch_cases_by_status(status):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT * FROM fraud_cases WHERE status = ?", (status,))
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    """
+    All cases with a status, newest first. Prefer iter_cases() or
+    fetch_cases_page() for large queues.
+    """
+    return list(iter_cases(status=status))
+
+# =============================================================== #
+# ====================== PAGINATED QUERIES ====================== #
+# =============================================================== #
+
+DEFAULT_PAGE_SIZE = 500
+
+Cursor = Tuple[str, str]   # (created_at, case_id) of the last row served
+
+
+def _timestamp(value: Union[str, datetime, None]) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def fetch_cases_page(status: Optional[str] = None, customer_id: Optional[str] = None,
+                     created_after: Union[str, datetime, None] = None,
+                     created_before: Union[str, datetime, None] = None,
+                     limit: int = DEFAULT_PAGE_SIZE, after: Optional[Cursor] = None,
+                     newest_first: bool = True) -> Tuple[List[tuple], Optional[Cursor]]:
+    """
+    One page of cases ordered by (created_at, case_id), continuing after
+    a cursor instead of an OFFSET, so every page costs the same however
+    deep the queue is.
+
+    Args:
+        status (str, optional): Only cases with this status
+        customer_id (str, optional): Only this customer's cases
+        created_after (str | datetime, optional): created_at >= bound
+        created_before (str | datetime, optional): created_at < bound
+        limit (int): Page size (at least 1)
+        after (Cursor, optional): Cursor returned with the previous page
+        newest_first (bool): Descending (default) or ascending order
+
+    Returns:
+        (List[tuple], Cursor | None): Rows (laid out as CASE_COLUMNS) and
+        the cursor of the next page (None once the last page was served)
+
+    Raises:
+        ValueError: If limit < 1
+    """
+    if limit < 1:
+        raise ValueError(f"limit must be at least 1, got {limit}")
+    clauses, params = [], []
+    if status is not None:
+        clauses.append("status = ?")
+        params.append(status)
+    if customer_id is not None:
+        clauses.append("customer_id = ?")
+        params.append(customer_id)
+    if created_after is not None:
+        clauses.append("created_at >= ?")
+        params.append(_timestamp(created_after))
+    if created_before is not None:
+        clauses.append("created_at < ?")
+        params.append(_timestamp(created_before))
+    if after is not None:
+        clauses.append("(created_at, case_id) < (?, ?)" if newest_first
+                       else "(created_at, case_id) > (?, ?)")
+        params.extend(after)
+
+    direction = "DESC" if newest_first else "ASC"
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = get_case_db().fetchall(
+        f"{_SELECT_CASES} {where} "
+        f"ORDER BY created_at {direction}, case_id {direction} LIMIT ?",
+        (*params, limit),
+    )
+    next_cursor = tuple(rows[-1][i] for i in _CURSOR_COLUMNS) if len(rows) == limit else None
+    return rows, next_cursor
+
+
+def iter_cases(status: Optional[str] = None, customer_id: Optional[str] = None,
+               created_after: Union[str, datetime, None] = None,
+               created_before: Union[str, datetime, None] = None,
+               page_size: int = DEFAULT_PAGE_SIZE, newest_first: bool = True) -> Iterator[tuple]:
+    """
+    Stream every matching case, one keyset page in memory at a time
+    (same filters as fetch_cases_page()). Raises ValueError right away
+    if page_size < 1.
+    """
+    if page_size < 1:
+        raise ValueError(f"page_size must be at least 1, got {page_size}")
+    return _iter_pages(status, customer_id, created_after, created_before, page_size, newest_first)
+
+
+def _iter_pages(status, customer_id, created_after, created_before,
+                page_size, newest_first) -> Iterator[tuple]:
+    cursor = None
+    while True:
+        rows, cursor = fetch_cases_page(status, customer_id, created_after, created_before,
+                                        page_size, cursor, newest_first)
+        yield from rows
+        if cursor is None:
+            return
 
 # =============================================================== #
 # ========================= END OF FILE ========================= #
@@ -0,0 +1,339 @@
+# =============================================================== #
+# ============ resources/fraud_rules/blacklist.py =============== #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Large external blacklists for the `in` rule operator
+# 🧮 Storage   : Sorted uint64 hashes, memory-mapped from a .npy index
+# 🔁 Reload    : Appended lines merged incrementally, rewrites rebuilt
+# ✅ Used by   : resources/fraud_rules/rule_engine.py, batch_evaluator.py
+# =============================================================== #
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, IO, Optional, Tuple
+
+import numpy as np
+
+# Entries buffered in memory before they are folded into the mmap'ed index
+DELTA_COMPACT_MIN = 65_536
+# Small chunks keep each GIL-holding step (splitlines, sort) short while
+# a rebuild runs next to request threads
+READ_CHUNK_BYTES = 1024 * 1024
+# Bytes before the consumed offset re-read to detect an in-place rewrite
+PREFIX_CHECK_BYTES = 64
+
+_EMPTY = np.empty(0, dtype=np.uint64)
+
+# =============================================================== #
+# =========================== HASHING =========================== #
+# =============================================================== #
+
+def _hash_entry(entry: str) -> int:
+    return int.from_bytes(hashlib.blake2b(entry.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _hash_lines(lines: Iterable[bytes]) -> np.ndarray:
+    """
+    Sorted hashes of the entries among `lines`.
+    """
+    hashes = []
+    for line in lines:
+        entry = line.strip()
+        if not entry or entry.startswith(b"#"):
+            continue
+        hashes.append(int.from_bytes(hashlib.blake2b(entry, digest_size=8).digest(), "little"))
+    hashes = np.array(hashes, dtype=np.uint64)
+    hashes.sort()
+    return hashes
+
+
+def _merge_sorted(parts: Iterable[np.ndarray]) -> np.ndarray:
+    """
+    Distinct values of already sorted arrays. A stable sort merges the
+    runs in near-linear time, where np.unique() would re-sort everything.
+    """
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return _EMPTY
+    merged = np.concatenate(parts)
+    if len(parts) > 1:
+        merged.sort(kind="stable")
+    keep = np.empty(len(merged), dtype=bool)
+    keep[0] = True
+    np.not_equal(merged[1:], merged[:-1], out=keep[1:])
+    return merged[keep]
+
+
+def _member(sorted_hashes: np.ndarray, h: int) -> bool:
+    if not len(sorted_hashes):
+        return False
+    i = int(np.searchsorted(sorted_hashes, np.uint64(h)))
+    return i < len(sorted_hashes) and int(sorted_hashes[i]) == h
+
+
+@contextmanager
+def _atomic_file(path: str, mode: str) -> Iterator[IO]:
+    """
+    Write to a unique temp file next to `path`, then rename it into place.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                    prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# =============================================================== #
+# ========================== BLACKLIST ========================== #
+# =============================================================== #
+
+class Blacklist:
+    """
+    Membership set over a newline-delimited file of identifiers.
+
+    Entries are stored as sorted 64-bit BLAKE2b hashes in `<file>.idx.npy`,
+    memory-mapped read-only, so resident memory stays small and lookups are
+    O(log n). Lines appended to the source file are hashed into a small
+    in-memory delta on refresh(); any other change triggers a rebuild.
+    refresh_in_background() runs that work on a daemon thread: lookups
+    never take the lock and keep using the current arrays until the new
+    ones are swapped in with a single assignment.
+    With 64-bit hashes a false positive needs a hash collision (~n / 2^64
+    per lookup), which is negligible even for hundreds of millions of ids.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.index_path = self.path + ".idx.npy"
+        self.meta_path = self.path + ".idx.json"
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._arrays = (_EMPTY, _EMPTY)   # (mmap'ed base, in-memory delta)
+        self._stat_key = None
+        self._offset = 0
+        self._prefix = b""
+        self.refresh()
+
+    # ----------------------------------------------------------- #
+    # Lookups
+    # ----------------------------------------------------------- #
+    def __contains__(self, value: Any) -> bool:
+        if value is None:
+            return False
+        h = _hash_entry(str(value))
+        base, delta = self._arrays
+        return _member(base, h) or _member(delta, h)
+
+    def contains_many(self, values: Iterable[Any]) -> np.ndarray:
+        """
+        Vectorized membership for a column of values (None never matches).
+        """
+        values = list(values)
+        present = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+        hashes = np.fromiter(
+            (_hash_entry(str(v)) if v is not None else 0 for v in values),
+            dtype=np.uint64, count=len(values),
+        )
+        base, delta = self._arrays
+        hits = np.zeros(len(values), dtype=bool)
+        for table in (base, delta):
+            if len(table):
+                idx = np.minimum(np.searchsorted(table, hashes), len(table) - 1)
+                hits |= table[idx] == hashes
+        return hits & present
+
+    def __len__(self) -> int:
+        base, delta = self._arrays
+        return len(base) + len(delta)
+
+    def __repr__(self) -> str:
+        return f"Blacklist({self.path!r}, entries={len(self)})"
+
+    # ----------------------------------------------------------- #
+    # Loading & refresh
+    # ----------------------------------------------------------- #
+    def _source_key(self) -> Tuple[os.stat_result, tuple]:
+        st = os.stat(self.path)
+        return st, (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def refresh(self) -> bool:
+        """
+        Pick up changes to the source file.
+
+        Returns:
+            bool: True if the loaded entries changed
+        """
+        with self._lock:
+            # Stat before reading: the index metadata records this size and
+            # mtime, so bytes appended during the read are picked up later
+            st, stat_key = self._source_key()
+            if stat_key == self._stat_key:
+                return False
+
+            if self._stat_key is None and self._load_index(st):
+                self._stat_key = stat_key
+                return True
+
+            appendable = (
+                self._stat_key is not None
+                and st.st_ino == self._stat_key[0]
+                and st.st_size >= self._offset
+                and self._prefix.endswith(b"\n")   # Last consumed line was complete
+                and self._prefix_unchanged()
+            )
+            if appendable:
+                self._append_tail(st)
+            else:
+                self._rebuild(st)
+
+            self._stat_key = stat_key
+            return True
+
+    def _prefix_unchanged(self) -> bool:
+        start = max(0, self._offset - len(self._prefix))
+        with open(self.path, "rb") as file:
+            file.seek(start)
+            return file.read(self._offset - start) == self._prefix
+
+    def _remember_prefix(self, file) -> None:
+        start = max(0, self._offset - PREFIX_CHECK_BYTES)
+        file.seek(start)
+        self._prefix = file.read(self._offset - start)
+
+    def _read_lines(self, file):
+        """
+        Yield chunks of lines from the current offset to EOF, advancing it.
+        """
+        file.seek(self._offset)
+        pending = b""
+        while True:
+            chunk = file.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            chunk = pending + chunk
+            cut = chunk.rfind(b"\n") + 1
+            pending = chunk[cut:]
+            if cut:
+                self._offset += cut
+                yield chunk[:cut].splitlines()
+        if pending:
+            # Last line without a trailing newline
+            self._offset += len(pending)
+            yield [pending]
+
+    def refresh_in_background(self) -> bool:
+        """
+        Start refresh() on a daemon thread if the source file changed and
+        no refresh is already running; the caller never waits for a
+        rebuild.
+
+        Returns:
+            bool: True if a refresh was started
+        """
+        if self._source_key()[1] == self._stat_key or not self._refreshing.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._background_refresh, name="blacklist-refresh",
+                         daemon=True).start()
+        return True
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        except OSError as e:
+            print(f"[⚠️ WARN] Blacklist refresh failed for {self.path}: {e}")
+        finally:
+            self._refreshing.release()
+
+    def _append_tail(self, st: os.stat_result) -> None:
+        with open(self.path, "rb") as file:
+            parts = [_hash_lines(lines) for lines in self._read_lines(file)]
+            self._remember_prefix(file)
+        if not parts:
+            return
+
+        base, delta = self._arrays
+        delta = _merge_sorted([delta, *parts])
+        if len(delta) >= max(DELTA_COMPACT_MIN, len(base) // 16):
+            self._write_index(_merge_sorted([base, delta]), st)
+        else:
+            self._arrays = (base, delta)
+
+    def _rebuild(self, st: os.stat_result) -> None:
+        self._offset = 0
+        with open(self.path, "rb") as file:
+            parts = [_hash_lines(lines) for lines in self._read_lines(file)]
+            self._remember_prefix(file)
+        self._write_index(_merge_sorted(parts), st)
+
+    def _write_index(self, hashes: np.ndarray, st: os.stat_result) -> None:
+        # Unique temp names: concurrent rebuilds (e.g. sharded workers)
+        # must not overwrite each other's file before the rename
+        with _atomic_file(self.index_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(hashes, dtype=np.uint64))
+
+        meta = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "offset": self._offset}
+        with _atomic_file(self.meta_path, "w") as f:
+            json.dump(meta, f)
+
+        self._arrays = (self._map_index(), _EMPTY)
+
+    def _load_index(self, st: os.stat_result) -> bool:
+        """
+        Reuse an index written by a previous process if it matches the source.
+        """
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["mtime_ns"] != st.st_mtime_ns or meta["size"] != st.st_size:
+                return False
+            base = self._map_index()
+        except (OSError, ValueError, KeyError):
+            return False
+
+        self._offset = meta["offset"]
+        with open(self.path, "rb") as file:
+            self._remember_prefix(file)
+        self._arrays = (base, _EMPTY)
+        return True
+
+    def _map_index(self) -> np.ndarray:
+        base = np.load(self.index_path, mmap_mode="r")
+        return base if len(base) else _EMPTY
+
+# =============================================================== #
+# ========================== REGISTRY =========================== #
+# =============================================================== #
+
+_blacklists: Dict[str, Blacklist] = {}
+_blacklists_lock = threading.Lock()
+
+
+def get_blacklist(path: str, base_dir: Optional[str] = None) -> Blacklist:
+    """
+    Return the shared Blacklist for a file (relative paths resolve
+    against `base_dir`, normally the directory of rules.yaml).
+    """
+    if base_dir and not os.path.isabs(path):
+        path = os.path.join(base_dir, path)
+    path = os.path.abspath(path)
+
+    blacklist = _blacklists.get(path)
+    if blacklist is None:
+        with _blacklists_lock:
+            blacklist = _blacklists.get(path)
+            if blacklist is None:
+                blacklist = _blacklists[path] = Blacklist(path)
+    return blacklist
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
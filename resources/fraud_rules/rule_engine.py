@@ -0,0 +1,428 @@
+# =============================================================== #
+# =========== resources/fraud_rules/rule_engine.py ============== #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Compile rules.yaml once into native predicates
+# 🔁 Reload    : Atomic hot-swap when file mtime / content hash changes
+# ✅ Used by   : tools/apply_rules.py
+# =============================================================== #
+
+import hashlib
+import operator
+import os
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from resources.monitoring.rule_profiler import RuleStats, get_rule_profiler
+
+from .blacklist import Blacklist, get_blacklist
+from .rule_loader import RULES_FILE
+
+# =============================================================== #
+# ======================= OPERATOR TABLE ======================== #
+# =============================================================== #
+
+def _contains(value: Any, collection: Any) -> bool:
+    return value in collection
+
+
+OPERATORS = {
+    "gt": operator.gt,
+    "lt": operator.lt,
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "in": _contains,
+}
+
+# Seconds between mtime checks on the rules file
+DEFAULT_CHECK_INTERVAL = 1.0
+
+# =============================================================== #
+# ====================== COMPILED OBJECTS ======================= #
+# =============================================================== #
+
+class Predicate:
+    """
+    A single `field <operator> value` condition bound to a native callable.
+    A missing (None) field never satisfies a predicate. Identical conditions
+    across rules are interned to one Predicate with a shared `index`.
+    """
+    __slots__ = ("field", "op", "value", "fn", "index", "shared")
+
+    def __init__(self, field: str, op: str, value: Any):
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator '{op}' on field '{field}'")
+        if op == "in":
+            value = _freeze_collection(value)
+        self.field = field
+        self.op = op
+        self.value = value
+        self.fn = OPERATORS[op]
+        self.index = -1
+        self.shared = False
+
+    def __call__(self, transaction: Dict[str, Any]) -> bool:
+        value = transaction.get(self.field)
+        if value is None:
+            return False
+        return bool(self.fn(value, self.value))
+
+    def __repr__(self) -> str:
+        return f"Predicate({self.field} {self.op} {self.value!r})"
+
+
+class CompiledRule:
+    """
+    A rule whose conditions are all compiled predicates (logical AND).
+    """
+    __slots__ = ("rule_id", "name", "description", "severity", "predicates",
+                 "fields", "position", "stats")
+
+    def __init__(self, rule_id: str, name: str, description: str,
+                 severity: str, predicates: List[Predicate]):
+        self.rule_id = rule_id
+        self.name = name
+        self.description = description
+        self.severity = severity
+        self.predicates = tuple(predicates)
+        self.fields = frozenset(p.field for p in self.predicates)
+        self.position = -1
+        self.stats = RuleStats(rule_id, name)
+
+    def matches(self, transaction: Dict[str, Any], memo: Optional[dict] = None) -> bool:
+        """
+        AND the predicates; `memo` caches shared predicate results per transaction.
+        """
+        if memo is None:
+            for predicate in self.predicates:
+                if not predicate(transaction):
+                    return False
+            return True
+
+        for predicate in self.predicates:
+            if predicate.shared:
+                result = memo.get(predicate.index)
+                if result is None:
+                    result = memo[predicate.index] = predicate(transaction)
+            else:
+                result = predicate(transaction)
+            if not result:
+                return False
+        return True
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "id": self.rule_id,
+            "name": self.name,
+            "severity": self.severity,
+            "description": self.description,
+        }
+
+
+def _position(rule: CompiledRule) -> int:
+    return rule.position
+
+
+class CompiledRuleset:
+    """
+    Immutable snapshot of the rules file. Callers grab one snapshot and
+    evaluate against it, so a concurrent reload never mixes two versions.
+
+    `field_index` maps each field to the rules that reference it. For
+    dispatch every rule is filed under one anchor field only, so a
+    transaction visits just the rules anchored on fields it carries and
+    then confirms the rule's remaining fields are present too.
+    """
+    __slots__ = ("rules", "predicates", "field_index", "_anchor_index",
+                 "version", "source_path", "loaded_at")
+
+    def __init__(self, rules: List[CompiledRule], version: str, source_path: str,
+                 predicates: Optional[List[Predicate]] = None):
+        self.rules = tuple(rules)
+        self.predicates = tuple(predicates or ())
+        self.version = version
+        self.source_path = source_path
+        self.loaded_at = time.time()
+
+        field_index: Dict[str, List[CompiledRule]] = {}
+        for position, rule in enumerate(self.rules):
+            rule.position = position
+            for field in rule.fields:
+                field_index.setdefault(field, []).append(rule)
+        self.field_index = {field: tuple(rs) for field, rs in field_index.items()}
+
+        # Anchor each rule on its least shared field
+        anchor_index: Dict[str, List[tuple]] = {}
+        for rule in self.rules:
+            anchor = min(sorted(rule.fields), key=lambda f: len(field_index[f]))
+            others = tuple(f for f in sorted(rule.fields) if f != anchor)
+            anchor_index.setdefault(anchor, []).append((rule, others))
+        self._anchor_index = {field: tuple(entries) for field, entries in anchor_index.items()}
+
+    def candidate_rules(self, transaction: Dict[str, Any]) -> List[CompiledRule]:
+        """
+        Rules whose every referenced field is present (not None), grouped
+        by anchor field (not in file order).
+        """
+        anchor_index = self._anchor_index
+        get = transaction.get
+        if len(transaction) < len(anchor_index):
+            fields = [f for f, v in transaction.items() if v is not None and f in anchor_index]
+        else:
+            fields = [f for f in anchor_index if get(f) is not None]
+
+        candidates = []
+        for field in fields:
+            for rule, others in anchor_index[field]:
+                for other in others:
+                    if get(other) is None:
+                        break
+                else:
+                    candidates.append(rule)
+        return candidates
+
+    def refresh_blacklists(self) -> None:
+        """
+        Pick up appended / rewritten entries in external blacklist files.
+        Changed files are re-indexed on background threads; evaluations
+        keep using the current index until the new one is swapped in.
+        """
+        for predicate in self.predicates:
+            if isinstance(predicate.value, Blacklist):
+                try:
+                    predicate.value.refresh_in_background()
+                except OSError as e:
+                    print(f"[⚠️ WARN] Blacklist refresh failed for {predicate.value.path}: {e}")
+
+    def evaluate(self, transaction: Dict[str, Any]) -> List[CompiledRule]:
+        """
+        Evaluate the applicable rules against a transaction. Each distinct
+        predicate runs at most once, however many rules share it.
+
+        Args:
+            transaction (dict): Input transaction details
+
+        Returns:
+            list[CompiledRule]: Triggered rules, in file order
+        """
+        triggered = []
+        memo: Dict[int, bool] = {}
+        profiler = get_rule_profiler()
+        timed = profiler.should_time()
+        clock = time.perf_counter_ns
+        for rule in self.candidate_rules(transaction):
+            stats = rule.stats
+            if timed:
+                start = clock()
+            try:
+                hit = rule.matches(transaction, memo)
+            except Exception:
+                hit = False
+                stats.errors += 1
+                print(f"[Rule Eval Error] Skipping rule: {rule.name}\n{traceback.format_exc()}")
+            if timed:
+                stats.record_timing(clock() - start)
+            stats.evaluations += 1
+            if hit:
+                stats.hits += 1
+                triggered.append(rule)
+
+        if timed:
+            profiler.maybe_emit(clock())
+        if len(triggered) > 1:
+            triggered.sort(key=_position)
+        return triggered
+
+# =============================================================== #
+# ========================= COMPILATION ========================= #
+# =============================================================== #
+
+def _freeze_collection(value: Any):
+    """
+    Turn a YAML list into a frozenset for O(1) membership where possible.
+    """
+    if isinstance(value, (list, tuple, set, frozenset)):
+        try:
+            return frozenset(value)
+        except TypeError:
+            return tuple(value)
+    return value
+
+
+def _predicate_key(field: str, op: str, value: Any):
+    try:
+        hash(value)
+        return (field, op, type(value).__name__, value)
+    except TypeError:
+        return (field, op, type(value).__name__, repr(value))
+
+
+def _resolve_value(op: str, value: Any, base_dir: str) -> Any:
+    """
+    `in` may reference an external file: value: {blacklist: path/to/ids.txt}
+    """
+    if op == "in" and isinstance(value, dict) and "blacklist" in value:
+        return get_blacklist(value["blacklist"], base_dir=base_dir)
+    return value
+
+
+def compile_ruleset(data: Any, version: str, source_path: str) -> CompiledRuleset:
+    """
+    Compile parsed rules YAML into a CompiledRuleset. Conditions that are
+    identical across rules compile to a single shared Predicate.
+
+    Args:
+        data (list | dict): Parsed YAML (a list of rules, or {"rules": [...]})
+        version (str): Content hash of the source file
+        source_path (str): Path the rules were loaded from
+
+    Returns:
+        CompiledRuleset: Ready-to-evaluate ruleset
+
+    Raises:
+        ValueError: If the structure or an operator is invalid
+    """
+    if isinstance(data, dict):
+        data = data.get("rules", [])
+    if data is None:
+        data = []
+    if not isinstance(data, list):
+        raise ValueError("Rules file must contain a list of rule definitions.")
+
+    base_dir = os.path.dirname(os.path.abspath(source_path))
+    compiled = []
+    interned: Dict[tuple, Predicate] = {}
+    for index, rule in enumerate(data):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule #{index} is not a mapping")
+
+        conditions = rule.get("conditions") or []
+        if not conditions:
+            continue
+
+        predicates = []
+        for cond in conditions:
+            value = _resolve_value(cond["operator"], cond.get("value"), base_dir)
+            predicate = Predicate(cond["field"], cond["operator"], value)
+            key = _predicate_key(predicate.field, predicate.op, predicate.value)
+            shared = interned.get(key)
+            if shared is None:
+                predicate.index = len(interned)
+                shared = interned[key] = predicate
+            else:
+                shared.shared = True
+            predicates.append(shared)
+        compiled_rule = CompiledRule(
+            rule_id=rule.get("id", f"rule_{index:03d}"),
+            name=rule.get("name", "Unnamed Rule"),
+            description=rule.get("description", ""),
+            severity=rule.get("severity", "medium"),
+            predicates=predicates,
+        )
+        # Counters are keyed by rule id so they survive hot-reloads
+        compiled_rule.stats = get_rule_profiler().stats_for(
+            compiled_rule.rule_id, compiled_rule.name)
+        compiled.append(compiled_rule)
+
+    return CompiledRuleset(compiled, version=version, source_path=source_path,
+                           predicates=list(interned.values()))
+
+# =============================================================== #
+# ================= HOT-RELOADING RULE ENGINE =================== #
+# =============================================================== #
+
+class RuleEngine:
+    """
+    Holds the current CompiledRuleset and swaps it when the file changes.
+
+    The file is stat'ed at most once per `check_interval` seconds; it is
+    only re-read when (mtime, size) moved, and only recompiled when the
+    SHA-256 of its content differs from the loaded version.
+    """
+
+    def __init__(self, rules_path: str = RULES_FILE,
+                 check_interval: float = DEFAULT_CHECK_INTERVAL):
+        self.rules_path = rules_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._ruleset: Optional[CompiledRuleset] = None
+        self._stat_key = None
+        self._next_check = 0.0
+
+    def ruleset(self) -> CompiledRuleset:
+        """
+        Return the current ruleset, reloading first if the file changed.
+
+        Raises:
+            Exception: If no ruleset has ever been loaded successfully
+        """
+        if self._ruleset is None or time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return self._ruleset
+
+    def force_reload(self) -> CompiledRuleset:
+        """
+        Re-read and recompile the rules file regardless of mtime.
+        """
+        with self._lock:
+            self._stat_key = None
+            self._next_check = 0.0
+        self._maybe_reload(force=True)
+        return self._ruleset
+
+    def _maybe_reload(self, force: bool = False) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._ruleset is not None and not force and now < self._next_check:
+                return  # Another thread just checked
+            self._next_check = now + self.check_interval
+
+            if self._ruleset is not None:
+                self._ruleset.refresh_blacklists()
+
+            try:
+                st = os.stat(self.rules_path)
+                stat_key = (st.st_mtime_ns, st.st_size)
+                if self._ruleset is not None and stat_key == self._stat_key:
+                    return
+
+                with open(self.rules_path, "rb") as file:
+                    raw = file.read()
+                self._stat_key = stat_key
+
+                digest = hashlib.sha256(raw).hexdigest()
+                if self._ruleset is not None and digest == self._ruleset.version:
+                    return
+
+                ruleset = compile_ruleset(yaml.safe_load(raw), digest, self.rules_path)
+            except Exception as e:
+                if self._ruleset is None:
+                    raise
+                print(f"[⚠️ WARN] Rules reload failed, keeping version "
+                      f"{self._ruleset.version[:12]}: {e}")
+                return
+
+            # Single reference assignment: readers see old or new, never a mix
+            self._ruleset = ruleset
+
+
+_engines: Dict[str, RuleEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_rule_engine(rules_path: str = RULES_FILE) -> RuleEngine:
+    """
+    Return the process-wide RuleEngine for the given rules file.
+    """
+    engine = _engines.get(rules_path)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.setdefault(rules_path, RuleEngine(rules_path))
+    return engine
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
@@ -46,6 +46,13 @@ def load_fraud_rules() -> list[dict]:
 #       operator: ne
 #       value: "IN"
 #   severity: high
+#
+# `in` also accepts an external newline-delimited blacklist file
+# (path relative to this directory), loaded via blacklist.py:
+#     - field: recipient_id
+#       operator: in
+#       value:
+#         blacklist: blacklists/recipients.txt
 # =============================================================== #
 
 # ======================== END OF FILE ========================== #
\ No newline at end of file
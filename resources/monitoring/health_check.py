@@ -7,7 +7,6 @@
 # =============================================================== #
 
 import os
-import sqlite3
 
 # =============================================================== #
 # ========== CHECK DATABASE CONNECTIVITY ======================== #
@@ -17,10 +16,8 @@ def check_database():
     Verifies SQLite fraud case database is reachable and writable.
     """
     try:
-        from ..db.fraud_cases_db import DB_PATH
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute("SELECT 1")
-        conn.close()
+        from ..db.fraud_cases_db import get_case_db
+        get_case_db().fetchone("SELECT 1")
         return True, "Database connection: ✅"
     except Exception as e:
         return False, f"Database error: ❌ {e}"
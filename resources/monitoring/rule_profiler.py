@@ -0,0 +1,211 @@
+# =============================================================== #
+# ============ resources/monitoring/rule_profiler.py ============ #
+# --------------------------------------------------------------- #
+# 📌 Purpose   : Per-rule evaluation/hit/error counts and latency
+# 🧮 Latency   : Cumulative time + log-bucketed histogram for p99
+# 📤 Exposes   : snapshot() and a periodic structured log line
+# ✅ Used by   : resources/fraud_rules/rule_engine.py, batch_evaluator.py
+# =============================================================== #
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from resources.logs.structured_logging import log_event
+
+# Emit a "rule_stats" log line at most this often (seconds)
+DEFAULT_EMIT_INTERVAL = 60.0
+# Time one scalar evaluation in N; counts are always exact
+DEFAULT_TIMING_SAMPLE_EVERY = 16
+
+# 4 sub-buckets per power of two → ~±12% latency resolution
+_SUB_BUCKET_BITS = 2
+HISTOGRAM_SIZE = 256
+
+# =============================================================== #
+# ========================== HISTOGRAM ========================== #
+# =============================================================== #
+
+def histogram_bucket(ns: int) -> int:
+    """
+    Index of the log-bucketed latency histogram slot for `ns` nanoseconds.
+    """
+    if ns < (1 << (_SUB_BUCKET_BITS + 1)):
+        return max(ns, 0)
+    shift = ns.bit_length() - _SUB_BUCKET_BITS - 1
+    index = (shift << _SUB_BUCKET_BITS) + (ns >> shift)
+    return min(index, HISTOGRAM_SIZE - 1)
+
+
+def bucket_upper_ns(index: int) -> int:
+    """
+    Largest latency (ns) that falls into histogram slot `index`.
+    """
+    if index < (1 << (_SUB_BUCKET_BITS + 1)):
+        return index
+    shift = (index >> _SUB_BUCKET_BITS) - 1
+    mantissa = index - (shift << _SUB_BUCKET_BITS)
+    return ((mantissa + 1) << shift) - 1
+
+
+def histogram_percentile_ns(histogram: List[int], total: int, q: float) -> int:
+    """
+    Upper bound (ns) of the slot holding the q-quantile of `total` samples.
+    """
+    target = q * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if count and seen >= target:
+            return bucket_upper_ns(index)
+    return 0
+
+# =============================================================== #
+# ========================== RULE STATS ========================= #
+# =============================================================== #
+
+class RuleStats:
+    """
+    Counters for one rule id. Updates are plain attribute increments
+    (no lock): under concurrency a rare lost increment is accepted in
+    exchange for keeping the hot path cheap. Latency comes from the
+    `timed` subset of evaluations and is scaled up for cumulative time.
+    """
+    __slots__ = ("rule_id", "name", "evaluations", "hits", "errors",
+                 "timed", "total_ns", "histogram")
+
+    def __init__(self, rule_id: str, name: str):
+        self.rule_id = rule_id
+        self.name = name
+        self.evaluations = 0
+        self.hits = 0
+        self.errors = 0
+        self.timed = 0
+        self.total_ns = 0
+        self.histogram = [0] * HISTOGRAM_SIZE
+
+    def record_timing(self, elapsed_ns: int) -> None:
+        self.timed += 1
+        self.total_ns += elapsed_ns
+        self.histogram[histogram_bucket(elapsed_ns)] += 1
+
+    def record_batch(self, rows: int, hits: int, elapsed_ns: int) -> None:
+        if rows <= 0:
+            return
+        self.evaluations += rows
+        self.hits += hits
+        self.timed += rows
+        self.total_ns += elapsed_ns
+        self.histogram[histogram_bucket(elapsed_ns // rows)] += rows
+
+    def percentile_ns(self, q: float) -> int:
+        if not self.timed:
+            return 0
+        return histogram_percentile_ns(self.histogram, self.timed, q)
+
+    def to_dict(self) -> Dict[str, Any]:
+        evaluations, timed = self.evaluations, self.timed
+        mean_ns = self.total_ns / timed if timed else 0.0
+        return {
+            "rule_id": self.rule_id,
+            "name": self.name,
+            "evaluations": evaluations,
+            "hits": self.hits,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / evaluations, 6) if evaluations else 0.0,
+            "total_ms": round(mean_ns * evaluations / 1e6, 3),
+            "mean_us": round(mean_ns / 1e3, 3),
+            "p99_us": round(self.percentile_ns(0.99) / 1e3, 3),
+        }
+
+# =============================================================== #
+# ========================= RULE PROFILER ======================= #
+# =============================================================== #
+
+class RuleProfiler:
+    """
+    Registry of RuleStats keyed by rule id. Stats survive rule hot-reloads
+    because compiled rules look their counters up by id.
+    """
+
+    def __init__(self, emit_interval: float = DEFAULT_EMIT_INTERVAL,
+                 sample_every: int = DEFAULT_TIMING_SAMPLE_EVERY):
+        self.emit_interval = emit_interval
+        self.sample_every = max(1, sample_every)
+        self._calls = 0
+        self._stats: Dict[str, RuleStats] = {}
+        self._lock = threading.Lock()
+        self._next_emit_ns = time.perf_counter_ns() + int(emit_interval * 1e9)
+
+    def stats_for(self, rule_id: str, name: str) -> RuleStats:
+        stats = self._stats.get(rule_id)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(rule_id, RuleStats(rule_id, name))
+        stats.name = name
+        return stats
+
+    def should_time(self) -> bool:
+        """
+        True for one call in `sample_every`: that evaluation gets timed.
+        """
+        self._calls += 1
+        return self._calls % self.sample_every == 0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            dict: {rule_id: {evaluations, hits, errors, hit_rate,
+                             total_ms (estimated), mean_us, p99_us, name}}
+        """
+        return {rule_id: stats.to_dict() for rule_id, stats in list(self._stats.items())}
+
+    def reset(self) -> None:
+        """
+        Zero all counters in place (compiled rules keep their references).
+        """
+        with self._lock:
+            for stats in self._stats.values():
+                stats.__init__(stats.rule_id, stats.name)
+
+    def maybe_emit(self, now_ns: int) -> None:
+        """
+        Write a "rule_stats" structured log line if the interval elapsed.
+        """
+        if now_ns < self._next_emit_ns:
+            return
+        with self._lock:
+            if now_ns < self._next_emit_ns:
+                return
+            self._next_emit_ns = now_ns + int(self.emit_interval * 1e9)
+        try:
+            log_event("INFO", "rule_stats", {"rules": self.snapshot()})
+        except Exception as e:
+            print(f"[⚠️ WARN] Failed to emit rule stats: {e}")
+
+
+_default_profiler: Optional[RuleProfiler] = None
+_default_profiler_lock = threading.Lock()
+
+
+def get_rule_profiler() -> RuleProfiler:
+    """
+    Return the process-wide RuleProfiler.
+    """
+    global _default_profiler
+    if _default_profiler is None:
+        with _default_profiler_lock:
+            if _default_profiler is None:
+                _default_profiler = RuleProfiler()
+    return _default_profiler
+
+
+def rule_stats_snapshot() -> Dict[str, Dict[str, Any]]:
+    """
+    Current per-rule statistics for dashboards and the /rules/stats route.
+    """
+    return get_rule_profiler().snapshot()
+
+# =============================================================== #
+# ======================== END OF FILE ========================== #
+# =============================================================== #
@@ -19,6 +19,8 @@ import os
 QDRANT_HOST = "localhost"
 QDRANT_PORT = 6333
 COLLECTION_NAME = "fraud_patterns"
+PATTERN_MATCH_THRESHOLD = 0.8   # Minimum similarity to report a known pattern
+AMOUNT_BANDS = [(100, "under 100"), (1_000, "under 1k"), (10_000, "under 10k")]
 
 qdrant_client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
 vector_store = QdrantVectorStore(client=qdrant_client, collection_name=COLLECTION_NAME)
@@ -64,6 +66,88 @@ def search_similar_patterns(query: str, top_k: int = 3):
     results = query_engine.query(query)
     return results.response
 
+# =============================================================== #
+# ================= KNOWN FRAUD PATTERN MATCHING ================ #
+# =============================================================== #
+
+_pattern_retriever = None
+
+
+def _get_retriever():
+    global _pattern_retriever
+    if _pattern_retriever is None:
+        index = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
+        _pattern_retriever = index.as_retriever(similarity_top_k=1)
+    return _pattern_retriever
+
+
+def _amount_band(amount) -> str:
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return "unknown amount"
+    for limit, label in AMOUNT_BANDS:
+        if amount < limit:
+            return label
+    return "over 10k"
+
+
+def pattern_query(transaction: dict) -> str:
+    """
+    Describe a transaction as a pattern query. Amounts are banded so that
+    similar transactions produce the same query (and share one lookup).
+    """
+    return (
+        f"{transaction.get('method', 'unknown')} transaction "
+        f"{_amount_band(transaction.get('amount'))} "
+        f"from {transaction.get('location', 'unknown location')}"
+    ).lower()
+
+
+def _lookup(query: str):
+    nodes = _get_retriever().retrieve(query)
+    if nodes and (nodes[0].score or 0.0) >= PATTERN_MATCH_THRESHOLD:
+        return nodes[0].node.get_content()
+    return None
+
+
+def match_known_fraud_patterns(transaction: dict):
+    """
+    Match a transaction against indexed fraud patterns.
+
+    Args:
+        transaction (dict): Transaction data
+
+    Returns:
+        str | None: Matching pattern text, or None if nothing is similar enough
+    """
+    try:
+        return _lookup(pattern_query(transaction))
+    except Exception as e:
+        print(f"[⚠️ WARN] Fraud pattern lookup failed: {e}")
+        return None
+
+
+def match_known_fraud_patterns_batch(transactions: list) -> list:
+    """
+    Grouped pattern matching: one vector lookup per distinct pattern query.
+
+    Args:
+        transactions (list[dict]): Transactions to match
+
+    Returns:
+        list[str | None]: Match per transaction, in input order
+    """
+    queries = [pattern_query(tx) for tx in transactions]
+    matches = {}
+    for query in dict.fromkeys(queries):
+        try:
+            matches[query] = _lookup(query)
+        except Exception as e:
+            print(f"[⚠️ WARN] Fraud pattern lookup failed: {e}")
+            matches[query] = None
+    return [matches[query] for query in queries]
+
 # =============================================================== #
 # ======================== END OF FILE ========================== #
 # =============================================================== #
\ No newline at end of file
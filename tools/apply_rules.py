@@ -6,10 +6,10 @@
 # ✅ Used by  : tools.detect_fraud
 # =============================================================== #
 
-import yaml
 import os
-import traceback
-from tools.rule_trigger import enrich_triggered_rules  # 🚨 New module
+from config.constants import RULE_SEVERITY_WEIGHTS
+from resources.fraud_rules.rule_engine import get_rule_engine
+from resources.fraud_rules.batch_evaluator import evaluate_batch
 
 RULES_FILE_PATH = os.path.join(
     os.path.dirname(__file__),
@@ -22,7 +22,8 @@ RULES_FILE_PATH = os.path.join(
 
 def rule_check(transaction: dict) -> dict:
     """
-    Applies YAML-defined fraud rules to a given transaction using dynamic conditions.
+    Applies YAML-defined fraud rules to a given transaction using the
+    compiled rule engine (rules are parsed once and hot-reloaded on change).
 
     Args:
         transaction (dict): Input transaction details (e.g., amount, location)
@@ -32,12 +33,11 @@ def rule_check(transaction: dict) -> dict:
             "flagged": bool,
             "reason": str,
             "flags": list of violated rule names,
-            "enriched": list of rule metadata (from rule_trigger)
+            "enriched": list of rule metadata (id, name, severity, description)
         }
     """
     try:
-        with open(RULES_FILE_PATH, 'r') as file:
-            rules = yaml.safe_load(file)
+        ruleset = get_rule_engine(RULES_FILE_PATH).ruleset()
     except Exception as e:
         return {
             "flagged": False,
@@ -46,23 +46,81 @@ def rule_check(transaction: dict) -> dict:
             "enriched": []
         }
 
-    triggered_flags = []
-    for rule in rules.get("rules", []):
-        rule_name = rule.get("name", "Unnamed Rule")
-        condition = rule.get("condition")
+    return _format_result(ruleset.evaluate(transaction))
 
-        if not condition:
-            continue
+# =============================================================== #
+# ====================== RULE SCORE FUNCTION ==================== #
+# =============================================================== #
+
+def evaluate_rules(transaction: dict) -> float:
+    """
+    Rule-based score for compute_risk_score(): the severity weight of the
+    most severe triggered rule (0.0 when nothing fires).
+
+    Args:
+        transaction (dict): Input transaction details
+
+    Returns:
+        float: Score in [0, 1]
+    """
+    result = rule_check(transaction)
+    return max(
+        (RULE_SEVERITY_WEIGHTS.get(str(meta.get("severity", "medium")).lower(), 0.5)
+         for meta in result["enriched"]),
+        default=0.0,
+    )
+
+# =============================================================== #
+# ================== BATCH RULE CHECK FUNCTION ================== #
+# =============================================================== #
+
+def rule_check_batch(transactions: list) -> list:
+    """
+    Applies the fraud rules to many transactions at once. Referenced fields
+    are turned into NumPy columns and each rule is evaluated as one mask.
+
+    Args:
+        transactions (list[dict]): Input transactions
+
+    Returns:
+        list[dict]: One rule_check()-shaped result per transaction, in order
+    """
+    try:
+        ruleset = get_rule_engine(RULES_FILE_PATH).ruleset()
+    except Exception as e:
+        error = {
+            "flagged": False,
+            "reason": f"Error loading rules.yaml: {str(e)}",
+            "flags": [],
+            "enriched": []
+        }
+        return [dict(error) for _ in transactions]
+
+    # Many transactions trigger the same rule combination: format each once
+    templates = {}
+    results = []
+    for triggered in evaluate_batch(ruleset, transactions):
+        key = tuple(map(id, triggered))
+        template = templates.get(key)
+        if template is None:
+            template = templates[key] = _format_result(triggered)
+        results.append({
+            "flagged": template["flagged"],
+            "reason": template["reason"],
+            "flags": list(template["flags"]),
+            "enriched": [dict(meta) for meta in template["enriched"]]
+        })
+    return results
+
+# =============================================================== #
+# ======================= RESULT FORMATTER ====================== #
+# =============================================================== #
 
-        try:
-            # 🔐 Controlled eval scope: Only 'tx' is available
-            if eval(condition, {}, {"tx": transaction}):
-                triggered_flags.append(rule_name)
-        except Exception:
-            print(f"[Rule Eval Error] Skipping rule: {rule_name}\n{traceback.format_exc()}")
+def _format_result(triggered_rules: list) -> dict:
+    triggered_flags = [rule.name for rule in triggered_rules]
 
-    # 🎯 Post-process using rule_trigger for enrichment
-    enriched_metadata = enrich_triggered_rules(triggered_flags)
+    # 🎯 Metadata comes straight from the compiled rules
+    enriched_metadata = [rule.metadata() for rule in triggered_rules]
 
     return {
         "flagged": bool(triggered_flags),
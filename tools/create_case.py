@@ -8,6 +8,7 @@
 
 import uuid
 import datetime
+from typing import Optional
 from resources.db.fraud_cases_db import insert_case_record
 
 # =============================================================== #
@@ -29,7 +30,8 @@ def create_case(account_id: str,
         initial_flags (list): Detected fraud rules or ML triggers
 
     Returns:
-        dict: Confirmation with case_id and status
+        dict: case_id and status ("created" once committed, "failed"
+        with an error message otherwise)
     """
     case_id = f"CASE-{uuid.uuid4().hex[:8].upper()}"
     created_at = datetime.datetime.utcnow().isoformat()
@@ -45,11 +47,43 @@ def create_case(account_id: str,
         "created_at": created_at
     }
 
-    insert_case_record(case_data)
+    try:
+        # Waits for the group commit (shared with concurrent callers)
+        insert_case_record(case_data).result()
+    except Exception as e:
+        print(f"[❌ ERROR] Failed to create case {case_id}: {e}")
+        return {"case_id": case_id, "status": "failed", "error": str(e)}
 
     print(f"[📂 New Fraud Case Opened] ID: {case_id}")
     return {"case_id": case_id, "status": "created"}
 
+
+
+def open_case_for_detection(detection: dict, source: str = "detect_fraud") -> Optional[dict]:
+    """
+    Open a case for an escalated detect_fraud() result, once per detection:
+    a result replayed from the detection cache (cache_hit=True, i.e. an
+    upstream retry) already had its case opened by the original call.
+
+    Args:
+        detection (dict): detect_fraud() / detect_fraud_batch() result
+        source (str): Source system recorded on the case
+
+    Returns:
+        dict | None: create_case() confirmation, or None if no case was opened
+    """
+    if detection.get("cache_hit") or not detection.get("escalate") or "error" in detection:
+        return None
+    case = detection.get("structured_case", {})
+    risk_score = detection.get("risk_score", 0.0)
+    return create_case(
+        account_id=case.get("account_id"),
+        description=str(detection.get("reason", "Suspicious activity detected")),
+        severity="high" if risk_score > 75 else "medium",
+        source=source,
+        initial_flags=case.get("flags", []),
+    )
+
 # =============================================================== #
 # ======================== END OF FILE ========================== #
 # =============================================================== #
\ No newline at end of file
@@ -6,11 +6,79 @@
 # ✅ Used by  : flows.detect_and_escalate_flow, server, planner_agent
 # =============================================================== #
 
-from resources.vector_store.fraud_patterns import match_known_fraud_patterns
-from tools.risk_scorer import calculate_risk_score
-from tools.apply_rules import rule_check
-from ml_models.behavior_baseline_model import score_behavior_anomaly
-from ml_models.feature_engineering import extract_features
+import asyncio
+import copy
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from resources.vector_store.fraud_patterns import (
+    match_known_fraud_patterns,
+    match_known_fraud_patterns_batch,
+)
+from tools.risk_scorer import calculate_risk_score, calculate_risk_scores
+from tools.apply_rules import rule_check, rule_check_batch
+from ml_models.behavior_baseline_model import (
+    score_behavior_anomaly,
+    score_behavior_anomaly_batch,
+)
+from ml_models.feature_engineering import extract_features, extract_features_batch
+from ml_models.velocity_engine import get_velocity_engine
+from ml_models.online_feature_store import get_feature_store
+from ml_models.baseline_store import BASELINE_DTYPE, baseline_record, get_baseline_store
+from ml_models.entity_graph import CLUSTER_SIZE_FIELD, get_entity_graph
+from resources.cache.detection_cache import cache_key, get_detection_cache
+
+# Default end-to-end latency budget for detect_fraud_async (milliseconds)
+DEFAULT_LATENCY_BUDGET_MS = 150
+STAGE_WORKERS = 16
+PATTERN_WORKERS = 8
+PATTERN_MAX_INFLIGHT = 16   # Lookups running or queued before new ones are shed
+
+# One pool per stage: a slow vector store can only exhaust the pattern
+# pool, never delay the rule check or ML scoring of other requests
+_rule_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="detect-rules")
+_ml_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="detect-ml")
+_pattern_executor = ThreadPoolExecutor(max_workers=PATTERN_WORKERS, thread_name_prefix="detect-patterns")
+_pattern_slots = threading.BoundedSemaphore(PATTERN_MAX_INFLIGHT)
+
+# Tiered cascade: rules → ML → vector lookup (only when still uncertain)
+DEFAULT_CASCADE_CONFIG = {
+    "low_risk_below": 30.0,            # No rule + risk below → exit after ML, not escalated
+    "high_risk_above": 75.0,           # No rule + risk above → exit after ML, escalated
+    "exit_on_severities": ["critical"],  # A rule of this severity exits at tier 1
+}
+
+# =============================================================== #
+# ====================== INPUT VALIDATION ======================= #
+# =============================================================== #
+_TEXT_FIELDS = ("location", "merchant", "type")
+
+
+def validate_transaction(transaction) -> Optional[str]:
+    """
+    Why a transaction cannot be scored, or None if it can. Runs before any
+    velocity / entity-graph state is recorded, so a malformed row is
+    rejected on its own instead of failing (and half-recording) a batch.
+    """
+    if not transaction or not isinstance(transaction, dict):
+        return "Invalid transaction input"
+    amount = transaction.get("amount", 0.0)
+    try:
+        valid_amount = math.isfinite(float(amount))
+    except (TypeError, ValueError):
+        valid_amount = False
+    if not valid_amount:
+        return f"Invalid transaction input: amount {amount!r} is not a finite number"
+    for field in _TEXT_FIELDS:
+        if field in transaction and not isinstance(transaction[field], str):
+            return f"Invalid transaction input: {field} must be a string"
+    return None
 
 # =============================================================== #
 # ============== HYBRID FRAUD DETECTION LOGIC =================== #
@@ -31,11 +99,38 @@ def detect_fraud(transaction: dict) -> dict:
               - risk_score
               - escalate (bool)
               - structured_case (dict)
+              - cache_hit (bool, only present when a retry was answered
+                from the detection cache)
     """
 
-    if not transaction or not isinstance(transaction, dict):
-        return {"error": "Invalid transaction input"}
+    invalid = validate_transaction(transaction)
+    if invalid:
+        return {"error": invalid}
+
+    # ---------------------- #
+    # ♻️ Idempotent retries
+    # ---------------------- #
+    result, cached = get_detection_cache().get_or_compute(
+        cache_key(transaction), lambda: _detect_fraud_pipeline(transaction))
+    if cached:
+        result["cache_hit"] = True
+    return result
+
+
+def _detect_fraud_pipeline(transaction: dict) -> dict:
+    # ---------------------- #
+    # ⏱️ Velocity Counters & 🔗 Linked-Account Cluster Size
+    # ---------------------- #
+    transaction = get_entity_graph().enrich(get_velocity_engine().enrich(transaction))
+    return _score_enriched(transaction)
+
 
+def _score_enriched(transaction: dict, record_history: bool = True) -> dict:
+    """
+    Every detect_fraud() stage after enrichment, so a transaction whose
+    velocity / graph state is already recorded can be scored again
+    without counting it twice.
+    """
     # ---------------------- #
     # 🧠 Extract Features
     # ---------------------- #
@@ -49,7 +144,7 @@ def detect_fraud(transaction: dict) -> dict:
     # ---------------------- #
     # 🤖 ML Model Score
     # ---------------------- #
-    ml_score = score_behavior_anomaly(features)
+    ml_score = score_behavior_anomaly(features, _account_baseline(transaction))
 
     # ---------------------- #
     # 🧠 Risk Scoring
@@ -61,6 +156,398 @@ def detect_fraud(transaction: dict) -> dict:
     # ---------------------- #
     matched_pattern = match_known_fraud_patterns(transaction)
 
+    # ---------------------- #
+    # 📚 Account history (after scoring, so a tx is judged on prior behavior)
+    # ---------------------- #
+    if record_history:
+        get_feature_store().update_transaction(transaction)
+
+    return _build_result(transaction, rule_result, ml_score, risk_score, matched_pattern)
+
+def _live_baseline(account_id):
+    baseline = get_feature_store().baseline(account_id)
+    return None if baseline is None else baseline_record(baseline, learn=False)
+
+
+def _account_baseline(transaction: dict):
+    """
+    The account's baseline record: the published (memory-mapped) one, else
+    one built from the live online feature store aggregates, or None for
+    an account without history.
+    """
+    account_id = transaction.get("account_id")
+    if account_id is None:
+        return None
+    store = get_baseline_store()
+    record = store.record(account_id) if store is not None else None
+    return _live_baseline(account_id) if record is None else record
+
+
+def _account_baselines_recording(transactions: list, recorded: list):
+    """
+    Batch _account_baseline(): (BASELINE_DTYPE rows, found mask), or
+    (None, None) when no account has a baseline. Each transaction is
+    folded into the online feature store right after its own lookup (and
+    flagged in `recorded`), so a later row of the same account is judged
+    on the earlier ones exactly as sequential detect_fraud() calls would.
+    """
+    n = len(transactions)
+    account_ids = [transaction.get("account_id") for transaction in transactions]
+    store = get_baseline_store()
+    if store is not None:
+        baselines, found = store.records(account_ids)
+        found &= np.fromiter((account_id is not None for account_id in account_ids), bool, n)
+    else:
+        baselines, found = np.zeros(n, dtype=BASELINE_DTYPE), np.zeros(n, dtype=bool)
+
+    feature_store = get_feature_store()
+    for i, transaction in enumerate(transactions):
+        if account_ids[i] is not None and not found[i]:
+            record = _live_baseline(account_ids[i])
+            if record is not None:
+                baselines[i] = record
+                found[i] = True
+        feature_store.update_transaction(transaction)
+        recorded[i] = True
+    return (baselines, found) if found.any() else (None, None)
+
+
+def _prepare_async(transaction: dict):
+    """
+    Blocking pre-scoring work of the async path (state updates, feature
+    extraction, baseline lookup), run on the ML pool off the event loop.
+    """
+    transaction = get_entity_graph().enrich(get_velocity_engine().enrich(transaction))
+    return transaction, extract_features(transaction), _account_baseline(transaction)
+
+def _path_cache_key(path: str, transaction: dict, config: dict = None):
+    """
+    Detection-cache key for the async / cascade paths: their results have
+    their own shape (stages, tier_exit), so they are cached apart from
+    detect_fraud() results; cascade keys also cover the config.
+    """
+    key = cache_key(transaction)
+    if key is None:
+        return None
+    if config is not None:
+        return (path, *key, json.dumps(config, sort_keys=True, default=str))
+    return (path, *key)
+
+# =============================================================== #
+# ============ CONCURRENT, DEADLINE-BOUNDED DETECTION =========== #
+# =============================================================== #
+def _timed_stage(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return value, (time.perf_counter() - start) * 1000.0
+
+
+async def detect_fraud_async(transaction: dict,
+                             budget_ms: float = DEFAULT_LATENCY_BUDGET_MS) -> dict:
+    """
+    Async detect_fraud(): rule check, ML score and vector pattern match run
+    concurrently (each on its own bounded pool) under one latency budget.
+    A stage that misses the budget or raises is marked degraded and a
+    neutral default is used instead (ml_score 0.0, no pattern), so the
+    request still completes. A degraded rule check fails closed: the
+    result is escalated rather than reported as clean. Pattern lookups
+    beyond PATTERN_MAX_INFLIGHT are shed (cause "saturated") instead of
+    queueing behind a slow vector store.
+
+    Args:
+        transaction (dict): Incoming transaction data
+        budget_ms (float): Latency budget for the concurrent stages
+
+    Returns:
+        dict: detect_fraud() result plus:
+              - stages: {name: {"status": "ok" | "degraded", "elapsed_ms": float,
+                                "cause": "timeout" | "error" | "saturated"
+                                (degraded only)}}
+              - degraded (bool)
+              - latency_ms (float)
+              - cache_hit (bool, only present for retries answered from
+                the detection cache)
+    """
+    invalid = validate_transaction(transaction)
+    if invalid:
+        return {"error": invalid}
+
+    result, cached = await get_detection_cache().get_or_compute_async(
+        _path_cache_key("async", transaction),
+        lambda: _detect_fraud_async_pipeline(transaction, budget_ms))
+    if cached:
+        result["cache_hit"] = True
+    return result
+
+
+async def _detect_fraud_async_pipeline(transaction: dict, budget_ms: float) -> dict:
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    transaction, features, baseline = await loop.run_in_executor(
+        _ml_executor, _prepare_async, transaction)
+
+    stages = {
+        "rules": loop.run_in_executor(_rule_executor, _timed_stage, rule_check, transaction),
+        "ml": loop.run_in_executor(_ml_executor, _timed_stage, score_behavior_anomaly,
+                                   features, baseline),
+    }
+    report = {}
+    if _pattern_slots.acquire(blocking=False):
+        lookup = _pattern_executor.submit(_timed_stage, match_known_fraud_patterns, transaction)
+        # Fires on completion and on cancellation of a still-queued lookup,
+        # so a budget timeout can never leak the slot
+        lookup.add_done_callback(lambda _: _pattern_slots.release())
+        stages["patterns"] = asyncio.wrap_future(lookup, loop=loop)
+    else:
+        report["patterns"] = {"status": "degraded", "cause": "saturated", "elapsed_ms": None}
+    remaining = max(0.0, budget_ms / 1000.0 - (time.perf_counter() - started))
+    await asyncio.wait(stages.values(), timeout=remaining)
+
+    values = {
+        "rules": {"flagged": False, "reason": "Rule check degraded", "flags": [], "enriched": []},
+        "ml": 0.0,
+        "patterns": None,
+    }
+    for name, future in stages.items():
+        if not future.done():
+            future.cancel()  # Result is dropped; the worker thread finishes on its own
+            report[name] = {"status": "degraded", "cause": "timeout",
+                            "elapsed_ms": round(budget_ms, 3)}
+        elif future.exception() is not None:
+            print(f"[⚠️ WARN] detect_fraud stage '{name}' failed: {future.exception()}")
+            report[name] = {"status": "degraded", "cause": "error", "elapsed_ms": None}
+        else:
+            values[name], elapsed_ms = future.result()
+            report[name] = {"status": "ok", "elapsed_ms": round(elapsed_ms, 3)}
+
+    risk_score = calculate_risk_score(values["rules"], values["ml"])
+    await loop.run_in_executor(_ml_executor, get_feature_store().update_transaction, transaction)
+    result = _build_result(transaction, values["rules"], values["ml"], risk_score, values["patterns"])
+    if report["rules"]["status"] != "ok":
+        result["escalate"] = True  # Unchecked rules must not read as "not flagged"
+    result["stages"] = {name: report[name] for name in ("rules", "ml", "patterns")}
+    result["degraded"] = any(stage["status"] != "ok" for stage in report.values())
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+    return result
+
+# =============================================================== #
+# ================ COST-AWARE TIERED DETECTION ================== #
+# =============================================================== #
+class CascadeStats:
+    """
+    Counts how many transactions exit the cascade at each tier.
+    """
+    TIERS = ("rules", "ml", "patterns")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._exits = dict.fromkeys(self.TIERS, 0)
+
+    def record(self, tier: str) -> None:
+        with self._lock:
+            self._exits[tier] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            exits = dict(self._exits)
+        total = sum(exits.values())
+        return {
+            "total": total,
+            "exits": exits,
+            "exit_rates": {tier: round(count / total, 4) if total else 0.0
+                           for tier, count in exits.items()},
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._exits = dict.fromkeys(self.TIERS, 0)
+
+
+cascade_stats = CascadeStats()
+
+
+def detect_fraud_cascade(transaction: dict, config: dict = None) -> dict:
+    """
+    Tiered detect_fraud(): cheap rules first, then ML, and the expensive
+    vector pattern match only when no early exit applies.
+
+      1. rules    → exit if a rule with an exit severity fired (escalate)
+      2. ml       → exit if no rule fired and the risk score is clearly low
+                    (< low_risk_below) or clearly high (> high_risk_above)
+      3. patterns → vector lookup for the uncertain band or when a rule fired
+
+    Skipped stages contribute neutral values (ml_score 0.0, no pattern).
+    Escalation matches detect_fraud() except where a clearly low-risk
+    transaction would only have been escalated by a pattern match.
+
+    Args:
+        transaction (dict): Incoming transaction data
+        config (dict, optional): Overrides for DEFAULT_CASCADE_CONFIG
+
+    Returns:
+        dict: detect_fraud() result plus "tier_exit" (str) and, for retries
+              answered from the detection cache, "cache_hit"
+    """
+    invalid = validate_transaction(transaction)
+    if invalid:
+        return {"error": invalid}
+
+    cfg = {**DEFAULT_CASCADE_CONFIG, **(config or {})}
+    result, cached = get_detection_cache().get_or_compute(
+        _path_cache_key("cascade", transaction, cfg),
+        lambda: _detect_fraud_cascade_pipeline(transaction, cfg))
+    if cached:
+        result["cache_hit"] = True
+    return result
+
+
+def _detect_fraud_cascade_pipeline(transaction: dict, cfg: dict) -> dict:
+    transaction = get_entity_graph().enrich(get_velocity_engine().enrich(transaction))
+
+    # ---------------------- #
+    # 1️⃣ Rules
+    # ---------------------- #
+    rule_result = rule_check(transaction)
+    flagged = rule_result.get("flagged", False)
+    exit_severities = {str(sev).lower() for sev in cfg["exit_on_severities"]}
+    if flagged and any(str(meta.get("severity", "")).lower() in exit_severities
+                       for meta in rule_result.get("enriched", [])):
+        return _cascade_exit("rules", transaction, rule_result, 0.0, None)
+
+    # ---------------------- #
+    # 2️⃣ ML
+    # ---------------------- #
+    ml_score = score_behavior_anomaly(extract_features(transaction), _account_baseline(transaction))
+    risk_score = calculate_risk_score(rule_result, ml_score)
+    if not flagged and (risk_score < cfg["low_risk_below"] or risk_score > cfg["high_risk_above"]):
+        return _cascade_exit("ml", transaction, rule_result, ml_score, None, risk_score)
+
+    # ---------------------- #
+    # 3️⃣ Vector pattern match
+    # ---------------------- #
+    matched_pattern = match_known_fraud_patterns(transaction)
+    return _cascade_exit("patterns", transaction, rule_result, ml_score, matched_pattern, risk_score)
+
+
+def _cascade_exit(tier: str, transaction: dict, rule_result: dict, ml_score: float,
+                  matched_pattern, risk_score: float = None) -> dict:
+    if risk_score is None:
+        risk_score = calculate_risk_score(rule_result, ml_score)
+    cascade_stats.record(tier)
+    get_feature_store().update_transaction(transaction)
+    result = _build_result(transaction, rule_result, ml_score, risk_score, matched_pattern)
+    result["tier_exit"] = tier
+    return result
+
+# =============================================================== #
+# ================= BATCH FRAUD DETECTION LOGIC ================= #
+# =============================================================== #
+def detect_fraud_batch(transactions: list, cluster_sizes: Optional[list] = None) -> list:
+    """
+    Runs the detect_fraud() pipeline once per stage over a whole batch:
+    batched rule evaluation, one vectorized ML scoring call, vectorized
+    risk scoring and one vector lookup per distinct pattern query.
+
+    Args:
+        transactions (list[dict]): Incoming transactions
+        cluster_sizes (list[int], optional): Entity cluster size per input,
+            computed by the caller's graph (ShardedDetector keeps one graph
+            for all workers); the process-local graph is then not used
+
+    Returns:
+        list[dict]: One detect_fraud()-shaped result per input, in order
+    """
+    results = [None] * len(transactions)
+    valid_positions = []
+    valid = []
+    keys = []
+    duplicates = []                    # (position, first position with the same key)
+    first_seen = {}
+    cache = get_detection_cache()
+    velocity = get_velocity_engine()
+    graph = get_entity_graph() if cluster_sizes is None else None
+    for position, transaction in enumerate(transactions):
+        invalid = validate_transaction(transaction)
+        if invalid:
+            results[position] = {"error": invalid}
+            continue
+        key = cache_key(transaction)
+        if key is not None:
+            if key in first_seen:
+                duplicates.append((position, first_seen[key]))
+                continue
+            first_seen[key] = position
+            cached = cache.lookup(key)
+            if cached is not None:
+                cached["cache_hit"] = True
+                results[position] = cached
+                continue
+        valid_positions.append(position)
+        keys.append(key)
+        transaction = velocity.enrich(transaction)
+        if graph is not None:
+            transaction = graph.enrich(transaction)
+        elif transaction.get("account_id") is not None:
+            transaction.setdefault(CLUSTER_SIZE_FIELD, cluster_sizes[position])
+        valid.append(transaction)
+
+    if valid:
+        recorded = [False] * len(valid)
+        try:
+            _detect_fraud_batch_pipeline(valid, valid_positions, keys, results, recorded)
+        except Exception as e:
+            # Velocity / graph state is already recorded for every row, so
+            # rows are re-scored one by one without enriching them again
+            print(f"[⚠️ WARN] Batch detection failed ({len(valid)} tx), "
+                  f"scoring per transaction: {e}")
+            _score_rows(valid, valid_positions, keys, results, recorded)
+
+    # Retries inside one batch get a copy of the first occurrence's result
+    for position, first in duplicates:
+        results[position] = {**copy.deepcopy(results[first]), "cache_hit": True}
+    return results
+
+
+def _detect_fraud_batch_pipeline(valid: list, valid_positions: list, keys: list,
+                                 results: list, recorded: list) -> None:
+    features = extract_features_batch(valid)
+    rule_results = rule_check_batch(valid)
+    ml_scores = score_behavior_anomaly_batch(features, *_account_baselines_recording(valid, recorded))
+    risk_scores = calculate_risk_scores(rule_results, ml_scores)
+    matched_patterns = match_known_fraud_patterns_batch(valid)
+
+    cache = get_detection_cache()
+    for i, position in enumerate(valid_positions):
+        results[position] = _build_result(
+            valid[i], rule_results[i], float(ml_scores[i]),
+            float(risk_scores[i]), matched_patterns[i],
+        )
+        cache.store(keys[i], results[position])
+
+
+
+def _score_rows(valid: list, valid_positions: list, keys: list,
+                results: list, recorded: list) -> None:
+    """
+    Per-row fallback for a failed batch pipeline: only a row that fails
+    on its own gets an error result, and feature-store history is only
+    added for rows the batch had not recorded yet.
+    """
+    cache = get_detection_cache()
+    for i, position in enumerate(valid_positions):
+        try:
+            results[position] = _score_enriched(valid[i], record_history=not recorded[i])
+        except Exception as e:
+            results[position] = {"transaction_id": valid[i].get("transaction_id"),
+                                 "error": f"Detection failed: {e}"}
+            continue
+        cache.store(keys[i], results[position])
+
+# =============================================================== #
+# ======================= RESULT BUILDER ======================== #
+# =============================================================== #
+def _build_result(transaction: dict, rule_result: dict, ml_score: float,
+                  risk_score: float, matched_pattern) -> dict:
     escalate = risk_score > 75 or rule_result.get("flagged", False) or bool(matched_pattern)
 
     return {
@@ -76,6 +563,7 @@ def detect_fraud(transaction: dict) -> dict:
             "location": transaction.get("location"),
             "method": transaction.get("method"),
             "flags": rule_result.get("flags", []),
+            CLUSTER_SIZE_FIELD: transaction.get(CLUSTER_SIZE_FIELD),
             "ml_score": ml_score,
             "risk_score": risk_score,
         }
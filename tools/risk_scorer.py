@@ -9,6 +9,11 @@
 from tools.apply_rules import evaluate_rules
 from ml_models.feature_engineering import extract_features
 from ml_models.behavior_baseline_model import get_ml_risk_score
+from config.constants import RULE_SEVERITY_WEIGHTS
+import numpy as np
+
+RULE_WEIGHT = 0.6
+ML_WEIGHT = 0.4
 
 # =============================================================== #
 # ======================== RISK SCORER ========================== #
@@ -54,6 +59,49 @@ def compute_risk_score(transaction_data: dict) -> dict:
         "verdict": verdict
     }
 
+# =============================================================== #
+# ================= DETECTION RISK SCORE (0-100) ================ #
+# =============================================================== #
+def _rule_severity(rule_result: dict) -> float:
+    weights = [
+        RULE_SEVERITY_WEIGHTS.get(str(meta.get("severity", "medium")).lower(), 0.5)
+        for meta in rule_result.get("enriched", [])
+    ]
+    if not weights and rule_result.get("flagged"):
+        weights = [RULE_SEVERITY_WEIGHTS["medium"]]
+    return max(weights, default=0.0)
+
+
+def calculate_risk_score(rule_result: dict, ml_score: float) -> float:
+    """
+    Combines rule_check() output and the behavior anomaly score into a
+    0-100 risk score (same 60/40 rule/ML weighting as compute_risk_score).
+
+    Args:
+        rule_result (dict): Output of tools.apply_rules.rule_check
+        ml_score (float): Anomaly score in [0, 1]
+
+    Returns:
+        float: Risk score between 0 and 100
+    """
+    return float(calculate_risk_scores([rule_result], [ml_score])[0])
+
+
+def calculate_risk_scores(rule_results: list, ml_scores) -> np.ndarray:
+    """
+    Vectorized calculate_risk_score() for a batch.
+
+    Args:
+        rule_results (list[dict]): rule_check() outputs, one per transaction
+        ml_scores (array-like): Anomaly scores, aligned with rule_results
+
+    Returns:
+        np.ndarray: Risk scores between 0 and 100
+    """
+    severity = np.fromiter((_rule_severity(r) for r in rule_results), np.float64, len(rule_results))
+    ml = np.clip(np.asarray(ml_scores, dtype=np.float64), 0.0, 1.0)
+    return np.round(100.0 * (RULE_WEIGHT * severity + ML_WEIGHT * ml), 2)
+
 # =============================================================== #
 # ======================== END OF FILE ========================== #
 # =============================================================== #
\ No newline at end of file
@@ -6,9 +6,7 @@
 # ✅ Used by  : flows/resolve_alert_flow.py
 # =============================================================== #
 
-import sqlite3
-from datetime import datetime
-from resources.db.fraud_cases_db import get_db_path
+from resources.db.case_writer import get_case_writer
 
 # =============================================================== #
 # ======================= CASE STATUS UPDATER =================== #
@@ -23,22 +21,15 @@ def update_case_status(case_id: str, new_status: str, notes: str = "") -> bool:
         notes (str): Optional notes or resolution summary
 
     Returns:
-        bool: True if update successful, False otherwise
+        bool: True if the case exists and was updated, False otherwise
     """
     try:
-        conn = sqlite3.connect(get_db_path())
-        cursor = conn.cursor()
-
-        timestamp = datetime.utcnow().isoformat()
-        cursor.execute("""
-            UPDATE fraud_cases
-            SET status = ?, notes = ?, updated_at = ?
-            WHERE case_id = ?
-        """, (new_status, notes, timestamp, case_id))
-
-        conn.commit()
-        conn.close()
-        return True
+        # Queued behind earlier inserts / updates of the same case
+        updated = get_case_writer().update_status(case_id, new_status, notes or None,
+                                                  urgent=True).result()
+        if not updated:
+            print(f"[⚠️ WARN] Case {case_id} not found; status not updated")
+        return updated
 
     except Exception as e:
         print(f"[❌ ERROR] Failed to update case {case_id}: {e}")